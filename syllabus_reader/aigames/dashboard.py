@@ -0,0 +1,176 @@
+"""
+Load the student dashboard in a fixed number of queries
+
+The dashboard shows one row per game the user's teams play, either through a
+TeamGameParticipation or an active GameMatchup. load_student_dashboard reads
+teams, participations, matchups and the current steps' instructions with one
+query each and assembles the rows in memory. Game steps come from the step
+catalog and step progress from the progress columns stored on each matchup.
+"""
+from django.db.models import Q
+
+from .models import GameMatchup, InstructionStep, TeamGameParticipation
+from .step_catalog import get_game_steps
+
+ACTIVE_MATCHUP_STATUSES = ['scheduled', 'in_progress']
+
+
+def instruction_role(user):
+    """Which instruction chain the user reads, as in GameStep.get_instructions_for_user"""
+    profile = getattr(user, 'profile', None)
+    if profile is not None and (profile.is_teacher or profile.is_admin):
+        return 'teacher'
+    return 'student'
+
+
+class GameSteps:
+    """The steps of one game, from the step catalog"""
+
+    def __init__(self, steps):
+        self.by_number = {step.step_number: step for step in steps}
+        self.active = [step for step in steps if step.is_active]
+        self.active_by_number = {step.step_number: step for step in self.active}
+
+    @property
+    def total(self):
+        return len(self.active)
+
+    @property
+    def has_multiple_steps(self):
+        return self.total > 1
+
+    def first(self):
+        return self.active[0] if self.active else None
+
+
+def load_student_dashboard(user, teams):
+    """
+    The dashboard rows for a user's active teams, as the list of dicts the
+    student dashboard template expects
+    """
+    team_ids = [team.id for team in teams]
+
+    participations = list(
+        TeamGameParticipation.objects.filter(team_id__in=team_ids, is_active=True)
+        .select_related('ai_game').order_by('team_id', 'id')
+    )
+    matchups = list(
+        GameMatchup.objects.filter(
+            Q(team1_id__in=team_ids) | Q(team2_id__in=team_ids),
+            status__in=ACTIVE_MATCHUP_STATUSES,
+        ).select_related('ai_game', 'team1', 'team2')
+    )
+
+    game_ids = {participation.ai_game_id for participation in participations}
+    game_ids.update(matchup.ai_game_id for matchup in matchups)
+    steps_by_game = {game_id: GameSteps(get_game_steps(game_id)) for game_id in game_ids}
+
+    # Each team's matchups, newest first as in GameMatchup's default ordering
+    matchups_by_team = {team_id: [] for team_id in team_ids}
+    for matchup in matchups:
+        for team_id in (matchup.team1_id, matchup.team2_id):
+            if team_id in matchups_by_team:
+                matchups_by_team[team_id].append(matchup)
+
+    assigned_games = []
+    added = set()
+
+    for team in teams:
+        for participation in participations:
+            if participation.team_id != team.id:
+                continue
+            game = participation.ai_game
+            steps = steps_by_game[game.id]
+            matchup = next((m for m in matchups_by_team[team.id] if m.ai_game_id == game.id), None)
+
+            # The team's current step in its matchup, or the game's first step
+            current_step = None
+            completed_steps = 0
+            if steps.has_multiple_steps:
+                if matchup:
+                    current_step = steps.active_by_number.get(matchup.current_step_number)
+                    completed_steps = matchup.completed_step_count
+                current_step = current_step or steps.first()
+
+            current_step_url = None
+            if matchup:
+                matchup_step = steps.active_by_number.get(matchup.current_step_number)
+                current_step_url = matchup_step.get_url(matchup.id) if matchup_step else None
+
+            assigned_games.append(dashboard_row(
+                game, team, steps, current_step, completed_steps,
+                participation=participation,
+                current_step_url=current_step_url,
+                first_step_url=None,  # No matchup available for participation-based games
+                source='participation',
+            ))
+            added.add((game.id, team.id))
+
+    for team in teams:
+        for matchup in matchups_by_team[team.id]:
+            game = matchup.ai_game
+            if (game.id, team.id) in added:
+                continue
+            steps = steps_by_game[game.id]
+
+            current_step = None
+            current_step_url = None
+            completed_steps = 0
+            if steps.has_multiple_steps:
+                current_step_number = matchup.current_step_number
+                current_step = steps.active_by_number.get(current_step_number)
+                if current_step is None:
+                    # All steps completed: point back at the first step
+                    current_step_number = 1
+                    current_step = steps.active_by_number.get(1)
+                completed_steps = matchup.completed_step_count
+                url_step = steps.by_number.get(current_step_number)
+                current_step_url = url_step.get_url(matchup.id) if url_step else None
+                current_step = current_step or steps.first()
+
+            first_step = steps.active_by_number.get(1)
+            assigned_games.append(dashboard_row(
+                game, team, steps, current_step, completed_steps,
+                matchup=matchup,
+                current_step_url=current_step_url,
+                first_step_url=first_step.get_url(matchup.id) if first_step else None,
+                source='matchup',
+                opponent_team=matchup.get_other_team(team),
+            ))
+            added.add((game.id, team.id))
+
+    attach_instructions(assigned_games, instruction_role(user))
+    return assigned_games
+
+
+def dashboard_row(game, team, steps, current_step, completed_steps, **extra):
+    """One dashboard row; steps only count for games with several steps"""
+    total_steps = steps.total if steps.has_multiple_steps else 0
+    row = {
+        'game': game,
+        'team': team,
+        'has_multiple_steps': steps.has_multiple_steps,
+        'current_step': current_step,
+        'current_step_instructions': None,
+        'progress': None,
+        'progress_percentage': int(completed_steps / total_steps * 100) if total_steps else 0,
+        'total_steps': total_steps,
+        'completed_steps': completed_steps,
+    }
+    row.update(extra)
+    return row
+
+
+def attach_instructions(rows, role):
+    """Fill in the instruction chain of each row's current step with one query"""
+    step_ids = {row['current_step'].id for row in rows if row['current_step']}
+    if not step_ids:
+        return
+    chains = {step_id: [] for step_id in step_ids}
+    for instruction in InstructionStep.objects.filter(
+        game_step_id__in=step_ids, role=role, is_active=True
+    ).order_by('id'):
+        chains[instruction.game_step_id].append(instruction)
+    for row in rows:
+        if row['current_step']:
+            row['current_step_instructions'] = chains[row['current_step'].id]
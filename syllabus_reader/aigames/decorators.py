@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.urls import reverse
+from .membership import get_matchup_membership
 from .models import GameMatchup, Team
 
 
@@ -33,14 +34,13 @@ def teacher_can_view_team(view_func):
         if hasattr(request.user, 'profile'):
             # Check if user is the teacher who created the matchup
             if (request.user.profile.role in ['teacher', 'admin'] and 
-                matchup.created_by == request.user):
+                matchup.created_by_id == request.user.id):
                 user_can_access = True
                 is_teacher = True
             
             # Check if user is a student in one of the teams
             elif request.user.profile.role == 'student':
-                user_teams = request.user.teams.all()  # Fixed: use teams directly, not profile.teams
-                if matchup.team1 in user_teams or matchup.team2 in user_teams:
+                if get_matchup_membership(request, matchup).team is not None:
                     user_can_access = True
                     is_teacher = False
         
@@ -103,10 +103,7 @@ def get_user_team_or_viewing_team(request, matchup):
             return None  # Teacher viewing general content (non-validation steps)
     
     # Regular student access - find their team
-    user_team = (Team.objects.filter(members=request.user, matchups_as_team1=matchup).first() or 
-                 Team.objects.filter(members=request.user, matchups_as_team2=matchup).first())
-    
-    return user_team
+    return get_matchup_membership(request, matchup).team
 
 
 def is_teacher_viewing(request):
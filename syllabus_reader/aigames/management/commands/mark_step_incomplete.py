@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from aigames.models import GameMatchup, MatchupStepProgress
 
 
@@ -32,10 +33,11 @@ class Command(BaseCommand):
                     game_step=game_step
                 )
                 
-                # Mark as incomplete
+                # Mark as incomplete; the matchup's progress state is updated in the same transaction
                 progress.is_completed = False
                 progress.completed_at = None
-                progress.save()
+                with transaction.atomic():
+                    progress.save()
                 
                 self.stdout.write(
                     self.style.SUCCESS(
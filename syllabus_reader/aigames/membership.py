@@ -0,0 +1,54 @@
+"""
+Resolve the current user's side of a game matchup
+
+Game views need to know which team the user plays for, who the opponent is
+and whether they are a teacher. get_matchup_membership answers all three with
+one indexed query on TeamMembership (instead of loading both teams' member
+lists) and remembers the answer on the request, so helpers called several times
+per request do not repeat it.
+"""
+from collections import namedtuple
+
+from .models import TeamMembership
+
+STUDENT = 'student'
+TEACHER = 'teacher'
+
+# team and opponent are None unless the user plays in the matchup; role is
+# TEACHER for teachers and admins, STUDENT for other players, otherwise None
+MatchupMembership = namedtuple('MatchupMembership', ['team', 'opponent', 'role'])
+
+
+def resolve_matchup_membership(user, matchup):
+    """The user's MatchupMembership in a matchup, from a single query"""
+    team_ids = set()
+    if user.is_authenticated:
+        team_ids = set(
+            TeamMembership.objects.filter(
+                user_id=user.pk, team_id__in=[matchup.team1_id, matchup.team2_id],
+            ).values_list('team_id', flat=True)
+        )
+
+    if matchup.team1_id in team_ids:
+        team, opponent = matchup.team1, matchup.team2
+    elif matchup.team2_id in team_ids:
+        team, opponent = matchup.team2, matchup.team1
+    else:
+        team = opponent = None
+
+    profile = getattr(user, 'profile', None)
+    if profile is not None and profile.can_create_teams:
+        role = TEACHER
+    elif team is not None:
+        role = STUDENT
+    else:
+        role = None
+    return MatchupMembership(team, opponent, role)
+
+
+def get_matchup_membership(request, matchup):
+    """The current user's MatchupMembership in a matchup, resolved once per request"""
+    memberships = request.__dict__.setdefault('_matchup_memberships', {})
+    if matchup.pk not in memberships:
+        memberships[matchup.pk] = resolve_matchup_membership(request.user, matchup)
+    return memberships[matchup.pk]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+def backfill_progress_state(apps, schema_editor):
+    """Fill the progress state of existing matchups from their step progress"""
+    GameMatchup = apps.get_model('aigames', 'GameMatchup')
+    MatchupStepProgress = apps.get_model('aigames', 'MatchupStepProgress')
+    completed = {}
+    for matchup_id, step_number in MatchupStepProgress.objects.filter(is_completed=True).values_list(
+        'matchup_id', 'game_step__step_number'
+    ):
+        completed.setdefault(matchup_id, set()).add(step_number)
+    for matchup_id, step_numbers in completed.items():
+        GameMatchup.objects.filter(pk=matchup_id).update(
+            current_step_number=max(step_numbers) + 1,
+            completed_step_count=len(step_numbers),
+            completed_steps_mask=sum(1 << step_number for step_number in step_numbers),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aigames', '0031_alter_teamstepvalidation_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamematchup',
+            name='completed_step_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gamematchup',
+            name='completed_steps_mask',
+            field=models.PositiveBigIntegerField(default=0, help_text='Bit n is set when step n is completed'),
+        ),
+        migrations.AddField(
+            model_name='gamematchup',
+            name='current_step_number',
+            field=models.PositiveIntegerField(default=1, help_text='Step after the last completed step'),
+        ),
+        migrations.RunPython(backfill_progress_state, migrations.RunPython.noop),
+    ]
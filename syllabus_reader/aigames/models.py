@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .step_catalog import get_game_steps, invalidate_game_steps
+
 class School(models.Model):
     """Schools that users belong to"""
     name = models.CharField(max_length=255, unique=True)
@@ -105,28 +107,32 @@ class AiGame(models.Model):
     def __str__(self):
         return self.title
     
+    def get_catalog_steps(self, active_only=True):
+        """This game's steps from the per-process step catalog, ordered by step number"""
+        steps = [step for step in get_game_steps(self.id) if step.is_active or not active_only]
+        for step in steps:
+            step.ai_game = self
+        return steps
+    
     @property
     def has_multiple_steps(self):
         """Check if this game has multiple steps by counting active steps"""
-        return self.steps.filter(is_active=True).count() > 1
+        return len(self.get_ordered_steps()) > 1
     
     def get_ordered_steps(self):
-        """Get all active game steps for this game ordered by step number"""
-        return self.steps.filter(is_active=True).order_by('step_number')
+        """Get all active game steps for this game ordered by step number, as a list"""
+        return self.get_catalog_steps()
     
     def get_total_estimated_duration(self):
         """Get total estimated duration for all game steps in minutes"""
-        total = self.steps.filter(is_active=True).aggregate(
-            total_minutes=models.Sum('estimated_duration_minutes')
-        )['total_minutes']
-        return total or 0
-    
-    def get_step_by_number(self, step_number):
-        """Get a specific game step by number"""
-        return self.steps.filter(
-            step_number=step_number, 
-            is_active=True
-        ).first()
+        return sum(step.estimated_duration_minutes for step in self.get_ordered_steps())
+    
+    def get_step_by_number(self, step_number, active_only=True):
+        """Get a specific game step by number, or None"""
+        for step in self.get_catalog_steps(active_only):
+            if step.step_number == step_number:
+                return step
+        return None
     
     def get_instructions_for_step_and_role(self, step_number, user_role):
         """Get instruction chain for a specific step number and role"""
@@ -431,11 +437,29 @@ class GameMatchup(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True, help_text="Teacher notes about this matchup")
+    
+    # Step progress, kept in sync with MatchupStepProgress (see sync_matchup_progress)
+    current_step_number = models.PositiveIntegerField(default=1, help_text="Step after the last completed step")
+    completed_step_count = models.PositiveIntegerField(default=0)
+    completed_steps_mask = models.PositiveBigIntegerField(default=0, help_text="Bit n is set when step n is completed")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    PROGRESS_FIELDS = ['current_step_number', 'completed_step_count', 'completed_steps_mask']
+    
     def __str__(self):
         return f"{self.ai_game.title}: {self.team1.name} vs {self.team2.name}"
+
+    def save(self, *args, **kwargs):
+        # The progress fields are only written by sync_matchup_progress, so
+        # saving a stale instance cannot undo a step completed meanwhile
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PROGRESS_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def clean(self):
         """Validate that both teams belong to the same school"""
@@ -469,20 +493,16 @@ class GameMatchup(models.Model):
         return None
     
     def get_current_step(self):
-        """Get the current (next uncompleted) step for this matchup"""
-        # Get the latest completed step
-        completed_steps = self.step_progress.filter(
-            is_completed=True
-        ).order_by('-game_step__step_number')
-        
-        if completed_steps.exists():
-            last_completed = completed_steps.first().game_step.step_number
-            # Try to return the next step
-            next_step = self.ai_game.get_step_by_number(last_completed + 1)
-            return next_step  # Returns None if no next step (all completed)
-        else:
-            # Return the first step if none completed
-            return self.ai_game.get_step_by_number(1)
+        """Get the current (next uncompleted) step for this matchup, or None if all are completed"""
+        return self.ai_game.get_step_by_number(self.current_step_number)
+    
+    def is_step_completed(self, step_number):
+        """Whether a step is completed, from the stored progress state"""
+        return bool(self.completed_steps_mask >> step_number & 1)
+    
+    def refresh_progress_state(self):
+        """Reload the stored progress state after steps changed elsewhere"""
+        self.refresh_from_db(fields=self.PROGRESS_FIELDS)
     
     def get_current_step_url(self):
         """Get the URL for the current (next uncompleted) step for this matchup"""
@@ -502,16 +522,18 @@ class GameMatchup(models.Model):
         """Mark a step as completed for this matchup"""
         game_step = self.ai_game.get_step_by_number(step_number)
         if game_step:
-            progress, created = MatchupStepProgress.objects.get_or_create(
-                matchup=self,
-                game_step=game_step,
-                defaults={
-                    'is_completed': True, 
-                    'completed_at': timezone.now()
-                }
-            )
-            if not created and not progress.is_completed:
-                progress.complete_step()
+            with transaction.atomic():
+                progress, created = MatchupStepProgress.objects.get_or_create(
+                    matchup=self,
+                    game_step=game_step,
+                    defaults={
+                        'is_completed': True, 
+                        'completed_at': timezone.now()
+                    }
+                )
+                if not created and not progress.is_completed:
+                    progress.complete_step()
+            self.refresh_progress_state()
             
             # Check if all steps are now completed and mark matchup as complete
             self.check_and_complete_matchup()
@@ -519,27 +541,23 @@ class GameMatchup(models.Model):
             return progress
         return None
     
-    def check_and_complete_validation_steps(self):
+    def check_and_complete_validation_steps(self, step_matrix=None):
         """
         Integrity check: Mark steps as complete if both teams are validated.
         This ensures consistency in case the step wasn't automatically completed.
+        Pass a step_matrix from get_step_matrix to avoid loading it again.
         """
-        game_steps = self.ai_game.get_ordered_steps()
+        if step_matrix is None:
+            step_matrix = self.get_step_matrix()
         completed_steps = []
         
-        for game_step in game_steps:
+        for step in step_matrix:
+            game_step = step['game_step']
             if game_step.requires_validation:
-                # Check if both teams are validated for this step
-                team1_validated = self.is_team_validated_for_step(self.team1, game_step.step_number)
-                team2_validated = self.is_team_validated_for_step(self.team2, game_step.step_number)
-                
-                if team1_validated and team2_validated:
-                    # Check if step is already completed
-                    progress = self.get_progress_for_step(game_step.step_number)
-                    if not progress or not progress.is_completed:
-                        # Complete the step
-                        self.complete_step(game_step.step_number)
-                        completed_steps.append(game_step.step_number)
+                # Both teams validated but the step not completed yet
+                if step['team1_validated'] and step['team2_validated'] and not step['is_completed']:
+                    self.complete_step(game_step.step_number)
+                    completed_steps.append(game_step.step_number)
         
         return completed_steps
     
@@ -555,15 +573,12 @@ class GameMatchup(models.Model):
             return False
         
         # Get all game steps
-        game_steps = self.ai_game.get_ordered_steps()
-        if not game_steps.exists():
+        total_steps = len(self.ai_game.get_ordered_steps())
+        if not total_steps:
             return False
         
         # Check if all steps are completed
-        total_steps = game_steps.count()
-        completed_steps = self.step_progress.filter(is_completed=True).count()
-        
-        if completed_steps >= total_steps:
+        if self.completed_step_count >= total_steps:
             # All steps are completed - mark matchup as complete
             self.status = 'completed'
             self.completed_at = timezone.now()
@@ -592,7 +607,7 @@ class GameMatchup(models.Model):
             })
         
         # Add step completions
-        for progress in self.step_progress.filter(is_completed=True):
+        for progress in self.step_progress.filter(is_completed=True).select_related('game_step'):
             game_step = progress.game_step
             if game_step.requires_validation:
                 # Validation-required steps are completed by the teacher
@@ -610,7 +625,7 @@ class GameMatchup(models.Model):
                 })
         
         # Add individual team validations (for validation-required steps)
-        for validation in self.team_validations.filter(is_validated=True):
+        for validation in self.team_validations.filter(is_validated=True).select_related('team', 'game_step', 'validated_by'):
             if validation.validated_at:  # Make sure we have a validation timestamp
                 activities.append({
                     'datetime': validation.validated_at,
@@ -647,6 +662,31 @@ class GameMatchup(models.Model):
         
         return validation is not None
     
+    def get_step_matrix(self):
+        """
+        Progress and both teams' validation for every active step, in step order,
+        from two queries: the completion times, then the matchup's validations.
+        Steps come from the step catalog and completion from the stored progress state.
+        """
+        completed_at = dict(
+            MatchupStepProgress.objects.filter(matchup=self, is_completed=True).values_list('game_step_id', 'completed_at')
+        )
+        
+        validated = set(
+            TeamStepValidation.objects.filter(matchup=self, is_validated=True).values_list('game_step_id', 'team_id')
+        )
+        
+        return [
+            {
+                'game_step': game_step,
+                'is_completed': self.is_step_completed(game_step.step_number),
+                'completed_at': completed_at.get(game_step.id),
+                'team1_validated': (game_step.id, self.team1_id) in validated,
+                'team2_validated': (game_step.id, self.team2_id) in validated,
+            }
+            for game_step in self.ai_game.get_ordered_steps()
+        ]
+    
     def get_team_validation_for_step(self, team, step_number):
         """Get the validation record for a specific team and step"""
         game_step = self.ai_game.get_step_by_number(step_number)
@@ -744,6 +784,53 @@ class MatchupStepProgress(models.Model):
         unique_together = ['matchup', 'game_step']  # One progress record per step per matchup
         ordering = ['matchup', 'game_step__step_number']
 
+
+def progress_state(completed_step_numbers):
+    """GameMatchup progress fields for a list of completed step numbers"""
+    completed_step_numbers = set(completed_step_numbers)
+    return {
+        'current_step_number': max(completed_step_numbers, default=0) + 1,
+        'completed_step_count': len(completed_step_numbers),
+        'completed_steps_mask': sum(1 << step_number for step_number in completed_step_numbers),
+    }
+
+
+def sync_matchup_progress(matchup_id):
+    """Recompute a matchup's stored progress state from its step progress rows"""
+    with transaction.atomic():
+        # Lock the matchup so concurrent step changes are applied one at a time
+        GameMatchup.objects.select_for_update().filter(pk=matchup_id).exists()
+        completed_step_numbers = MatchupStepProgress.objects.filter(
+            matchup_id=matchup_id, is_completed=True
+        ).values_list('game_step__step_number', flat=True)
+        GameMatchup.objects.filter(pk=matchup_id).update(**progress_state(completed_step_numbers))
+
+
+@receiver(post_save, sender=MatchupStepProgress)
+@receiver(post_delete, sender=MatchupStepProgress)
+def update_matchup_progress(sender, instance, created=False, **kwargs):
+    """Keep GameMatchup's progress state in step whenever a step is completed or reset"""
+    # Visiting a step creates an uncompleted row, which changes nothing
+    if created and not instance.is_completed:
+        return
+    sync_matchup_progress(instance.matchup_id)
+
+
+@receiver(post_save, sender=GameStep)
+def renumber_matchup_progress(sender, instance, created, **kwargs):
+    """
+    The stored progress state is indexed by step number, so resync the matchups
+    that completed a step whose number may have changed. Deleting a step
+    deletes its progress rows, which resyncs through update_matchup_progress.
+    """
+    if created:
+        return
+    matchup_ids = MatchupStepProgress.objects.filter(
+        game_step=instance, is_completed=True
+    ).values_list('matchup_id', flat=True).distinct()
+    for matchup_id in matchup_ids:
+        sync_matchup_progress(matchup_id)
+
 class TeamStepValidation(models.Model):
     """Tracks teacher validation for each team's work on validation-required steps"""
     matchup = models.ForeignKey(GameMatchup, on_delete=models.CASCADE, related_name='team_validations')
@@ -788,3 +875,18 @@ class TeamStepValidation(models.Model):
         unique_together = ['matchup', 'team', 'game_step']  # One validation record per team per step per matchup
         ordering = ['matchup', 'game_step__step_number', 'team__name']
 
+
+@receiver(post_save, sender=GameStep)
+@receiver(post_delete, sender=GameStep)
+def invalidate_step_catalog(sender, instance, **kwargs):
+    """Reload a game's steps after one is added, edited or removed (see step_catalog)"""
+    invalidate_game_steps(instance.ai_game_id)
+    # Again once committed, in case another thread reloaded the old rows meanwhile
+    transaction.on_commit(lambda: invalidate_game_steps(instance.ai_game_id))
+
+
+@receiver(post_save, sender=AiGame)
+def invalidate_new_game_steps(sender, instance, created, **kwargs):
+    """A new game may reuse the id of a deleted one, so drop anything cached under it"""
+    if created:
+        invalidate_game_steps(instance.id)
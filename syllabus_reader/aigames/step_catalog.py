@@ -0,0 +1,64 @@
+"""
+Per-process catalog of game steps
+
+GameStep rows only change when an admin edits a game, yet step metadata is
+read on nearly every game request. Each process keeps every game's steps in
+memory (all of them, ordered by step number), tagged with the game's version
+stamp from Django's cache. A lookup costs a cache read and no queries.
+
+The project uses the default per-process cache. Saving or deleting a step
+bumps the stamp (see the receivers in models.py), and the process that made
+the change reloads the game at once. Other processes cannot see that bump.
+Stamps therefore expire after VERSION_TIMEOUT, and each process then reloads
+the game, so step edits reach every process within that time.
+
+Lookups return fresh GameStep instances built from the stored rows, so nothing
+set on a step during one request leaks into another.
+"""
+import time
+
+from django.core.cache import cache
+
+# Other processes pick up step edits within this many seconds
+VERSION_TIMEOUT = 60
+
+_catalog = {}
+
+
+def _version_key(game_id):
+    return f'aigames:game:{game_id}:steps_version'
+
+
+def get_steps_version(game_id):
+    """Get the current version stamp of a game's steps (a new one once it expires)"""
+    version = cache.get(_version_key(game_id))
+    if version is None:
+        version = time.time_ns()
+        cache.set(_version_key(game_id), version, VERSION_TIMEOUT)
+    return version
+
+
+def invalidate_game_steps(game_id):
+    """Reload a game's steps in this process now, and in others within VERSION_TIMEOUT"""
+    cache.set(_version_key(game_id), time.time_ns(), VERSION_TIMEOUT)
+    _catalog.pop(game_id, None)
+
+
+def _load_game_steps(game_id):
+    from .models import GameStep
+
+    queryset = GameStep.objects.filter(ai_game_id=game_id).order_by('step_number')
+    field_names = [field.attname for field in GameStep._meta.concrete_fields]
+    return queryset.db, field_names, list(queryset.values_list(*field_names))
+
+
+def get_game_steps(game_id):
+    """All steps of a game, active or not, ordered by step number"""
+    from .models import GameStep
+
+    version = get_steps_version(game_id)
+    entry = _catalog.get(game_id)
+    if entry is None or entry[0] != version:
+        entry = _catalog[game_id] = (version, _load_game_steps(game_id))
+    db, field_names, rows = entry[1]
+    return [GameStep.from_db(db, field_names, row) for row in rows]
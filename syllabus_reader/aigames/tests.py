@@ -1,3 +1,275 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .membership import STUDENT, TEACHER, get_matchup_membership
+from .step_catalog import get_game_steps, invalidate_game_steps
+from .models import (AiGame, GameMatchup, GameStep, InstructionStep, MatchupStepProgress, School, Team,
+                     TeamGameParticipation, TeamMembership, TeamStepValidation)
+
+
+class MatchupMembershipTest(TestCase):
+    """The user's side of a matchup is resolved with one query per request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        cls.teacher = User.objects.create_user('teacher', password='password')
+        cls.teacher.profile.role = 'teacher'
+        cls.teacher.profile.save()
+        cls.student = User.objects.create_user('student', password='password')
+        cls.outsider = User.objects.create_user('outsider', password='password')
+
+        cls.team1 = Team.objects.create(name="Team 1", school=school, created_by=cls.teacher)
+        cls.team2 = Team.objects.create(name="Team 2", school=school, created_by=cls.teacher)
+        TeamMembership.objects.create(team=cls.team2, user=cls.student)
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=AiGame.objects.create(title="Game"),
+            team1=cls.team1, team2=cls.team2, school=school, created_by=cls.teacher,
+        )
+
+    def request_for(self, user):
+        request = RequestFactory().get('/')
+        request.user = User.objects.select_related('profile').get(pk=user.pk)
+        return request
+
+    def test_student_sees_team_and_opponent(self):
+        request = self.request_for(self.student)
+        with self.assertNumQueries(1):
+            membership = get_matchup_membership(request, self.matchup)
+            self.assertIs(get_matchup_membership(request, self.matchup), membership)
+        self.assertEqual(membership, (self.team2, self.team1, STUDENT))
+
+    def test_teacher_and_outsider(self):
+        self.assertEqual(get_matchup_membership(self.request_for(self.teacher), self.matchup), (None, None, TEACHER))
+        self.assertEqual(get_matchup_membership(self.request_for(self.outsider), self.matchup), (None, None, None))
+
+
+class MatchupProgressStateTest(TestCase):
+    """The progress columns on GameMatchup follow step completion and reset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        teacher = User.objects.create_user('teacher', password='password')
+        game = AiGame.objects.create(title="Game")
+        for step_number in (1, 2, 3):
+            GameStep.objects.create(ai_game=game, step_number=step_number, title=f"Step {step_number}")
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=game,
+            team1=Team.objects.create(name="Team 1", school=school, created_by=teacher),
+            team2=Team.objects.create(name="Team 2", school=school, created_by=teacher),
+            school=school, created_by=teacher,
+        )
+
+    def assertProgress(self, current_step_number, completed_step_count, completed_steps_mask):
+        self.matchup.refresh_progress_state()
+        self.assertEqual(
+            (self.matchup.current_step_number, self.matchup.completed_step_count, self.matchup.completed_steps_mask),
+            (current_step_number, completed_step_count, completed_steps_mask),
+        )
+
+    def test_complete_and_reset_steps(self):
+        self.assertProgress(1, 0, 0)
+        self.matchup.complete_step(1)
+        self.matchup.complete_step(2)
+        self.assertProgress(3, 2, 0b110)
+        self.assertTrue(self.matchup.is_step_completed(2))
+        self.assertEqual(self.matchup.get_current_step().step_number, 3)
+
+        progress = MatchupStepProgress.objects.get(matchup=self.matchup, game_step__step_number=2)
+        progress.is_completed = False
+        progress.completed_at = None
+        progress.save()
+        self.assertProgress(2, 1, 0b10)
+        self.assertFalse(self.matchup.is_step_completed(2))
+
+        MatchupStepProgress.objects.filter(matchup=self.matchup).delete()
+        self.assertProgress(1, 0, 0)
+
+    def test_renumbering_or_deleting_a_step_resyncs(self):
+        self.matchup.complete_step(1)
+        self.matchup.complete_step(3)
+        step = self.matchup.ai_game.get_step_by_number(3)
+        step.step_number = 4
+        step.save()
+        self.assertProgress(5, 2, 0b10010)
+
+        step.delete()
+        self.assertProgress(2, 1, 0b10)
+
+    def test_saving_a_stale_matchup_keeps_progress(self):
+        stale = GameMatchup.objects.get(pk=self.matchup.pk)
+        self.matchup.complete_step(1)
+        stale.notes = "Moved to Friday"
+        stale.save()
+        self.assertProgress(2, 1, 0b10)
+
+    def test_completing_every_step_completes_the_matchup(self):
+        for step_number in (1, 2, 3):
+            self.matchup.complete_step(step_number)
+        self.assertProgress(4, 3, 0b1110)
+        self.assertIsNone(self.matchup.get_current_step())
+        self.assertEqual(self.matchup.status, 'completed')
+
+
+class StudentDashboardQueryCountTest(TestCase):
+    """The student dashboard renders in the same number of queries however many games a student plays"""
+
+    # Session, user, teams, participations, matchups, instructions, profile,
+    # school, invitations (steps come from the step catalog)
+    DASHBOARD_QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(name="Test School", short_name="TS")
+        cls.teacher = User.objects.create_user('teacher', password='password')
+        cls.student = User.objects.create_user('student', password='password')
+        cls.student.profile.school = cls.school
+        cls.student.profile.save()
+
+    def add_games(self, count):
+        """Give the student a new team playing count matchups and one participation"""
+        n = Team.objects.count()
+        team = Team.objects.create(name=f"Team {n}", school=self.school, created_by=self.teacher)
+        opponent = Team.objects.create(name=f"Opponent {n}", school=self.school, created_by=self.teacher)
+        TeamMembership.objects.create(team=team, user=self.student)
+        for i in range(count):
+            game = AiGame.objects.create(title=f"Game {n}.{i}")
+            for step_number in (1, 2, 3):
+                step = GameStep.objects.create(ai_game=game, step_number=step_number, title=f"Step {step_number}")
+                InstructionStep.objects.create(game_step=step, title="Read", content="Read this", role='student')
+            matchup = GameMatchup.objects.create(
+                ai_game=game, team1=team, team2=opponent, school=self.school, created_by=self.teacher,
+            )
+            matchup.complete_step(1)
+        TeamGameParticipation.objects.create(team=team, ai_game=game)
+
+    def test_query_count_does_not_grow(self):
+        self.client.force_login(self.student)
+        url = reverse('aigames:student_dashboard')
+
+        self.add_games(1)
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['assigned_games']), 1)
+
+        self.add_games(3)
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+            response = self.client.get(url)
+        rows = response.context['assigned_games']
+        self.assertEqual([row['source'] for row in rows], ['participation', 'participation', 'matchup', 'matchup'])
+        for row in rows:
+            self.assertEqual((row['completed_steps'], row['total_steps']), (1, 3))
+            self.assertEqual(row['current_step'].step_number, 2)
+            self.assertEqual([i.title for i in row['current_step_instructions']], ["Read"])
+        self.assertContains(response, "1/3 Steps", count=4)
+
+
+class MatchupDetailQueryCountTest(TestCase):
+    """The matchup detail page loads its step matrix in a fixed number of queries"""
+
+    # Session, user, profile, school, matchup, progress, validations,
+    # last activity (progress, validations); steps come from the step catalog
+    DETAIL_QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        cls.teacher = User.objects.create_user('teacher', password='password')
+        cls.teacher.profile.role = 'teacher'
+        cls.teacher.profile.school = school
+        cls.teacher.profile.save()
+        cls.game = AiGame.objects.create(title="Game")
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=cls.game,
+            team1=Team.objects.create(name="Team 1", school=school, created_by=cls.teacher),
+            team2=Team.objects.create(name="Team 2", school=school, created_by=cls.teacher),
+            school=school, created_by=cls.teacher,
+        )
+
+    def add_steps(self, count):
+        first = self.game.steps.count() + 1
+        for step_number in range(first, first + count):
+            GameStep.objects.create(
+                ai_game=self.game, step_number=step_number, title=f"Step {step_number}",
+                requires_validation=step_number % 2 == 0,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def get_detail(self):
+        return self.client.get(reverse('aigames:game_matchup_detail', kwargs={'matchup_id': self.matchup.id}))
+
+    def render(self):
+        get_game_steps(self.game.id)  # Step catalog already loaded, as in a running process
+        with self.assertNumQueries(self.DETAIL_QUERY_BUDGET):
+            return self.get_detail()
+
+    def test_query_count_does_not_grow_with_steps(self):
+        self.add_steps(2)
+        self.matchup.complete_step(1)
+        self.render()
+
+        self.add_steps(6)
+        response = self.render()
+
+        steps = response.context['step_progress_info']
+        self.assertEqual([step['step_number'] for step in steps], list(range(1, 9)))
+        self.assertTrue(steps[0]['is_completed'])
+        self.assertIsNotNone(steps[0]['completed_at'])
+        self.assertTrue(steps[1]['is_current'] and steps[1]['can_complete'])
+
+    def test_step_validated_by_both_teams_is_completed(self):
+        self.add_steps(3)
+        self.matchup.complete_step(1)
+        step2 = self.game.steps.get(step_number=2)
+        TeamStepValidation.objects.create(matchup=self.matchup, team=self.matchup.team1, game_step=step2, is_validated=True)
+        response = self.render()
+        self.assertEqual(
+            [(s['team1_validated'], s['team2_validated']) for s in response.context['step_progress_info']],
+            [(False, False), (True, False), (False, False)],
+        )
+
+        TeamStepValidation.objects.create(matchup=self.matchup, team=self.matchup.team2, game_step=step2, is_validated=True)
+        steps = self.get_detail().context['step_progress_info']
+        self.assertTrue(steps[1]['is_completed'])
+        self.assertTrue(steps[2]['is_current'])
+
+
+class StepCatalogTest(TestCase):
+    """Step lookups come from the per-process catalog until a step changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = AiGame.objects.create(title="Game")
+        for step_number in (1, 2, 3):
+            GameStep.objects.create(
+                ai_game=cls.game, step_number=step_number, title=f"Step {step_number}",
+                estimated_duration_minutes=5, is_active=step_number != 3,
+            )
+
+    def test_lookups_cost_no_queries(self):
+        get_game_steps(self.game.id)
+        with self.assertNumQueries(0):
+            self.assertEqual([step.step_number for step in self.game.get_ordered_steps()], [1, 2])
+            self.assertTrue(self.game.has_multiple_steps)
+            self.assertEqual(self.game.get_total_estimated_duration(), 10)
+            self.assertEqual(self.game.get_step_by_number(2).title, "Step 2")
+            self.assertIsNone(self.game.get_step_by_number(3))
+            self.assertEqual(self.game.get_step_by_number(3, active_only=False).title, "Step 3")
+            self.assertEqual(self.game.get_step_by_number(1).ai_game, self.game)
+
+    def test_editing_a_step_reloads_the_game(self):
+        # The rollback after the test does not send signals
+        self.addCleanup(invalidate_game_steps, self.game.id)
+        step = self.game.get_step_by_number(2)
+        step.title = "Renamed"
+        step.is_active = False
+        step.save()
+        self.assertEqual([s.title for s in self.game.get_ordered_steps()], ["Step 1"])
+        self.assertFalse(self.game.has_multiple_steps)
+
+        step.delete()
+        self.assertEqual([s.step_number for s in self.game.get_catalog_steps(active_only=False)], [1, 3])
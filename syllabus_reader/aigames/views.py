@@ -9,6 +9,7 @@ from .forms import (TeamForm, GameResourceForm, TeamInvitationForm, JoinTeamForm
                    GameMatchupForm, SchoolTeamForm, TeamMemberForm, AiGameForm, GameStepForm, InstructionStepForm)
 from .models import (AiGame, Team, TeamMembership, TeamGameParticipation, GameResource, TeamInvitation,
                      UserProfile, School, GameMatchup, InstructionStep, InstructionStepFeedback, GameStep)
+from .dashboard import load_student_dashboard
 
 def get_user_role(user):
     """Get user role from profile, defaulting to student"""
@@ -59,196 +60,10 @@ def student_dashboard(request):
     user = request.user
     
     # Get all teams the user is a member of
-    user_teams = user.teams.filter(is_active=True)
+    user_teams = list(user.teams.filter(is_active=True))
     
-    # Get all games assigned to those teams through direct participation
-    assigned_games = []
-    for team in user_teams:
-        team_participations = TeamGameParticipation.objects.filter(
-            team=team,
-            is_active=True
-        ).select_related('ai_game')
-        
-        for participation in team_participations:
-            game = participation.ai_game
-            
-            # Get current step if game has multiple steps
-            current_step = None
-            current_step_instructions = None
-            progress = None
-            progress_percentage = 0
-            total_steps = 0
-            completed_steps = 0
-            
-            if game.has_multiple_steps:
-                # For team-based progress, we need to implement alternative logic
-                # since teams don't directly track progress - this is done through matchups
-                current_step = None
-                current_step_instructions = None
-                progress = None
-                total_steps = game.get_ordered_steps().count()
-                completed_steps = 0
-                
-                # Try to find a matchup for this team and game
-                from django.db.models import Q
-                matchup = GameMatchup.objects.filter(
-                    Q(team1=team) | Q(team2=team),
-                    ai_game=game,
-                    status__in=['scheduled', 'in_progress']
-                ).first()
-                
-                if matchup and hasattr(matchup, 'get_current_step'):
-                    # Use matchup-based progress
-                    try:
-                        current_step_obj = matchup.get_current_step()
-                        if current_step_obj and hasattr(current_step_obj, 'step_number'):
-                            current_step = current_step_obj
-                            current_step_instructions = current_step.get_instructions_for_user(user)
-                        
-                        # Count completed steps from matchup
-                        for step_num in range(1, total_steps + 1):
-                            step_progress = matchup.get_progress_for_step(step_num)
-                            if step_progress and step_progress.is_completed:
-                                completed_steps += 1
-                    except:
-                        pass
-                
-                if total_steps > 0:
-                    progress_percentage = int((completed_steps / total_steps) * 100)
-                
-                # If we have no current step but the game has steps, try to get the first step
-                if not current_step and total_steps > 0:
-                    # Try to get the first step explicitly
-                    first_step = game.get_ordered_steps().first()
-                    if first_step:
-                        current_step = first_step
-                        current_step_instructions = current_step.get_instructions_for_user(user)
-            
-            assigned_games.append({
-                'game': game,
-                'team': team,
-                'participation': participation,
-                'current_step': current_step,
-                'current_step_url': team.get_current_step_url(game),
-                'first_step_url': None,  # No matchup available for participation-based games
-                'current_step_instructions': current_step_instructions,
-                'progress': progress,
-                'progress_percentage': progress_percentage,
-                'total_steps': total_steps,
-                'completed_steps': completed_steps,
-                'source': 'participation'
-            })
-    
-    # Also get games assigned through matchups
-    from .models import GameMatchup
-    for team in user_teams:
-        # Get matchups where this team is involved
-        matchups = GameMatchup.objects.filter(
-            models.Q(team1=team) | models.Q(team2=team),
-            status__in=['scheduled', 'in_progress']
-        ).select_related('ai_game', 'team1', 'team2')
-        
-        for matchup in matchups:
-            game = matchup.ai_game
-            
-            # Check if this game is already in assigned_games from participation
-            already_added = any(ag['game'].id == game.id and ag['team'].id == team.id for ag in assigned_games)
-            if already_added:
-                continue
-            
-            # Get current step if game has multiple steps
-            current_step = None
-            current_step_instructions = None
-            current_step_url = None
-            progress = None
-            progress_percentage = 0
-            total_steps = 0
-            completed_steps = 0
-            
-            if game.has_multiple_steps:
-                # For matchup-based games (like phoneme density), get progress from the matchup
-                try:
-                    # Get current step from matchup
-                    current_step_number = 1
-                    current_step = None
-                    current_step_instructions = None
-                    
-                    if hasattr(matchup, 'get_current_step'):
-                        current_step_obj = matchup.get_current_step()
-                        if current_step_obj and hasattr(current_step_obj, 'step_number'):
-                            current_step_number = current_step_obj.step_number
-                            current_step = current_step_obj
-                            current_step_instructions = current_step.get_instructions_for_user(user)
-                        else:
-                            current_step_number = 1
-                            # Get the first step
-                            first_step = game.get_step_by_number(1)
-                            if first_step:
-                                current_step = first_step
-                                current_step_instructions = current_step.get_instructions_for_user(user)
-                    
-                    # Get total steps from the game itself
-                    total_steps = game.steps.filter(is_active=True).count()
-                    completed_steps = 0
-                    for step_num in range(1, total_steps + 1):
-                        step_progress = matchup.get_progress_for_step(step_num)
-                        if step_progress and step_progress.is_completed:
-                            completed_steps += 1
-                    
-                    if total_steps > 0:
-                        progress_percentage = int((completed_steps / total_steps) * 100)
-                    
-                    # Get current step URL for this matchup using GameStep
-                    current_step_url = None
-                    if current_step_number:
-                        try:
-                            game_step = GameStep.objects.get(ai_game=matchup.ai_game, step_number=current_step_number)
-                            current_step_url = game_step.get_url(matchup.id)
-                            
-                        except GameStep.DoesNotExist:
-                            current_step_url = None
-                        
-                except Exception as e:
-                    # Fallback: Set defaults if matchup methods don't exist
-                    current_step = None
-                    current_step_instructions = None
-                    progress = None
-                    total_steps = game.steps.filter(is_active=True).count()
-                    completed_steps = 0
-                    if total_steps > 0:
-                        progress_percentage = int((completed_steps / total_steps) * 100)
-                    else:
-                        progress_percentage = 0
-                    current_step_url = team.get_current_step_url(game)
-                
-                # If we have no current step but the game has steps, try to get the first step
-                if not current_step and total_steps > 0:
-                    # Try to get the first step explicitly
-                    first_step = game.get_ordered_steps().first()
-                    if first_step:
-                        current_step = first_step
-                        current_step_instructions = current_step.get_instructions_for_user(user)
-            
-            # Calculate first_step_url
-            first_step_url = None
-            if game:
-                first_step_url = game.get_first_step_url(matchup.id)
-            
-            assigned_games.append({
-                'game': game,
-                'team': team,
-                'matchup': matchup,
-                'current_step': current_step,
-                'current_step_url': current_step_url,
-                'first_step_url': first_step_url,
-                'current_step_instructions': current_step_instructions,
-                'progress': progress,
-                'progress_percentage': progress_percentage,
-                'total_steps': total_steps,
-                'completed_steps': completed_steps,
-                'source': 'matchup',
-                'opponent_team': matchup.get_other_team(team)
-            })
+    # Games assigned to those teams through participations and matchups
+    assigned_games = load_student_dashboard(user, user_teams)
     
     # Get any pending team invitations
     pending_invitations = TeamInvitation.objects.filter(
@@ -768,13 +583,21 @@ def game_matchup_detail(request, matchup_id):
     from django.contrib import messages
     
     user_school = request.user.profile.school
-    matchup = get_object_or_404(GameMatchup, id=matchup_id, school=user_school)
+    matchup = get_object_or_404(
+        GameMatchup.objects.select_related('ai_game', 'team1', 'team2', 'created_by'), id=matchup_id, school=user_school
+    )
+    
+    is_teacher = hasattr(request.user, 'profile') and (request.user.profile.is_teacher or request.user.profile.is_admin)
+    
+    # Progress and team validations for every step
+    step_matrix = matchup.get_step_matrix()
     
     # Integrity check: Ensure validation-required steps are marked complete if both teams are validated
-    if hasattr(request.user, 'profile') and (request.user.profile.is_teacher or request.user.profile.is_admin):
-        completed_steps = matchup.check_and_complete_validation_steps()
+    if is_teacher:
+        completed_steps = matchup.check_and_complete_validation_steps(step_matrix)
         if completed_steps:
             messages.info(request, f"Steps {', '.join(map(str, completed_steps))} were automatically marked as complete based on team validations.")
+            step_matrix = matchup.get_step_matrix()
         
         # Check if the matchup should be marked as complete
         matchup_completed = matchup.check_and_complete_matchup()
@@ -785,57 +608,27 @@ def game_matchup_detail(request, matchup_id):
     team1_progress = []
     team2_progress = []
     
-    if matchup.ai_game.has_multiple_steps:
-        # For matchup-based games, progress is tracked through the matchup itself
-        # We'll get step-by-step progress in the step_progress_info section below
-        pass
-    
-    # Get step progression information for the matchup
-    is_teacher = hasattr(request.user, 'profile') and (request.user.profile.is_teacher or request.user.profile.is_admin)
-    current_step_number = 1
+    # Get step progression information for the matchup; None once all steps are completed
+    active_step_numbers = {step['game_step'].step_number for step in step_matrix}
+    current_step_number = matchup.current_step_number if matchup.current_step_number in active_step_numbers else None
     step_progress_info = []
     
-    # Get all GameSteps for this game
-    game_steps = matchup.ai_game.get_ordered_steps()
-    
-    if game_steps.exists():
-        # Check if this is a game with matchup-level step tracking
-        if hasattr(matchup, 'get_current_step'):
-            try:
-                current_step = matchup.get_current_step()
-                if current_step and hasattr(current_step, 'step_number'):
-                    current_step_number = current_step.step_number
-                else:
-                    # No current step (all completed) - set to None or last step
-                    current_step_number = None
-            except:
-                current_step_number = 1
-                
-        # Get progress for all steps using actual GameStep data
-        for game_step in game_steps:
-            step_num = game_step.step_number
-            
-            # Get progress for this step if the matchup supports it
-            progress = None
-            if hasattr(matchup, 'get_progress_for_step'):
-                try:
-                    progress = matchup.get_progress_for_step(step_num)
-                except:
-                    pass
-            
-            step_info = {
-                'step_number': step_num,
-                'game_step': game_step,  # Include the actual GameStep object
-                'step_url': game_step.get_url(matchup.id),  # Generate the dynamic URL
-                'is_completed': progress and progress.is_completed if progress else False,
-                'is_current': current_step_number is not None and step_num == current_step_number,
-                'completed_at': progress.completed_at if progress and progress.is_completed else None,
-                'can_complete': is_teacher and current_step_number is not None and step_num == current_step_number and (not progress or not progress.is_completed),
-                # Add team validation status
-                'team1_validated': matchup.is_team_validated_for_step(matchup.team1, step_num),
-                'team2_validated': matchup.is_team_validated_for_step(matchup.team2, step_num),
-            }
-            step_progress_info.append(step_info)
+    for step in step_matrix:
+        game_step = step['game_step']
+        step_num = game_step.step_number
+        is_current = current_step_number is not None and step_num == current_step_number
+        step_progress_info.append({
+            'step_number': step_num,
+            'game_step': game_step,  # Include the actual GameStep object
+            'step_url': game_step.get_url(matchup.id),  # Generate the dynamic URL
+            'is_completed': step['is_completed'],
+            'is_current': is_current,
+            'completed_at': step['completed_at'] if step['is_completed'] else None,
+            'can_complete': is_teacher and is_current and not step['is_completed'],
+            # Add team validation status
+            'team1_validated': step['team1_validated'],
+            'team2_validated': step['team2_validated'],
+        })
     
     context = {
         'matchup': matchup,
@@ -948,8 +741,8 @@ def validate_team_step(request, matchup_id, step_number, team_id):
         messages.success(request, f"Step {step_number} validated for {team.name}!")
         
         # Check if step is now complete (both teams validated)
-        step_progress = matchup.get_progress_for_step(step_number)
-        if step_progress and step_progress.is_completed:
+        matchup.refresh_progress_state()
+        if matchup.is_step_completed(step_number):
             messages.info(request, f"Step {step_number} is now complete - both teams validated!")
         else:
             # Check the other team's validation status
@@ -8,6 +8,7 @@ from django.urls import reverse
 from django.db import transaction
 import json
 
+from aigames.membership import get_matchup_membership
 from aigames.models import GameMatchup, MatchupStepProgress, InstructionStep
 from .models import TeamDetectorData, DetectorSubmission
 from .constants import TOTAL_STEPS, STEP_NAMES
@@ -19,11 +20,7 @@ def step1(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     # Get team data
     team_data, created = TeamDetectorData.objects.get_or_create(
@@ -88,11 +85,7 @@ def step2(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     # Get team data
     team_data = get_object_or_404(TeamDetectorData, matchup=matchup, team=user_team)
@@ -150,11 +143,7 @@ def step3(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     # Get team data
     team_data = get_object_or_404(TeamDetectorData, matchup=matchup, team=user_team)
@@ -226,11 +215,7 @@ def step4(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     # Get team data
     team_data = get_object_or_404(TeamDetectorData, matchup=matchup, team=user_team)
@@ -284,11 +269,7 @@ def complete_step(request, matchup_id, step_number):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     if not user_team:
         messages.error(request, "Vous ne faites pas partie de ce jeu.")
@@ -317,11 +298,7 @@ def save_step_data(request, matchup_id):
         matchup = get_object_or_404(GameMatchup, id=matchup_id)
         
         # Get user's team
-        user_team = None
-        if request.user in matchup.team1.members.all():
-            user_team = matchup.team1
-        elif request.user in matchup.team2.members.all():
-            user_team = matchup.team2
+        user_team = get_matchup_membership(request, matchup).team
         
         if not user_team:
             return JsonResponse({'success': False, 'error': 'Not part of this game'})
@@ -379,11 +356,7 @@ def reset_game(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
+    user_team = get_matchup_membership(request, matchup).team
     
     if not user_team:
         messages.error(request, "Vous ne faites pas partie de ce jeu.")
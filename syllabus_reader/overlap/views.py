@@ -8,31 +8,33 @@ from django.utils import timezone
 from django.urls import reverse
 import json
 
-from aigames.models import Team, GameMatchup, MatchupStepProgress, GameStep, TeamStepValidation
+from aigames.models import GameMatchup, TeamStepValidation
 from aigames.decorators import teacher_can_view_team, get_user_team_or_viewing_team, should_allow_form_submission
+from aigames.membership import get_matchup_membership
+from aigames.step_catalog import get_game_steps
 from .models import TeamOverlapData
 
 
 def get_overlap_game_step_info(step_number):
     """Get step information from the overlap game (game id 4) GameStep model"""
-    try:
-        game_step = GameStep.objects.get(ai_game_id=4, step_number=step_number)
-        return game_step.title
-    except GameStep.DoesNotExist:
-        # Fallback to default names if GameStep doesn't exist
-        fallback_names = {
-            1: 'Setup & Configuration',
-            2: 'Data Collection', 
-            3: 'Analysis & Comparison',
-            4: 'Interactive Evaluation',
-            5: 'Final Reflection'
-        }
-        return fallback_names.get(step_number, f'Step {step_number}')
+    for game_step in get_game_steps(4):
+        if game_step.step_number == step_number:
+            return game_step.title
+    
+    # Fallback to default names if GameStep doesn't exist
+    fallback_names = {
+        1: 'Setup & Configuration',
+        2: 'Data Collection', 
+        3: 'Analysis & Comparison',
+        4: 'Interactive Evaluation',
+        5: 'Final Reflection'
+    }
+    return fallback_names.get(step_number, f'Step {step_number}')
 
 
 def get_overlap_game_total_steps():
     """Get total number of steps for the overlap game (game id 4)"""
-    return GameStep.objects.filter(ai_game_id=4, is_active=True).count()
+    return sum(1 for game_step in get_game_steps(4) if game_step.is_active)
 
 
 @login_required
@@ -76,9 +78,8 @@ def step1(request, matchup_id):
         threshold_value = team_data.threshold_value
         overlap_mode = team_data.overlap_mode
     
-    # Check if step 1 is completed using MatchupStepProgress
-    step1_progress = matchup.get_progress_for_step(1)
-    step1_completed = step1_progress.is_completed if step1_progress else False
+    # Check if step 1 is completed
+    step1_completed = matchup.is_step_completed(1)
     
     # Get instructions for this step
     instructions = []
@@ -159,17 +160,15 @@ def step2(request, matchup_id):
     
     team_data = get_object_or_404(TeamOverlapData, team=user_team, matchup=matchup)
     
-    # Check if step 1 is completed using MatchupStepProgress (only for students)
-    step1_progress = matchup.get_progress_for_step(1)
-    step1_completed = step1_progress.is_completed if step1_progress else False
+    # Check if step 1 is completed (only for students)
+    step1_completed = matchup.is_step_completed(1)
     
     if not step1_completed and not hasattr(request, 'teacher_viewing_mode'):
         messages.warning(request, "You must complete Step 1 first.")
         return redirect('overlap:step1', matchup_id=matchup_id)
     
-    # Check if step 2 is completed using MatchupStepProgress
-    step2_progress = matchup.get_progress_for_step(2)
-    step2_completed = step2_progress.is_completed if step2_progress else False
+    # Check if step 2 is completed
+    step2_completed = matchup.is_step_completed(2)
     
     # Get instructions for this step
     instructions = []
@@ -216,17 +215,15 @@ def step3(request, matchup_id):
     
     team_data = get_object_or_404(TeamOverlapData, team=user_team, matchup=matchup)
     
-    # Check if step 2 is completed using MatchupStepProgress (only for students)
-    step2_progress = matchup.get_progress_for_step(2)
-    step2_completed = step2_progress.is_completed if step2_progress else False
+    # Check if step 2 is completed (only for students)
+    step2_completed = matchup.is_step_completed(2)
     
     if not step2_completed and not hasattr(request, 'teacher_viewing_mode'):
         messages.warning(request, "You must complete Step 2 before accessing Step 3.")
         return redirect('overlap:step2', matchup_id=matchup_id)
     
     # Check step 3 completion status - requires both teams to submit and be validated
-    step3_progress = matchup.get_progress_for_step(3)
-    step3_completed = step3_progress.is_completed if step3_progress else False
+    step3_completed = matchup.is_step_completed(3)
     
     # Get both teams' data to check if both have submitted and been validated
     other_team = matchup.get_other_team(user_team)
@@ -365,8 +362,7 @@ def step4(request, matchup_id):
         opponent_circle_y = opponent_team_data.circle_y
     
     # Check step 4 completion status for teacher validation
-    step4_progress = matchup.get_progress_for_step(4)
-    step4_completed = step4_progress.is_completed if step4_progress else False
+    step4_completed = matchup.is_step_completed(4)
     
     # Get both teams' data to check if both have submitted and been validated
     other_team = matchup.get_other_team(user_team)
@@ -573,12 +569,7 @@ def step5(request, matchup_id):
     # Get step 5 game step
     step5_game_step = matchup.ai_game.get_step_by_number(5)
     
-    # Check if this step has been submitted and validated
-    step5_progress = MatchupStepProgress.objects.filter(
-        matchup=matchup, 
-        game_step=step5_game_step
-    ).first()
-    
+    # Check if this step has been validated
     # Check if this team's step 5 work has been validated by teacher
     step5_validation = TeamStepValidation.objects.filter(
         matchup=matchup,
@@ -587,7 +578,7 @@ def step5(request, matchup_id):
     ).first()
     
     # Step 5 is the final step - determine submission and validation status
-    step5_submitted = step5_progress.is_completed if step5_progress else False
+    step5_submitted = matchup.is_step_completed(5)
     step5_validated = step5_validation.is_validated if step5_validation else False
     
     # Get instructions for this step
@@ -630,8 +621,7 @@ def reset_game(request, matchup_id):
     """Reset game progress"""
     if request.method == 'POST':
         matchup = get_object_or_404(GameMatchup, id=matchup_id)
-        user_team = Team.objects.filter(members=request.user, matchups_as_team1=matchup).first() or \
-                    Team.objects.filter(members=request.user, matchups_as_team2=matchup).first()
+        user_team = get_matchup_membership(request, matchup).team
         
         if user_team:
             try:
@@ -654,8 +644,7 @@ def save_data(request, matchup_id):
         try:
             data = json.loads(request.body)
             matchup = get_object_or_404(GameMatchup, id=matchup_id)
-            user_team = Team.objects.filter(members=request.user, matchups_as_team1=matchup).first() or \
-                        Team.objects.filter(members=request.user, matchups_as_team2=matchup).first()
+            user_team = get_matchup_membership(request, matchup).team
             
             if not user_team:
                 return JsonResponse({'success': False, 'error': 'Team not found'})
@@ -691,8 +680,7 @@ def save_strategy(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get the appropriate team (user's team, not teacher's viewing team)
-    user_team = Team.objects.filter(members=request.user, matchups_as_team1=matchup).first() or \
-                Team.objects.filter(members=request.user, matchups_as_team2=matchup).first()
+    user_team = get_matchup_membership(request, matchup).team
     
     if not user_team:
         messages.error(request, "You are not part of a team for this game.")
@@ -735,8 +723,7 @@ def save_click(request, matchup_id):
         matchup = get_object_or_404(GameMatchup, id=matchup_id)
         
         # Get the appropriate team (user's team, not teacher's viewing team)
-        user_team = Team.objects.filter(members=request.user, matchups_as_team1=matchup).first() or \
-                    Team.objects.filter(members=request.user, matchups_as_team2=matchup).first()
+        user_team = get_matchup_membership(request, matchup).team
         
         if not user_team:
             return JsonResponse({'success': False, 'error': 'You are not part of a team for this game.'})
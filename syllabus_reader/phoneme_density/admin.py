@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import TeamStep4Data, TeamText, PhonemeGuess, TextGuess
+from .models import (
+    TeamStep4Data, TeamText, PhonemeGuess, TextGuess, PhonemeBaseline, PhonemeRuleSet, PhonemeSpellingRule,
+    ReferenceTextSet, ReferenceText,
+)
 
 
 @admin.register(TeamStep4Data)
@@ -28,3 +31,40 @@ class TextGuessAdmin(admin.ModelAdmin):
     list_display = ['phoneme_guess', 'text_number', 'follows_rule', 'created_at']
     list_filter = ['follows_rule', 'phoneme_guess__matchup', 'text_number']
     search_fields = ['phoneme_guess__guessing_team__name']
+
+
+@admin.register(PhonemeBaseline)
+class PhonemeBaselineAdmin(admin.ModelAdmin):
+    list_display = ['name', 'is_active', 'total_characters', 'ruleset_version', 'created_at']
+    list_filter = ['is_active', 'created_at']
+    search_fields = ['name', 'source']
+    readonly_fields = ['phoneme_counts', 'frequencies', 'total_characters', 'ruleset_version', 'created_at']
+
+
+class PhonemeSpellingRuleInline(admin.TabularInline):
+    model = PhonemeSpellingRule
+    extra = 1
+
+
+@admin.register(PhonemeRuleSet)
+class PhonemeRuleSetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'description']
+    inlines = [PhonemeSpellingRuleInline]
+
+
+
+class ReferenceTextInline(admin.StackedInline):
+    model = ReferenceText
+    extra = 1
+    fields = ['order', 'title', 'content', 'is_phoneme_heavy', 'total_characters']
+    readonly_fields = ['is_phoneme_heavy', 'total_characters']
+
+
+@admin.register(ReferenceTextSet)
+class ReferenceTextSetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'ai_game', 'target_phoneme', 'is_active', 'updated_at']
+    list_filter = ['is_active', 'ai_game', 'target_phoneme']
+    search_fields = ['name', 'ai_game__title']
+    inlines = [ReferenceTextInline]
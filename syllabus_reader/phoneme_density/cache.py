@@ -0,0 +1,85 @@
+"""
+Cache helpers for matchup-level phoneme data
+
+Each matchup has a version stamp in the cache. Cached results are keyed by that
+stamp, so changing any of the matchup's texts invalidates all of them at once.
+
+The project uses Django's default per-process cache, so invalidating only
+reaches the process that saved the texts. Matchup results are therefore a
+short-lived cache: stamps and results expire after MATCHUP_CACHE_TIMEOUT, so
+other processes serve results at most that old, and recompute them (from the
+stored phoneme vectors) at most once per matchup in that time.
+"""
+import time
+
+from django.core.cache import cache
+
+from .constants import ENGLISH_PHONEME_FREQUENCIES
+from .rules import get_active_rule_spec
+
+CACHE_TIMEOUT = 60 * 60  # one hour, for per-game reference texts
+
+# Matchup results live this many seconds; other processes pick up text changes within it
+MATCHUP_CACHE_TIMEOUT = 30
+
+BASELINE_CACHE_KEY = 'phoneme_density:baseline'
+
+# Other processes pick up baseline changes within this many seconds
+BASELINE_TIMEOUT = 60
+
+
+def _version_key(matchup_id):
+    return f'phoneme_density:matchup:{matchup_id}:version'
+
+
+def get_matchup_cache_version(matchup_id):
+    """Get the current cache version stamp for a matchup"""
+    version = cache.get(_version_key(matchup_id))
+    if version is None:
+        version = time.time_ns()
+        cache.set(_version_key(matchup_id), version, MATCHUP_CACHE_TIMEOUT)
+    return version
+
+
+def invalidate_matchup_cache(matchup_id):
+    """Invalidate every cached result for a matchup (call when its texts change)"""
+    cache.set(_version_key(matchup_id), time.time_ns(), MATCHUP_CACHE_TIMEOUT)
+
+
+def matchup_cache_key(matchup_id, name, *parts):
+    """
+    Build a cache key tied to the matchup's version, the counting rule set and
+    the baseline. Cache the result for MATCHUP_CACHE_TIMEOUT.
+    """
+    version = get_matchup_cache_version(matchup_id)
+    rules_version = get_active_rule_spec()['version']
+    baseline_version = get_baseline()[0]
+    suffix = ':'.join(str(part) for part in parts)
+    return f'phoneme_density:matchup:{matchup_id}:{version}:{rules_version}:{baseline_version}:{name}:{suffix}'
+
+
+def get_baseline():
+    """
+    The active baseline as (version, {phoneme: percentage}). Uses the newest
+    active PhonemeBaseline, falling back to ENGLISH_PHONEME_FREQUENCIES (version 0).
+    Cached until a baseline is saved or deleted, or for BASELINE_TIMEOUT in
+    other processes.
+    """
+    baseline = cache.get(BASELINE_CACHE_KEY)
+    if baseline is None:
+        from .models import PhonemeBaseline
+
+        active = PhonemeBaseline.objects.filter(is_active=True).order_by('-created_at').first()
+        stored = active.frequencies if active else {}
+        frequencies = {
+            phoneme: stored.get(phoneme, default)
+            for phoneme, default in ENGLISH_PHONEME_FREQUENCIES.items()
+        }
+        baseline = (active.pk if active else 0, frequencies)
+        cache.set(BASELINE_CACHE_KEY, baseline, BASELINE_TIMEOUT)
+    return baseline
+
+
+def get_baseline_frequencies():
+    """Baseline English frequencies ({phoneme: percentage}) used by the analysis views"""
+    return get_baseline()[1]
@@ -0,0 +1,84 @@
+"""
+Phoneme rule classifier for Step 6 of the phoneme density game
+
+A small logistic regression, written in NumPy, that learns what a text that
+"follows the phoneme rule" looks like from one team's texts and then scores the
+opponent's texts. Features are phoneme-agnostic (the sorted z-scores of each
+text against baseline English), so a model trained on texts overusing /f/ can
+recognise texts overusing /l/. Training and scoring take about a millisecond
+for 8 + 8 texts.
+
+This module has no Django dependencies.
+"""
+import numpy as np
+
+from .engine import phoneme_statistics
+
+# Z-score above which a phoneme is considered deliberately overused (p < 0.05)
+RULE_Z_THRESHOLD = 2.0
+
+NEWTON_ITERATIONS = 15
+L2_PENALTY = 0.1
+
+
+def rule_labels(counts, totals, baseline, phoneme_index):
+    """Whether each text follows the rule: its selected phoneme has z >= RULE_Z_THRESHOLD"""
+    z_scores = phoneme_statistics(counts, totals, baseline)['z_scores']
+    return z_scores[:, phoneme_index] >= RULE_Z_THRESHOLD
+
+
+def text_features(counts, totals, baseline):
+    """
+    Phoneme-agnostic features for each text: the highest z-score, the gap to
+    the second highest, and the log of the text length.
+    """
+    z_scores = phoneme_statistics(counts, totals, baseline)['z_scores']
+    ordered = -np.sort(-z_scores, axis=1)
+    top = ordered[:, 0]
+    gap = ordered[:, 0] - ordered[:, 1] if ordered.shape[1] > 1 else ordered[:, 0]
+    length = np.log1p(np.asarray(totals, dtype=float))
+    return np.column_stack([top, gap, length])
+
+
+def _sigmoid(values):
+    return 1 / (1 + np.exp(-np.clip(values, -30, 30)))
+
+
+def train(features, labels):
+    """
+    Fit an L2-regularised logistic regression with Newton's method.
+    Returns the parameters as a dict of plain lists (safe to cache).
+    """
+    features = np.asarray(features, dtype=float)
+    labels = np.asarray(labels, dtype=float)
+
+    # Standardise with the training team's statistics, plus a bias column
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1
+    x = np.column_stack([(features - mean) / scale, np.ones(len(labels))])
+
+    # The bias is not penalised
+    penalty = np.full(x.shape[1], L2_PENALTY * len(labels))
+    penalty[-1] = 0
+
+    params = np.zeros(x.shape[1])
+    for _ in range(NEWTON_ITERATIONS):
+        probabilities = _sigmoid(x @ params)
+        gradient = x.T @ (probabilities - labels) + penalty * params
+        curvature = np.maximum(probabilities * (1 - probabilities), 1e-6)
+        hessian = (x.T * curvature) @ x + np.diag(penalty)
+        params -= np.linalg.solve(hessian, gradient)
+
+    return {
+        'weights': params[:-1].tolist(),
+        'bias': float(params[-1]),
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+    }
+
+
+def predict_proba(model, features):
+    """Probability that each text follows the rule under a trained model"""
+    x = (np.asarray(features, dtype=float) - model['mean']) / model['scale']
+    return _sigmoid(x @ np.asarray(model['weights']) + model['bias'])
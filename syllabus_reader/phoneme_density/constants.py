@@ -29,6 +29,64 @@ ENGLISH_PHONEME_FREQUENCIES = {
     'y': 2.0,
 }
 
+# Default spelling patterns counted for each phoneme (regular expressions matched
+# against lowercased text), used when no PhonemeRuleSet is active. Phonemes
+# without an entry are counted by their letter.
+PHONEME_SPELLING_RULES = {
+    'f': ['f', 'ph', 'gh'],
+    'k': ['k', 'ck', 'c(?=[aiou])', 'qu'],
+    'sh': ['sh', 'ti(?=on)', 'ci(?=al|an)', 'si(?=on)', 'ch(?=ef|ai)'],
+    'ch': ['ch', 'tch', 'tu(?=re)'],
+    'j': ['j', 'dge', 'g(?=[ei])'],
+    'th': ['th'],
+    'dh': ['th'],
+    'zh': ['ge(?=$|[^aeiou])', 'si(?=on)', 's(?=ure|ion)'],
+    'ng': ['ng', 'n(?=[kg])'],
+    'z': ['z', 's(?=[^aeiou]|$)'],
+}
+
+# Reference texts shown in steps 1-3 when a game has no active ReferenceTextSet
+DEFAULT_TARGET_PHONEME = 'r'
+
+DEFAULT_REFERENCE_TEXTS = [
+    {
+        'title': 'Text 1',
+        'content': (
+            "Rosemary arranged a rare garden tour, where visitors could explore vibrant flowers growing "
+            "near rivers and rustic terraces. The air carried crisp aromas of herbs, encouraging everyone "
+            "to breathe deeply. Around every corner, intricate pathways curved gracefully, revealing serene "
+            "retreats and orchard rows."
+        ),
+    },
+    {
+        'title': 'Text 2',
+        'content': (
+            "Cooking is a creative process that blends skill, practice, and patience. Chefs and home cooks "
+            "alike experiment with flavors, textures, and techniques to craft delicious meals. Selecting "
+            "fresh ingredients is essential for building taste, whether preparing a simple salad or a "
+            "complex stew."
+        ),
+    },
+    {
+        'title': 'Text 3',
+        'content': (
+            "The landscape of Savoy, located in the Western Alps of France, is defined by its dramatic "
+            "mountains, deep valleys, and picturesque lakes. Snow-capped peaks, such as those in the Savoy "
+            "Alps and the Vanoise National Park, rise above green pastures and forests. Winding rivers, "
+            "like the Isère and Arc, shape fertile valleys where villages and vineyards thrive."
+        ),
+    },
+    {
+        'title': 'Text 4',
+        'content': (
+            "Throughout recorded history, remarkable rulers and ordinary people alike have transformed our "
+            "world. Researchers carefully explore archives, searching for rare records that reveal important "
+            "truths. In various eras, revolutions reshaped borders and reorganized societies, inspiring "
+            "reformers and critics."
+        ),
+    },
+]
+
 # Convenience function to get just the phoneme codes
 def get_phoneme_codes():
     """Return list of just the phoneme codes (e.g., ['r', 's', 't', ...])"""
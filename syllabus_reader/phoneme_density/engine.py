@@ -0,0 +1,343 @@
+"""
+Phoneme counting engine for the phoneme density game
+
+A PhonemeCounter compiles a set of spelling rules once and counts every
+phoneme from a single lowercased copy of the text. Each distinct spelling is
+counted once per text (shared spellings such as 'th' for /th/ and /dh/ are not
+recounted): plain letter sequences with str.count, context-sensitive patterns
+with their precompiled regular expression. Occurrences of each spelling are
+counted independently and without overlap, matching the JavaScript counter
+that step 4 builds from the same rule spec. PhonemeCounter.analyze makes the
+same scan but also records the [start, end, phoneme] offsets of every match,
+so highlighted text can later be rendered by slicing (highlight_segments).
+
+compile_rules keeps one compiled counter per rule-set version per process, so
+rule sets loaded from the database are never recompiled per request.
+
+phoneme_statistics turns a texts x phonemes count matrix into frequencies,
+standard errors, z-scores and target probabilities with NumPy array operations.
+bootstrap_intervals resamples a text's words to put confidence intervals on its
+own phoneme densities.
+
+This module has no Django dependencies so it can also be used from worker
+processes.
+"""
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .constants import ENGLISH_PHONEME_FREQUENCIES, PHONEME_SPELLING_RULES
+
+LITERAL_SPELLING = re.compile(r'^[a-z]+$')
+WORD = re.compile(r'\S+')
+
+# Bootstrap resamples, bounded so that resamples x words stays within an
+# interactive request (under 100 ms for 500,000 drawn words)
+BOOTSTRAP_RESAMPLES = 1000
+MIN_BOOTSTRAP_RESAMPLES = 200
+MAX_BOOTSTRAP_DRAWS = 500_000
+
+
+def content_hash(text):
+    """Hash of a text's content, used to detect when stored counts are stale"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def count_characters(text):
+    """Count characters excluding spaces (the density denominator)"""
+    return len(text) - text.count(' ')
+
+
+def ruleset_version(rules):
+    """Short hash identifying a rule set ({phoneme: [patterns]})"""
+    serialized = json.dumps(rules, sort_keys=True)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()[:12]
+
+
+class PhonemeCounter:
+    """Counts several phonemes from compiled spelling rules"""
+
+    def __init__(self, rules):
+        """rules maps each phoneme to a list of spelling patterns"""
+        self.rules = {phoneme: list(patterns) for phoneme, patterns in rules.items()}
+        self.phonemes = list(self.rules)
+
+        # Identifies the rule set so stored counts can be recomputed when it changes
+        self.version = ruleset_version(self.rules)
+
+        # Compile each distinct spelling once; letter sequences need no regex
+        self.literals = []
+        self.patterns = []
+        self.spelling_phonemes = {}
+        for phoneme, phoneme_patterns in self.rules.items():
+            for pattern in phoneme_patterns:
+                if pattern in self.spelling_phonemes:
+                    self.spelling_phonemes[pattern].append(phoneme)
+                    continue
+                self.spelling_phonemes[pattern] = [phoneme]
+                if LITERAL_SPELLING.match(pattern):
+                    self.literals.append(pattern)
+                else:
+                    self.patterns.append(re.compile(pattern))
+
+    def count_spellings(self, text_lower):
+        """Count every distinct spelling in already-lowercased text"""
+        spelling_counts = {literal: text_lower.count(literal) for literal in self.literals}
+        for compiled in self.patterns:
+            spelling_counts[compiled.pattern] = len(compiled.findall(text_lower))
+        return spelling_counts
+
+    def find_spellings(self, text_lower):
+        """Find every distinct spelling in already-lowercased text: {pattern: [(start, end), ...]}"""
+        spelling_matches = {}
+        for literal in self.literals:
+            matches = []
+            start = text_lower.find(literal)
+            while start != -1:
+                matches.append((start, start + len(literal)))
+                start = text_lower.find(literal, start + len(literal))
+            spelling_matches[literal] = matches
+        for compiled in self.patterns:
+            spelling_matches[compiled.pattern] = [match.span() for match in compiled.finditer(text_lower)]
+        return spelling_matches
+
+    def sum_spellings(self, spelling_counts):
+        """Add up per-spelling counts into {phoneme: count}"""
+        return {
+            phoneme: sum(spelling_counts[pattern] for pattern in patterns)
+            for phoneme, patterns in self.rules.items()
+        }
+
+    def count(self, text):
+        """Return ({phoneme: count}, total_characters) for a text"""
+        if not text:
+            return dict.fromkeys(self.phonemes, 0), 0
+
+        text_lower = text.lower()
+        counts = self.sum_spellings(self.count_spellings(text_lower))
+        return counts, count_characters(text_lower)
+
+    def analyze(self, text):
+        """
+        Return ({phoneme: count}, total_characters, spans) for a text, where spans
+        is a list of [start, end, phoneme] for every counted match, sorted by
+        offset. A spelling shared by several phonemes gives one span per phoneme.
+        """
+        if not text:
+            return dict.fromkeys(self.phonemes, 0), 0, []
+
+        text_lower = text.lower()
+        spelling_matches = self.find_spellings(text_lower)
+        counts = self.sum_spellings({pattern: len(matches) for pattern, matches in spelling_matches.items()})
+        spans = sorted(
+            [start, end, phoneme]
+            for pattern, matches in spelling_matches.items()
+            for phoneme in self.spelling_phonemes[pattern]
+            for start, end in matches
+        )
+        return counts, count_characters(text_lower), spans
+
+    def frequencies(self, text):
+        """Return {phoneme: percentage of non-space characters} for a text"""
+        counts, total_characters = self.count(text)
+        if total_characters == 0:
+            return dict.fromkeys(self.phonemes, 0)
+        return {phoneme: count / total_characters * 100 for phoneme, count in counts.items()}
+
+
+def highlight_segments(text, spans, phonemes):
+    """
+    Split a text into (text, is_highlighted) segments using stored spans,
+    highlighting the matches of the given phonemes. Overlapping matches are
+    merged into one highlighted segment.
+    """
+    if isinstance(phonemes, str):
+        phonemes = {phonemes}
+    segments = []
+    position = 0
+    highlight_start = highlight_end = None
+    for start, end, phoneme in spans:
+        if phoneme not in phonemes or end <= start:
+            continue
+        if highlight_end is not None and start <= highlight_end:
+            highlight_end = max(highlight_end, end)
+            continue
+        if highlight_end is not None:
+            segments.append((text[position:highlight_start], False))
+            segments.append((text[highlight_start:highlight_end], True))
+            position = highlight_end
+        highlight_start, highlight_end = start, end
+    if highlight_end is not None:
+        segments.append((text[position:highlight_start], False))
+        segments.append((text[highlight_start:highlight_end], True))
+        position = highlight_end
+    segments.append((text[position:], False))
+    return [segment for segment in segments if segment[0]]
+
+
+def get_rules_for_phonemes(phonemes, rules=None):
+    """Get spelling rules for the given phonemes, defaulting to the phoneme's letters"""
+    if rules is None:
+        rules = PHONEME_SPELLING_RULES
+    return {
+        phoneme: list(rules.get(phoneme) or [re.escape(phoneme)])
+        for phoneme in phonemes
+    }
+
+
+_compiled_counters = {}
+
+
+def compile_rules(rules):
+    """Get the compiled counter for a rule set, compiling it once per process per version"""
+    version = ruleset_version(rules)
+    counter = _compiled_counters.get(version)
+    if counter is None:
+        counter = _compiled_counters[version] = PhonemeCounter(rules)
+    return counter
+
+
+@lru_cache(maxsize=None)
+def get_phoneme_counter(phonemes=None):
+    """
+    Get the compiled counter for a tuple of phonemes (cached per process).
+    Defaults to every phoneme in ENGLISH_PHONEME_FREQUENCIES.
+    """
+    if phonemes is None:
+        phonemes = tuple(ENGLISH_PHONEME_FREQUENCIES)
+    return PhonemeCounter(get_rules_for_phonemes(phonemes))
+
+
+def count_phonemes(text):
+    """Count every baseline phoneme in one pass: ({phoneme: count}, total_characters)"""
+    return get_phoneme_counter().count(text)
+
+
+def phoneme_frequencies(text):
+    """Percentage of each baseline phoneme in a text"""
+    return get_phoneme_counter().frequencies(text)
+
+
+def count_chunk(text, rules=None):
+    """Count phonemes in a corpus chunk with the given rule set (used by worker processes)"""
+    if rules is None:
+        return count_phonemes(text)
+    return compile_rules(rules).count(text)
+
+
+def iter_text_chunks(stream, chunk_size=1024 * 1024):
+    """
+    Read a text stream in chunks of about chunk_size characters, splitting only
+    after whitespace so no spelling pattern is cut across two chunks.
+    """
+    remainder = ''
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        block = remainder + block
+        split_at = max(block.rfind(' '), block.rfind('\n'), block.rfind('\t'))
+        if split_at == -1:
+            remainder = block
+            continue
+        remainder = block[split_at + 1:]
+        yield block[:split_at + 1]
+    if remainder:
+        yield remainder
+
+
+def phoneme_statistics(counts, totals, baseline):
+    """
+    Compare phoneme counts against baseline English frequencies.
+
+    counts is a texts x phonemes array, totals the non-space character count of
+    each text and baseline the expected percentage of each phoneme. Returns a
+    dict of texts x phonemes arrays: frequencies (%), standard_errors (95%
+    interval, in %), z_scores and probabilities (% chance each phoneme is the
+    overweighted target). Texts without characters get zero frequencies and
+    z-scores and equal probabilities.
+    """
+    counts = np.atleast_2d(np.asarray(counts, dtype=float))
+    totals = np.asarray(totals, dtype=float).reshape(-1, 1)
+    expected = np.asarray(baseline, dtype=float)
+
+    has_text = totals > 0
+    safe_totals = np.where(has_text, totals, 1)
+
+    frequencies = np.where(has_text, counts / safe_totals * 100, 0)
+
+    # SE = sqrt(p * (1-p) / n) where n is the text length, in percent
+    p = expected / 100
+    standard_error = np.where(has_text, np.sqrt(p * (1 - p) / safe_totals) * 100, 0)
+
+    # z-score: how many standard errors each phoneme sits above its baseline
+    z_scores = np.divide(
+        frequencies - expected, standard_error,
+        out=np.zeros_like(frequencies), where=standard_error > 0,
+    )
+
+    # Only positive deviations count towards being the target phoneme
+    likelihoods = np.maximum(z_scores, 0)
+    likelihood_totals = likelihoods.sum(axis=1, keepdims=True)
+    probabilities = np.where(
+        likelihood_totals > 0,
+        likelihoods / np.where(likelihood_totals > 0, likelihood_totals, 1) * 100,
+        100 / counts.shape[1],
+    )
+
+    return {
+        'frequencies': frequencies,
+        'standard_errors': standard_error * 1.96,
+        'z_scores': z_scores,
+        'probabilities': probabilities,
+    }
+
+
+def word_count_matrix(text, spans, phonemes):
+    """
+    Per-word phoneme counts from a text's spans ([start, end, phoneme]).
+    Returns (words x phonemes count array, length of each word).
+    """
+    words = [match.span() for match in WORD.finditer(text)]
+    starts = np.array([start for start, _ in words], dtype=np.int64)
+    lengths = np.array([end - start for start, end in words], dtype=float)
+    counts = np.zeros((len(words), len(phonemes)))
+
+    columns = {phoneme: column for column, phoneme in enumerate(phonemes)}
+    counted = [(start, columns[phoneme]) for start, _, phoneme in spans if phoneme in columns]
+    if words and counted:
+        span_starts, span_columns = np.array(counted, dtype=np.int64).T
+        rows = np.searchsorted(starts, span_starts, side='right') - 1
+        inside = rows >= 0
+        np.add.at(counts, (rows[inside], span_columns[inside]), 1)
+    return counts, lengths
+
+
+def bootstrap_intervals(word_counts, word_lengths, confidence=95, seed=None):
+    """
+    Percentile bootstrap intervals for a text's phoneme densities (%). Words are
+    resampled with replacement; each resample is a row of multinomial word
+    weights, so all resamples are evaluated with two matrix products. Returns
+    (lower, upper) arrays with one value per phoneme.
+    """
+    word_counts = np.asarray(word_counts, dtype=float)
+    word_lengths = np.asarray(word_lengths, dtype=float)
+    words = len(word_lengths)
+    if words == 0:
+        zeros = np.zeros(word_counts.shape[1] if word_counts.ndim == 2 else 0)
+        return zeros, zeros
+
+    resamples = max(MIN_BOOTSTRAP_RESAMPLES, min(BOOTSTRAP_RESAMPLES, MAX_BOOTSTRAP_DRAWS // words))
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(words, np.full(words, 1 / words), size=resamples)
+
+    counts = weights @ word_counts
+    totals = weights @ word_lengths
+    densities = counts / np.maximum(totals, 1)[:, None] * 100
+
+    tail = (100 - confidence) / 2
+    lower, upper = np.percentile(densities, [tail, 100 - tail], axis=0)
+    return lower, upper
@@ -0,0 +1,84 @@
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from phoneme_density.constants import ENGLISH_PHONEME_FREQUENCIES
+from phoneme_density.engine import count_chunk, iter_text_chunks
+from phoneme_density.models import PhonemeBaseline
+from phoneme_density.rules import get_active_rule_spec
+
+
+class Command(BaseCommand):
+    help = 'Compute baseline phoneme frequencies from a text corpus and store them as a new baseline version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Corpus text files (UTF-8)')
+        parser.add_argument('--name', default='', help='Name for this baseline (defaults to the file names)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+        parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help='Characters per chunk')
+        parser.add_argument('--no-activate', action='store_true', help='Store the baseline without making it active')
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        for path in paths:
+            if not os.path.isfile(path):
+                raise CommandError(f'Corpus file not found: {path}')
+
+        workers = max(1, options['workers'])
+        spec = get_active_rule_spec()
+        counts = Counter()
+        total_characters = 0
+        chunks = 0
+
+        # Keep a bounded number of chunks in flight so the corpus is never held in memory
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for path in paths:
+                self.stdout.write(f'Reading {path}')
+                with open(path, encoding='utf-8', errors='replace') as corpus:
+                    for chunk in iter_text_chunks(corpus, options['chunk_size']):
+                        if len(pending) >= workers * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                chunk_counts, chunk_characters = future.result()
+                                counts.update(chunk_counts)
+                                total_characters += chunk_characters
+                        pending.add(executor.submit(count_chunk, chunk, spec['rules']))
+                        chunks += 1
+
+            for future in pending:
+                chunk_counts, chunk_characters = future.result()
+                counts.update(chunk_counts)
+                total_characters += chunk_characters
+
+        if total_characters == 0:
+            raise CommandError('The corpus contains no characters to count.')
+
+        phonemes = list(ENGLISH_PHONEME_FREQUENCIES)
+        frequencies = {phoneme: counts[phoneme] / total_characters * 100 for phoneme in phonemes}
+
+        with transaction.atomic():
+            if not options['no_activate']:
+                PhonemeBaseline.objects.filter(is_active=True).update(is_active=False)
+            baseline = PhonemeBaseline.objects.create(
+                name=options['name'] or ', '.join(os.path.basename(path) for path in paths),
+                source='\n'.join(os.path.abspath(path) for path in paths),
+                ruleset_version=spec['version'],
+                phoneme_counts={phoneme: counts[phoneme] for phoneme in phonemes},
+                total_characters=total_characters,
+                frequencies=frequencies,
+                is_active=not options['no_activate'],
+            )
+
+        self.stdout.write(f'Counted {total_characters} characters in {chunks} chunks')
+        for phoneme, frequency in frequencies.items():
+            self.stdout.write(f'  /{phoneme}/: {frequency:.2f}%')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Stored baseline "{baseline.name}" (v{baseline.pk})'
+                f'{" and made it active" if baseline.is_active else ""}'
+            )
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0003_phonemeguess_textguess'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamtext',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='teamtext',
+            name='phoneme_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='teamtext',
+            name='ruleset_version',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0004_teamtext_phoneme_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamstep4data',
+            name='autosave_revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0005_teamstep4data_autosave_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhonemeBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('source', models.TextField(blank=True)),
+                ('ruleset_version', models.CharField(max_length=40)),
+                ('phoneme_counts', models.JSONField(default=dict)),
+                ('total_characters', models.BigIntegerField(default=0)),
+                ('frequencies', models.JSONField(default=dict)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'get_latest_by': 'created_at',
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Snapshot of PHONEME_SPELLING_RULES when rule sets moved into the database
+DEFAULT_RULES = {
+    'f': ['f', 'ph', 'gh'],
+    'k': ['k', 'ck', 'c(?=[aiou])', 'qu'],
+    'sh': ['sh', 'ti(?=on)', 'ci(?=al|an)', 'si(?=on)', 'ch(?=ef|ai)'],
+    'ch': ['ch', 'tch', 'tu(?=re)'],
+    'j': ['j', 'dge', 'g(?=[ei])'],
+    'th': ['th'],
+    'dh': ['th'],
+    'zh': ['ge(?=$|[^aeiou])', 'si(?=on)', 's(?=ure|ion)'],
+    'ng': ['ng', 'n(?=[kg])'],
+    'z': ['z', 's(?=[^aeiou]|$)'],
+}
+
+
+def create_default_rule_set(apps, schema_editor):
+    """Create the active default rule set from the previously hard-coded rules"""
+    PhonemeRuleSet = apps.get_model('phoneme_density', 'PhonemeRuleSet')
+    PhonemeSpellingRule = apps.get_model('phoneme_density', 'PhonemeSpellingRule')
+    rule_set = PhonemeRuleSet.objects.create(
+        name='Default spelling rules',
+        description='Spelling patterns for each phoneme; phonemes without rules are counted by their letter.',
+        is_active=True,
+    )
+    PhonemeSpellingRule.objects.bulk_create([
+        PhonemeSpellingRule(rule_set=rule_set, phoneme=phoneme, pattern=pattern, order=order)
+        for phoneme, patterns in DEFAULT_RULES.items()
+        for order, pattern in enumerate(patterns)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0006_phonemebaseline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhonemeRuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-is_active', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PhonemeSpellingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phoneme', models.CharField(max_length=10)),
+                ('pattern', models.CharField(help_text='Regular expression matched against lowercased text (must also be valid in JavaScript)', max_length=100)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('rule_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='phoneme_density.phonemeruleset')),
+            ],
+            options={
+                'ordering': ['rule_set', 'phoneme', 'order', 'id'],
+            },
+        ),
+        migrations.RunPython(create_default_rule_set, migrations.RunPython.noop),
+    ]
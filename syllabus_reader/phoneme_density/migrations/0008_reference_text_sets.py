@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aigames', '0031_alter_teamstepvalidation_options_and_more'),
+        ('phoneme_density', '0007_phoneme_rule_sets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceTextSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('target_phoneme', models.CharField(default='r', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ai_game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reference_text_sets', to='aigames.aigame')),
+            ],
+            options={
+                'ordering': ['ai_game', '-is_active', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferenceText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('content', models.TextField()),
+                ('phoneme_counts', models.JSONField(blank=True, default=dict)),
+                ('total_characters', models.IntegerField(default=0)),
+                ('is_phoneme_heavy', models.BooleanField(default=False)),
+                ('highlight_spans', models.JSONField(blank=True, default=list)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('ruleset_version', models.CharField(blank=True, max_length=40)),
+                ('text_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='texts', to='phoneme_density.referencetextset')),
+            ],
+            options={
+                'ordering': ['text_set', 'order', 'id'],
+            },
+        ),
+    ]
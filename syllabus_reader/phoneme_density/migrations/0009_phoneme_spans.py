@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+def mark_vectors_stale(apps, schema_editor):
+    """Clear the content hashes so stored vectors are recomputed with their spans"""
+    apps.get_model('phoneme_density', 'TeamText').objects.update(content_hash='')
+    apps.get_model('phoneme_density', 'ReferenceText').objects.update(content_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0008_reference_text_sets'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='referencetext',
+            name='highlight_spans',
+        ),
+        migrations.AddField(
+            model_name='referencetext',
+            name='phoneme_spans',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='teamtext',
+            name='phoneme_spans',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(mark_vectors_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phoneme_density', '0009_phoneme_spans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phonemeguess',
+            name='score',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='phonemeguess',
+            name='score_version',
+            field=models.CharField(blank=True, max_length=80),
+        ),
+        migrations.AddField(
+            model_name='phonemeguess',
+            name='scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:33
+
+import hashlib
+import re
+import zlib
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+# A frozen copy of the hashing in phoneme_density.similarity as of this
+# migration; signatures and buckets must match what that module computes
+SHINGLE_SIZE = 5
+NUM_HASHES = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // LSH_BANDS
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240617)
+_HASH_A = _rng.integers(1, _PRIME, size=NUM_HASHES, dtype=np.int64)
+_HASH_B = _rng.integers(0, _PRIME, size=NUM_HASHES, dtype=np.int64)
+
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def minhash_signature(text):
+    """MinHash signature (NUM_HASHES ints) of a text's character shingles, or []"""
+    normalized = NON_WORD.sub(' ', text.lower()).strip()
+    if not normalized:
+        return []
+    if len(normalized) <= SHINGLE_SIZE:
+        text_shingles = {normalized}
+    else:
+        text_shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = np.array([zlib.crc32(shingle.encode('utf-8')) % _PRIME for shingle in text_shingles], dtype=np.int64)
+    return ((_HASH_A[:, None] * hashes + _HASH_B[:, None]) % _PRIME).min(axis=1).tolist()
+
+
+def band_buckets(signature):
+    """(band, bucket) for each LSH band of a signature, buckets as signed 64-bit ints"""
+    buckets = []
+    for band in range(LSH_BANDS if signature else 0):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(f'{band}:{rows}'.encode('ascii'), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def index_existing_texts(apps, schema_editor):
+    """Sign every existing text and fill the LSH index"""
+    TeamText = apps.get_model('phoneme_density', 'TeamText')
+    TeamTextBand = apps.get_model('phoneme_density', 'TeamTextBand')
+    team_texts = list(TeamText.objects.exclude(content='').select_related('step4_data__matchup'))
+    for team_text in team_texts:
+        team_text.minhash_signature = minhash_signature(team_text.content)
+    TeamText.objects.bulk_update(team_texts, ['minhash_signature'], batch_size=500)
+    TeamTextBand.objects.bulk_create([
+        TeamTextBand(team_text=team_text, school_id=team_text.step4_data.matchup.school_id, band=band, bucket=bucket)
+        for team_text in team_texts
+        for band, bucket in band_buckets(team_text.minhash_signature)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aigames', '0031_alter_teamstepvalidation_options_and_more'),
+        ('phoneme_density', '0010_phonemeguess_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamtext',
+            name='minhash_signature',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='TeamTextBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='aigames.school')),
+                ('team_text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_bands', to='phoneme_density.teamtext')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'bucket'], name='phoneme_den_school__56c4c0_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_texts, migrations.RunPython.noop),
+    ]
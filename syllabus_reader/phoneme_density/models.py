@@ -1,6 +1,19 @@
-from django.db import models
+import re
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
-from aigames.models import GameMatchup, Team
+from aigames.models import AiGame, GameMatchup, School, Team
+from .cache import BASELINE_CACHE_KEY, invalidate_matchup_cache
+from .constants import DEFAULT_TARGET_PHONEME
+from .engine import compile_rules, content_hash, highlight_segments
+from .reference import annotate_reference_text, invalidate_reference_texts
+from .rules import RULE_SPEC_CACHE_KEY, get_active_counter
+from .scoring import rescore_matchup
+from .similarity import index_team_texts
 
 
 class TeamStep4Data(models.Model):
@@ -9,6 +22,9 @@ class TeamStep4Data(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
     selected_phoneme = models.CharField(max_length=10, blank=True, null=True)
     
+    # Incremented on every autosave so stale autosaves can be rejected
+    autosave_revision = models.PositiveIntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -43,6 +59,15 @@ class TeamText(models.Model):
     total_characters = models.IntegerField(default=0)  # excluding spaces
     phoneme_density = models.FloatField(default=0.0)  # percentage
     
+    # Counts for every phoneme, refreshed when content or the rule set changes
+    phoneme_counts = models.JSONField(default=dict, blank=True)
+    phoneme_spans = models.JSONField(default=list, blank=True)  # [start, end, phoneme] of every match
+    content_hash = models.CharField(max_length=64, blank=True)
+    ruleset_version = models.CharField(max_length=40, blank=True)
+    
+    # MinHash of the content for near-duplicate detection (see similarity.py)
+    minhash_signature = models.JSONField(default=list, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -51,22 +76,54 @@ class TeamText(models.Model):
         unique_together = ['step4_data', 'text_number']
         ordering = ['text_number']
     
+    def refresh_phoneme_vector(self):
+        """Recount every phoneme if the content or rule set changed. Returns True if recounted"""
+        counter = get_active_counter()
+        digest = content_hash(self.content)
+        if digest == self.content_hash and counter.version == self.ruleset_version:
+            return False
+        
+        self.phoneme_counts, self.total_characters, self.phoneme_spans = counter.analyze(self.content)
+        self.content_hash = digest
+        self.ruleset_version = counter.version
+        return True
+    
+    def get_phoneme_vector(self):
+        """Return ({phoneme: count}, total_characters), refreshing stale stored counts"""
+        if self.refresh_phoneme_vector() and self.pk:
+            self.calculate_phoneme_stats()
+            TeamText.objects.filter(pk=self.pk).update(
+                phoneme_counts=self.phoneme_counts,
+                phoneme_spans=self.phoneme_spans,
+                total_characters=self.total_characters,
+                content_hash=self.content_hash,
+                ruleset_version=self.ruleset_version,
+                phoneme_count=self.phoneme_count,
+                phoneme_density=self.phoneme_density,
+            )
+        return self.phoneme_counts, self.total_characters
+    
+    def get_highlight_segments(self, phoneme=None):
+        """(text, is_highlighted) segments marking a phoneme's spellings, the team's phoneme by default"""
+        self.get_phoneme_vector()
+        phoneme = (phoneme or self.step4_data.selected_phoneme or '').lower()
+        return highlight_segments(self.content, self.phoneme_spans, phoneme)
+    
     def calculate_phoneme_stats(self):
         """Calculate phoneme statistics for this text"""
+        self.refresh_phoneme_vector()
+        
         if not self.content or not self.step4_data.selected_phoneme:
             self.phoneme_count = 0
-            self.total_characters = 0
             self.phoneme_density = 0.0
             return
         
-        text_lower = self.content.lower()
-        phoneme_lower = self.step4_data.selected_phoneme.lower()
-        
-        # Count phoneme occurrences
-        self.phoneme_count = text_lower.count(phoneme_lower)
-        
-        # Count total characters excluding spaces
-        self.total_characters = len(text_lower.replace(' ', ''))
+        # Selected phoneme count from the stored vector (shared spelling rules)
+        phoneme = self.step4_data.selected_phoneme.lower()
+        if phoneme in self.phoneme_counts:
+            self.phoneme_count = self.phoneme_counts[phoneme]
+        else:
+            self.phoneme_count = compile_rules({phoneme: [re.escape(phoneme)]}).count(self.content)[0][phoneme]
         
         # Calculate density percentage
         if self.total_characters > 0:
@@ -76,6 +133,7 @@ class TeamText(models.Model):
     
     def save(self, *args, **kwargs):
         """Override save to automatically calculate phoneme stats"""
+        self._content_changed = self.content_hash != content_hash(self.content)
         self.calculate_phoneme_stats()
         super().save(*args, **kwargs)
     
@@ -92,6 +150,41 @@ class TeamText(models.Model):
         return f"{self.step4_data.team.name} - Text {self.text_number}"
 
 
+@receiver(post_save, sender=TeamText)
+@receiver(post_delete, sender=TeamText)
+def invalidate_team_text_cache(sender, instance, **kwargs):
+    """
+    Drop cached matchup results and rescore guesses when a single text's content
+    changes (admin edits). The step 4 views write texts in bulk and refresh once
+    per request (see write_step4_texts).
+    """
+    if getattr(instance, '_content_changed', True):
+        matchup_id = instance.step4_data.matchup_id
+        invalidate_matchup_cache(matchup_id)
+        transaction.on_commit(lambda: rescore_matchup(matchup_id))
+
+
+@receiver(post_save, sender=TeamText)
+def index_team_text(sender, instance, **kwargs):
+    """Update the near-duplicate index when a single text's content changes (admin edits)"""
+    if getattr(instance, '_content_changed', True):
+        index_team_texts([instance], instance.step4_data.matchup.school_id)
+
+
+class TeamTextBand(models.Model):
+    """One LSH bucket of a TeamText's MinHash signature, for finding near duplicates"""
+    team_text = models.ForeignKey(TeamText, on_delete=models.CASCADE, related_name='lsh_bands')
+    school = models.ForeignKey(School, on_delete=models.CASCADE)
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [models.Index(fields=['school', 'bucket'])]
+    
+    def __str__(self):
+        return f"{self.team_text} - Band {self.band}"
+
+
 class PhonemeGuess(models.Model):
     """Store team's guess about opponent's phoneme in Step 5"""
     matchup = models.ForeignKey(GameMatchup, on_delete=models.CASCADE, related_name='phoneme_guesses')
@@ -102,6 +195,11 @@ class PhonemeGuess(models.Model):
     phoneme_guess = models.CharField(max_length=10, blank=True, null=True)
     rule_description = models.TextField(blank=True)
     
+    # Score against the target team's texts (calculated by scoring.score_matchup)
+    score = models.JSONField(null=True, blank=True)
+    score_version = models.CharField(max_length=80, blank=True)  # rule set and baseline used
+    scored_at = models.DateTimeField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -128,3 +226,180 @@ class TextGuess(models.Model):
     
     def __str__(self):
         return f"{self.phoneme_guess.guessing_team.name} - Text {self.text_number}: {self.follows_rule}"
+
+
+class PhonemeBaseline(models.Model):
+    """Baseline phoneme frequencies computed from a text corpus (compute_phoneme_baseline)"""
+    name = models.CharField(max_length=255)
+    source = models.TextField(blank=True)  # corpus files the baseline was computed from
+    ruleset_version = models.CharField(max_length=40)
+    phoneme_counts = models.JSONField(default=dict)
+    total_characters = models.BigIntegerField(default=0)  # excluding spaces
+    frequencies = models.JSONField(default=dict)  # percentages, keyed by phoneme
+    is_active = models.BooleanField(default=False)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        get_latest_by = 'created_at'
+    
+    def __str__(self):
+        return f"{self.name} (v{self.pk}){' - active' if self.is_active else ''}"
+
+
+@receiver(post_save, sender=PhonemeBaseline)
+@receiver(post_delete, sender=PhonemeBaseline)
+def invalidate_baseline_cache(sender, instance, **kwargs):
+    """Reload baseline frequencies after a baseline is added, activated or removed"""
+    cache.delete(BASELINE_CACHE_KEY)
+
+
+class PhonemeRuleSet(models.Model):
+    """A named set of spelling rules used to count phonemes (one set is active)"""
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=False)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-is_active', 'name']
+    
+    def get_rules(self):
+        """Return {phoneme: [patterns]} in rule order"""
+        rules = {}
+        for rule in self.rules.all():
+            rules.setdefault(rule.phoneme, []).append(rule.pattern)
+        return rules
+    
+    def __str__(self):
+        return f"{self.name}{' (active)' if self.is_active else ''}"
+
+
+class PhonemeSpellingRule(models.Model):
+    """A spelling pattern that counts as one occurrence of a phoneme"""
+    rule_set = models.ForeignKey(PhonemeRuleSet, on_delete=models.CASCADE, related_name='rules')
+    phoneme = models.CharField(max_length=10)
+    pattern = models.CharField(
+        max_length=100,
+        help_text="Regular expression matched against lowercased text (must also be valid in JavaScript)",
+    )
+    order = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['rule_set', 'phoneme', 'order', 'id']
+    
+    def clean(self):
+        """Reject patterns that are not valid regular expressions"""
+        try:
+            re.compile(self.pattern)
+        except re.error as e:
+            raise ValidationError({'pattern': f"Invalid regular expression: {e}"})
+    
+    def __str__(self):
+        return f"/{self.phoneme}/: {self.pattern}"
+
+
+@receiver(post_save, sender=PhonemeRuleSet)
+@receiver(post_delete, sender=PhonemeRuleSet)
+@receiver(post_save, sender=PhonemeSpellingRule)
+@receiver(post_delete, sender=PhonemeSpellingRule)
+def invalidate_rule_spec_cache(sender, instance, **kwargs):
+    """Reload the active rule set after rules change"""
+    cache.delete(RULE_SPEC_CACHE_KEY)
+
+
+class ReferenceTextSet(models.Model):
+    """The sample texts shown in steps 1-3 of a game, with the phoneme they overuse"""
+    ai_game = models.ForeignKey(AiGame, on_delete=models.CASCADE, related_name='reference_text_sets')
+    name = models.CharField(max_length=255)
+    target_phoneme = models.CharField(max_length=10, default=DEFAULT_TARGET_PHONEME)
+    is_active = models.BooleanField(default=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['ai_game', '-is_active', 'name']
+    
+    def save(self, *args, **kwargs):
+        """Re-annotate the texts when the target phoneme changes"""
+        target_changed = bool(self.pk) and not ReferenceTextSet.objects.filter(
+            pk=self.pk, target_phoneme=self.target_phoneme
+        ).exists()
+        super().save(*args, **kwargs)
+        if target_changed:
+            texts = list(self.texts.all())
+            for text in texts:
+                text.annotate(force=True)
+            ReferenceText.objects.bulk_update(texts, ReferenceText.ANNOTATION_FIELDS)
+    
+    def __str__(self):
+        return f"{self.ai_game.title} - {self.name}{' (active)' if self.is_active else ''}"
+
+
+class ReferenceText(models.Model):
+    """One reference text, annotated for its set's target phoneme when saved"""
+    ANNOTATION_FIELDS = [
+        'phoneme_counts', 'total_characters', 'is_phoneme_heavy', 'phoneme_spans',
+        'content_hash', 'ruleset_version',
+    ]
+    
+    text_set = models.ForeignKey(ReferenceTextSet, on_delete=models.CASCADE, related_name='texts')
+    order = models.PositiveIntegerField(default=0)
+    title = models.CharField(max_length=255, blank=True)
+    content = models.TextField()
+    
+    # Annotations (calculated automatically)
+    phoneme_counts = models.JSONField(default=dict, blank=True)
+    total_characters = models.IntegerField(default=0)  # excluding spaces
+    is_phoneme_heavy = models.BooleanField(default=False)
+    phoneme_spans = models.JSONField(default=list, blank=True)  # [start, end, phoneme] of every match
+    content_hash = models.CharField(max_length=64, blank=True)
+    ruleset_version = models.CharField(max_length=40, blank=True)
+    
+    class Meta:
+        ordering = ['text_set', 'order', 'id']
+    
+    def annotate(self, force=False):
+        """Recompute the annotations if the content or rule set changed. Returns True if recomputed"""
+        digest = content_hash(self.content)
+        if not force and digest == self.content_hash and get_active_counter().version == self.ruleset_version:
+            return False
+        
+        annotation = annotate_reference_text(self.content, self.text_set.target_phoneme)
+        for field, value in annotation.items():
+            setattr(self, field, value)
+        self.content_hash = digest
+        return True
+    
+    def get_annotation(self):
+        """The stored annotations as a dict"""
+        return {field: getattr(self, field) for field in self.ANNOTATION_FIELDS}
+    
+    def save(self, *args, **kwargs):
+        """Override save to annotate the text"""
+        self.annotate()
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.text_set.name} - {self.title or f'Text {self.order}'}"
+
+
+@receiver(post_save, sender=ReferenceTextSet)
+@receiver(post_delete, sender=ReferenceTextSet)
+def invalidate_reference_text_set_cache(sender, instance, **kwargs):
+    """Reload a game's reference texts after its sets change"""
+    invalidate_reference_texts(instance.ai_game_id)
+
+
+@receiver(post_save, sender=ReferenceText)
+@receiver(post_delete, sender=ReferenceText)
+def invalidate_reference_text_cache(sender, instance, **kwargs):
+    """Reload a game's reference texts after one of them changes"""
+    invalidate_reference_texts(instance.text_set.ai_game_id)
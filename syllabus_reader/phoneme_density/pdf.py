@@ -0,0 +1,64 @@
+"""
+PDF exports for the phoneme density game
+
+Export templates are rendered to HTML and converted to PDF with xhtml2pdf.
+Generated files are stored under MEDIA_ROOT, named by a hash of the rendered
+HTML, so exporting the same content again streams the stored file instead of
+regenerating it. Export templates must not contain anything that changes on
+every render (such as {% now %}), or every export will be a cache miss.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+PDF_CACHE_DIR = 'phoneme_density/pdf'
+
+# Bump to regenerate every cached PDF (e.g. after changing the converter)
+PDF_RENDERER_VERSION = 1
+
+
+class PdfGenerationError(Exception):
+    """The HTML could not be converted to PDF"""
+
+
+def pdf_cache_path(html):
+    """Path of the cached PDF for rendered HTML"""
+    digest = hashlib.sha256(f'{PDF_RENDERER_VERSION}:{html}'.encode('utf-8')).hexdigest()
+    return Path(settings.MEDIA_ROOT) / PDF_CACHE_DIR / f'{digest}.pdf'
+
+
+def render_pdf(template_name, context):
+    """Render a template to PDF, reusing the cached file for identical HTML. Returns its path"""
+    html = render_to_string(template_name, context)
+    path = pdf_cache_path(html)
+    if path.exists():
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file and move it into place, so concurrent exports
+    # never stream a half-written PDF
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            result = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+        if result.err:
+            raise PdfGenerationError(f'Could not generate PDF from {template_name}')
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+def pdf_response(template_name, context, filename):
+    """Stream a rendered template as an inline PDF download"""
+    path = render_pdf(template_name, context)
+    return FileResponse(open(path, 'rb'), content_type='application/pdf', filename=filename)
@@ -0,0 +1,112 @@
+"""
+Reference texts for steps 1-3
+
+Each game can have an active ReferenceTextSet. Its texts are annotated when
+saved (phoneme counts, the heavy/light label for the set's target phoneme and
+the spans of every phoneme match), so the step pages only read stored values
+and slice the highlighted spellings out of the text. The loaded set is cached
+per game and rule-set version; games without a set use the defaults in
+constants.py.
+"""
+import re
+
+from django.core.cache import cache
+
+from .cache import CACHE_TIMEOUT, get_baseline_frequencies
+from .classifier import RULE_Z_THRESHOLD
+from .constants import DEFAULT_REFERENCE_TEXTS, DEFAULT_TARGET_PHONEME
+from .engine import compile_rules, highlight_segments, phoneme_statistics
+from .rules import get_active_counter, get_active_rule_spec
+
+
+def reference_texts_cache_key(ai_game_id):
+    return f'phoneme_density:reference_texts:{ai_game_id}:{get_active_rule_spec()["version"]}'
+
+
+def annotate_reference_text(content, target_phoneme):
+    """
+    Annotate a reference text for a target phoneme. Returns a dict of
+    phoneme_counts, total_characters, is_phoneme_heavy (the target's z-score
+    against baseline English is at least RULE_Z_THRESHOLD), phoneme_spans
+    ([start, end, phoneme] of every match) and ruleset_version.
+    """
+    counter = get_active_counter()
+    counts, total_characters, spans = counter.analyze(content)
+
+    if target_phoneme not in counts:
+        target_counts, _, target_spans = compile_rules({target_phoneme: [re.escape(target_phoneme)]}).analyze(content)
+        counts = {**counts, **target_counts}
+        spans = sorted(spans + target_spans)
+
+    expected = get_baseline_frequencies().get(target_phoneme, 0)
+    z_score = phoneme_statistics([[counts[target_phoneme]]], [total_characters], [expected])['z_scores'][0, 0]
+
+    return {
+        'phoneme_counts': counts,
+        'total_characters': total_characters,
+        'is_phoneme_heavy': bool(z_score >= RULE_Z_THRESHOLD),
+        'phoneme_spans': spans,
+        'ruleset_version': counter.version,
+    }
+
+
+def _text_entry(number, title, content, annotation, target_phoneme):
+    return {
+        'id': number,
+        'title': title,
+        'content': content,
+        'is_phoneme_heavy': annotation['is_phoneme_heavy'],
+        'phoneme_counts': annotation['phoneme_counts'],
+        'total_characters': annotation['total_characters'],
+        'segments': highlight_segments(content, annotation['phoneme_spans'], target_phoneme),
+    }
+
+
+def load_reference_texts(ai_game_id):
+    """Read the game's active reference set from the database, refreshing stale annotations"""
+    from .models import ReferenceText, ReferenceTextSet
+
+    text_set = (
+        ReferenceTextSet.objects.filter(ai_game_id=ai_game_id, is_active=True)
+        .prefetch_related('texts')
+        .order_by('-updated_at')
+        .first()
+    )
+    if text_set is None:
+        return {
+            'target_phoneme': DEFAULT_TARGET_PHONEME,
+            'texts': [
+                _text_entry(number, text['title'], text['content'],
+                            annotate_reference_text(text['content'], DEFAULT_TARGET_PHONEME), DEFAULT_TARGET_PHONEME)
+                for number, text in enumerate(DEFAULT_REFERENCE_TEXTS, start=1)
+            ],
+        }
+
+    texts = list(text_set.texts.all())
+    stale = [text for text in texts if text.annotate()]
+    if stale:
+        ReferenceText.objects.bulk_update(stale, ReferenceText.ANNOTATION_FIELDS)
+
+    return {
+        'target_phoneme': text_set.target_phoneme,
+        'texts': [
+            _text_entry(number, text.title or f'Text {number}', text.content, text.get_annotation(),
+                        text_set.target_phoneme)
+            for number, text in enumerate(texts, start=1)
+        ],
+    }
+
+
+def get_reference_texts(ai_game_id):
+    """The reference texts for a game as {'target_phoneme', 'texts'}, cached per game"""
+    key = reference_texts_cache_key(ai_game_id)
+    reference = cache.get(key)
+    if reference is None:
+        reference = load_reference_texts(ai_game_id)
+        cache.set(key, reference, CACHE_TIMEOUT)
+    return reference
+
+
+def invalidate_reference_texts(ai_game_id):
+    """Drop the cached reference texts for a game"""
+    cache.delete(reference_texts_cache_key(ai_game_id))
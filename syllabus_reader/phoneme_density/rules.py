@@ -0,0 +1,49 @@
+"""
+Active phoneme spelling rules
+
+The active PhonemeRuleSet is read from the database into a spec
+({'version', 'rules'}) that is cached briefly and shared with the browser.
+Counters are compiled once per process per rule-set version (engine.compile_rules),
+so a cached spec never triggers a recompile.
+"""
+from django.core.cache import cache
+
+from .constants import ENGLISH_PHONEME_FREQUENCIES
+from .engine import compile_rules, get_rules_for_phonemes, ruleset_version
+
+RULE_SPEC_CACHE_KEY = 'phoneme_density:rule_spec'
+
+# Other processes pick up rule edits within this many seconds
+RULE_SPEC_TIMEOUT = 60
+
+
+def build_rule_spec(stored_rules=None):
+    """
+    Build the counting spec from stored rules ({phoneme: [patterns]}).
+    Every baseline phoneme is included; phonemes without rules count their letters.
+    Without stored rules the defaults in constants.py are used.
+    """
+    phonemes = list(ENGLISH_PHONEME_FREQUENCIES)
+    if stored_rules:
+        phonemes += [phoneme for phoneme in stored_rules if phoneme not in phonemes]
+        rules = get_rules_for_phonemes(phonemes, stored_rules)
+    else:
+        rules = get_rules_for_phonemes(phonemes)
+    return {'version': ruleset_version(rules), 'rules': rules}
+
+
+def get_active_rule_spec():
+    """The active rule set as {'version', 'rules'}"""
+    spec = cache.get(RULE_SPEC_CACHE_KEY)
+    if spec is None:
+        from .models import PhonemeRuleSet
+
+        rule_set = PhonemeRuleSet.objects.filter(is_active=True).prefetch_related('rules').first()
+        spec = build_rule_spec(rule_set.get_rules() if rule_set else None)
+        cache.set(RULE_SPEC_CACHE_KEY, spec, RULE_SPEC_TIMEOUT)
+    return spec
+
+
+def get_active_counter():
+    """Compiled counter for the active rule set"""
+    return compile_rules(get_active_rule_spec()['rules'])
@@ -0,0 +1,149 @@
+"""
+Step 5 guess scoring for the phoneme density game
+
+Each team's PhonemeGuess is scored against the opponent's selected phoneme and
+texts: whether the phoneme guess is right, and the precision and recall of its
+"follows the rule" text guesses. A text follows the rule when the opponent's
+selected phoneme has a z-score of at least RULE_Z_THRESHOLD (the same ground
+truth as the Step 6 classifier).
+
+Scores for both teams are computed together from one query and stored on the
+PhonemeGuess rows. They are recomputed when guesses, texts or a selected phoneme
+change (rescore_matchup), so reading a score never recalculates it unless the
+rule set or baseline has changed since it was stored.
+"""
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .cache import get_baseline
+from .classifier import RULE_Z_THRESHOLD
+from .engine import phoneme_statistics
+from .rules import get_active_rule_spec
+
+
+def score_inputs_version():
+    """Identifies the rule set and baseline that define the ground truth"""
+    return f'{get_active_rule_spec()["version"]}:{get_baseline()[0]}'
+
+
+def percentage(numerator, denominator):
+    return numerator / denominator * 100 if denominator else None
+
+
+def score_guesses(guessed_phoneme, actual_phoneme, text_numbers, guesses, actual):
+    """
+    Score one team's guesses. guesses and actual are booleans per text (whether
+    the team said it follows the rule, and whether it does). Precision is None
+    without any positive guess and recall is None without any rule-following text.
+    """
+    true_positives = sum(guess and follows for guess, follows in zip(guesses, actual))
+    false_positives = sum(guess and not follows for guess, follows in zip(guesses, actual))
+    false_negatives = sum(follows and not guess for guess, follows in zip(guesses, actual))
+    true_negatives = len(actual) - true_positives - false_positives - false_negatives
+    return {
+        'phoneme_guess': guessed_phoneme or '',
+        'actual_phoneme': actual_phoneme or '',
+        'phoneme_correct': bool(guessed_phoneme) and guessed_phoneme.lower() == (actual_phoneme or '').lower(),
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives,
+        'true_negatives': true_negatives,
+        'precision': percentage(true_positives, true_positives + false_positives),
+        'recall': percentage(true_positives, true_positives + false_negatives),
+        'accuracy': percentage(true_positives + true_negatives, len(actual)),
+        'texts': [
+            {'text_number': text_number, 'guess': guess, 'actual': follows}
+            for text_number, guess, follows in zip(text_numbers, guesses, actual)
+        ],
+    }
+
+
+def score_matchup(matchup_id):
+    """Score both teams' guesses in a matchup and store the results. Returns {guessing team id: score}"""
+    from .models import PhonemeGuess, TeamText, TextGuess
+
+    # Every input in one query: each written text with its owner's selected
+    # phoneme and the guesses made about it
+    guesses_about_team = PhonemeGuess.objects.filter(matchup_id=matchup_id, target_team_id=OuterRef('step4_data__team_id'))
+    team_texts = list(
+        TeamText.objects.filter(step4_data__matchup_id=matchup_id)
+        .exclude(content='')
+        .select_related('step4_data')
+        .annotate(
+            guess_id=Subquery(guesses_about_team.values('id')[:1]),
+            guessing_team_id=Subquery(guesses_about_team.values('guessing_team_id')[:1]),
+            guessed_phoneme=Subquery(guesses_about_team.values('phoneme_guess')[:1]),
+            guessed_follows_rule=Subquery(
+                TextGuess.objects.filter(
+                    phoneme_guess__matchup_id=matchup_id,
+                    phoneme_guess__target_team_id=OuterRef('step4_data__team_id'),
+                    text_number=OuterRef('text_number'),
+                ).values('follows_rule')[:1]
+            ),
+        )
+        .order_by('step4_data__team_id', 'text_number')
+    )
+
+    baseline_frequencies = get_baseline()[1]
+    phoneme_list = list(baseline_frequencies.keys())
+    counts = []
+    totals = []
+    for team_text in team_texts:
+        text_counts, total_characters = team_text.get_phoneme_vector()
+        counts.append([text_counts.get(phoneme, 0) for phoneme in phoneme_list])
+        totals.append(total_characters)
+    z_scores = phoneme_statistics(counts, totals, list(baseline_frequencies.values()))['z_scores'] if team_texts else None
+
+    # Group the texts by the guess that targets them
+    guessed_texts = {}
+    for row, team_text in enumerate(team_texts):
+        if team_text.guess_id is None:
+            continue
+        selected_phoneme = (team_text.step4_data.selected_phoneme or '').lower()
+        follows_rule = (
+            selected_phoneme in phoneme_list
+            and bool(z_scores[row, phoneme_list.index(selected_phoneme)] >= RULE_Z_THRESHOLD)
+        )
+        entry = guessed_texts.setdefault(team_text.guess_id, {
+            'guessing_team_id': team_text.guessing_team_id,
+            'guessed_phoneme': team_text.guessed_phoneme,
+            'actual_phoneme': selected_phoneme,
+            'text_numbers': [], 'guesses': [], 'actual': [],
+        })
+        entry['text_numbers'].append(team_text.text_number)
+        entry['guesses'].append(bool(team_text.guessed_follows_rule))
+        entry['actual'].append(follows_rule)
+
+    version = score_inputs_version()
+    now = timezone.now()
+    scored = []
+    results = {}
+    for guess_id, entry in guessed_texts.items():
+        score = score_guesses(
+            entry['guessed_phoneme'], entry['actual_phoneme'],
+            entry['text_numbers'], entry['guesses'], entry['actual'],
+        )
+        scored.append(PhonemeGuess(id=guess_id, score=score, score_version=version, scored_at=now))
+        results[entry['guessing_team_id']] = score
+    PhonemeGuess.objects.bulk_update(scored, ['score', 'score_version', 'scored_at'])
+
+    # Guesses about a team without written texts have nothing to score
+    PhonemeGuess.objects.filter(matchup_id=matchup_id).exclude(id__in=guessed_texts).update(
+        score=None, score_version=version, scored_at=now,
+    )
+    return results
+
+
+def rescore_matchup(matchup_id):
+    """Recompute a matchup's stored scores after its guesses or texts change"""
+    from .models import PhonemeGuess
+
+    if PhonemeGuess.objects.filter(matchup_id=matchup_id).exists():
+        score_matchup(matchup_id)
+
+
+def get_guess_score(phoneme_guess):
+    """The stored score of a PhonemeGuess, or None if the opponent has no texts"""
+    if phoneme_guess.score_version != score_inputs_version():
+        return score_matchup(phoneme_guess.matchup_id).get(phoneme_guess.guessing_team_id)
+    return phoneme_guess.score
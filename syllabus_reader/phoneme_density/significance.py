@@ -0,0 +1,100 @@
+"""
+Exact significance tests for phoneme counts
+
+The normal approximation behind the z-scores is poor for the short texts
+students write. Here the count of each phoneme in a text of n characters is
+treated as Binomial(n, p), with p the phoneme's baseline frequency (its
+marginal under a multinomial model of the text), and the one-sided p-value
+P(X >= count) is summed exactly from log-probabilities.
+
+Binomial coefficients come from a table of log(k!) that is built once per
+process. The table has a fixed size; longer texts use Stirling's series for
+the factorials beyond it, so no text can make the table grow.
+
+Only the terms within TAIL_WIDTH standard deviations of the mean and of the
+count are summed (the rest are below double precision), one text at a time,
+so a request works on arrays of phonemes x O(sqrt(n)) terms.
+
+This module has no Django dependencies.
+"""
+import math
+
+import numpy as np
+
+# log(k!) for k below this comes from the per-process table (512 KB)
+TABLE_SIZE = 1 << 16
+
+# Standard deviations of the binomial summed on each side
+TAIL_WIDTH = 12
+
+_log_factorials = None
+
+
+def _log_factorial_table():
+    global _log_factorials
+    if _log_factorials is None:
+        _log_factorials = np.fromiter((math.lgamma(k + 1) for k in range(TABLE_SIZE)), float, TABLE_SIZE)
+    return _log_factorials
+
+
+def log_factorials(k):
+    """log(k!) for an array of non-negative ints, from the table or Stirling's series above it"""
+    k = np.asarray(k, dtype=np.int64)
+    values = np.array(_log_factorial_table()[np.minimum(k, TABLE_SIZE - 1)])
+    large = k >= TABLE_SIZE
+    if large.any():
+        x = k[large].astype(float)
+        values[large] = x * np.log(x) - x + 0.5 * np.log(2 * np.pi * x) + 1 / (12 * x) - 1 / (360 * x ** 3)
+    return values
+
+
+def _text_upper_tail(counts, total, p):
+    """P(X >= count) for one text's phoneme counts"""
+    mean = total * p
+    spread = TAIL_WIDTH * np.sqrt(mean * (1 - p)) + TAIL_WIDTH
+    start = np.clip(np.maximum(counts, np.floor(mean - spread)), 0, total + 1).astype(np.int64)
+    stop = np.clip(np.ceil(np.maximum(counts, mean) + spread), 0, total).astype(np.int64)
+
+    # Every summed number of successes, one row per phoneme
+    successes = start[:, None] + np.arange(int((stop - start).max(initial=0)) + 1)
+    in_tail = successes <= stop[:, None]
+    successes = np.minimum(successes, total)
+    failures = total - successes
+    log_choose = log_factorials(total) - log_factorials(successes) - log_factorials(failures)
+
+    # 0 * log(0) terms are zero, so p = 0 or 1 stays exact
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_p = np.where(successes > 0, successes * np.log(p)[:, None], 0.0)
+        log_q = np.where(failures > 0, failures * np.log1p(-p)[:, None], 0.0)
+    log_pmf = np.where(in_tail, log_choose + log_p + log_q, -np.inf)
+
+    # Sum the tail in log space
+    peak = log_pmf.max(axis=-1, keepdims=True)
+    finite_peak = np.where(np.isfinite(peak), peak, 0.0)
+    tail = np.exp(finite_peak[:, 0]) * np.exp(log_pmf - finite_peak).sum(axis=-1)
+    return np.where(counts <= 0, 1.0, np.where(np.isfinite(peak[:, 0]), tail, 0.0))
+
+
+def binomial_upper_tail(counts, totals, probabilities):
+    """
+    P(X >= count) for X ~ Binomial(total, p), vectorized over a texts x phonemes
+    count matrix. totals is the non-space character count of each text and
+    probabilities the baseline probability (0-1) of each phoneme. Texts without
+    characters get p-values of 1.
+    """
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.int64))
+    totals = np.asarray(totals, dtype=np.int64).reshape(-1)
+    p = np.broadcast_to(np.asarray(probabilities, dtype=float), counts.shape)
+
+    tails = np.empty(counts.shape)
+    for row, total in enumerate(totals):
+        tails[row] = _text_upper_tail(counts[row], int(total), p[row])
+    return np.clip(tails, 0.0, 1.0)
+
+
+def phoneme_p_values(counts, totals, baseline):
+    """
+    One-sided exact p-values that each phoneme is overused, for a texts x
+    phonemes count matrix against baseline percentages.
+    """
+    return binomial_upper_tail(counts, totals, np.asarray(baseline, dtype=float) / 100)
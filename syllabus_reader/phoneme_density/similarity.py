@@ -0,0 +1,140 @@
+"""
+Near-duplicate detection for step 4 texts
+
+Each TeamText gets a MinHash signature of its character shingles (NUM_HASHES
+minimum hash values, one per random hash function), stored on the text. The
+fraction of positions where two signatures agree estimates the Jaccard
+similarity of the two texts' shingle sets.
+
+Signatures are split into LSH_BANDS bands, and each band is hashed to a bucket
+stored as a TeamTextBand row with the text's school. Texts sharing any bucket
+are candidates; only candidates are compared, so finding a text's near
+duplicates reads a few index rows instead of every text in the school. With 16
+bands of 4 rows, pairs at 50% similarity become candidates about half the
+time and pairs at 80% almost always.
+
+The index is updated whenever a text's content changes (index_team_texts),
+from the TeamText signal for single saves and once per request for the
+step 4 views' bulk writes. Migration 0011 indexed the existing texts with a
+frozen copy of this hashing, so changing it means re-indexing every text in
+a new migration.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // LSH_BANDS
+
+# Estimated similarity at which the review queue flags a pair
+DUPLICATE_THRESHOLD = 0.7
+
+# Universal hashing (a * x + b) mod p with a Mersenne prime; shingle hashes are
+# reduced below p so every product fits in 64 bits
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240617)
+_HASH_A = _rng.integers(1, _PRIME, size=NUM_HASHES, dtype=np.int64)
+_HASH_B = _rng.integers(0, _PRIME, size=NUM_HASHES, dtype=np.int64)
+
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def shingles(text):
+    """Character shingles of a text, ignoring case, punctuation and spacing"""
+    normalized = NON_WORD.sub(' ', text.lower()).strip()
+    if not normalized:
+        return set()
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """MinHash signature (NUM_HASHES ints) of a text, or [] if it has no shingles"""
+    text_shingles = shingles(text)
+    if not text_shingles:
+        return []
+    hashes = np.array([zlib.crc32(shingle.encode('utf-8')) % _PRIME for shingle in text_shingles], dtype=np.int64)
+    # hash functions x shingles, minimum per hash function
+    return ((_HASH_A[:, None] * hashes + _HASH_B[:, None]) % _PRIME).min(axis=1).tolist()
+
+
+def band_buckets(signature):
+    """(band, bucket) for each LSH band of a signature, buckets as signed 64-bit ints"""
+    buckets = []
+    for band in range(LSH_BANDS if signature else 0):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(f'{band}:{rows}'.encode('ascii'), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def estimated_similarity(signature, other):
+    """Estimated Jaccard similarity of two texts from their signatures"""
+    if not signature or not other:
+        return 0.0
+    return float(np.mean(np.asarray(signature) == np.asarray(other)))
+
+
+def index_team_texts(team_texts, school_id):
+    """Recompute the signatures and LSH buckets of texts whose content changed"""
+    from .models import TeamText, TeamTextBand
+
+    team_texts = [team_text for team_text in team_texts if team_text.pk]
+    for team_text in team_texts:
+        team_text.minhash_signature = minhash_signature(team_text.content)
+    TeamText.objects.bulk_update(team_texts, ['minhash_signature'])
+
+    TeamTextBand.objects.filter(team_text__in=team_texts).delete()
+    TeamTextBand.objects.bulk_create([
+        TeamTextBand(team_text=team_text, school_id=school_id, band=band, bucket=bucket)
+        for team_text in team_texts
+        for band, bucket in band_buckets(team_text.minhash_signature)
+    ])
+
+
+def find_near_duplicates(team_texts, school_id, threshold=DUPLICATE_THRESHOLD):
+    """
+    Texts from other teams in the school that are near duplicates of the given
+    texts. Returns {text id: [(other TeamText, similarity)]}, most similar first,
+    from two queries: the candidates sharing a bucket, then their signatures.
+    """
+    from .models import TeamText, TeamTextBand
+
+    buckets = {}
+    for team_text in team_texts:
+        for band, bucket in band_buckets(team_text.minhash_signature):
+            buckets.setdefault((band, bucket), []).append(team_text)
+    if not buckets:
+        return {}
+
+    rows = TeamTextBand.objects.filter(
+        school_id=school_id, bucket__in={bucket for _, bucket in buckets},
+    ).values_list('team_text_id', 'band', 'bucket')
+
+    candidate_pairs = set()
+    for other_id, band, bucket in rows:
+        for team_text in buckets.get((band, bucket), ()):
+            if other_id != team_text.id:
+                candidate_pairs.add((team_text, other_id))
+    if not candidate_pairs:
+        return {}
+
+    others = TeamText.objects.select_related('step4_data__team').in_bulk({other_id for _, other_id in candidate_pairs})
+
+    duplicates = {}
+    for team_text, other_id in candidate_pairs:
+        other = others.get(other_id)
+        # Teams may reuse their own sentences; only copying across teams is flagged
+        if other is None or other.step4_data.team_id == team_text.step4_data.team_id:
+            continue
+        similarity = estimated_similarity(team_text.minhash_signature, other.minhash_signature)
+        if similarity >= threshold:
+            duplicates.setdefault(team_text.id, []).append((other, similarity))
+    for matches in duplicates.values():
+        matches.sort(key=lambda match: (-match[1], match[0].id))
+    return duplicates
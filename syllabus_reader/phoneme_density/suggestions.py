@@ -0,0 +1,79 @@
+"""
+Word suggestions for the step 4 editor
+
+The word list in data/words.txt is counted once with the active spelling rules
+into a words x phonemes density matrix, with the words in sorted order. All
+completions of a prefix are then one contiguous block of rows (found with two
+binary searches), so a suggestion is a slice of one column and a partial sort
+of it, which takes microseconds.
+
+Indexes are built lazily, once per process per rule-set version, and shared by
+every request.
+"""
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+from .rules import get_active_counter
+
+WORD_LIST_PATH = Path(__file__).resolve().parent / 'data' / 'words.txt'
+
+SUGGESTION_LIMIT = 8
+MAX_SUGGESTION_LIMIT = 25
+
+_word_indexes = {}
+
+
+class WordIndex:
+    """Prefix index over a word list, annotated with each word's phoneme densities"""
+
+    def __init__(self, words, counter):
+        self.words = sorted({word.strip().lower() for word in words if word.strip()})
+        self.columns = {phoneme: column for column, phoneme in enumerate(counter.phonemes)}
+
+        self.counts = np.zeros((len(self.words), len(counter.phonemes)), dtype=np.int32)
+        for row, word in enumerate(self.words):
+            word_counts, _ = counter.count(word)
+            self.counts[row] = [word_counts.get(phoneme, 0) for phoneme in counter.phonemes]
+        lengths = np.array([len(word) for word in self.words], dtype=float)
+        self.densities = self.counts / np.maximum(lengths, 1)[:, None] * 100
+
+    def prefix_range(self, prefix):
+        """Rows of the words starting with prefix, as (start, end)"""
+        return bisect_left(self.words, prefix), bisect_left(self.words, prefix + '\uffff')
+
+    def suggest(self, prefix, phoneme, limit=SUGGESTION_LIMIT):
+        """
+        Completions of prefix that contain the phoneme, densest first, as
+        [{'word', 'count', 'density'}]
+        """
+        column = self.columns.get(phoneme)
+        start, end = self.prefix_range(prefix.lower())
+        if column is None or start == end or limit < 1:
+            return []
+
+        densities = self.densities[start:end, column]
+        rows = np.flatnonzero(densities > 0)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-densities[rows], limit - 1)[:limit]]
+        rows = sorted(rows.tolist(), key=lambda row: (-densities[row], self.words[start + row]))
+
+        return [
+            {
+                'word': self.words[start + row],
+                'count': int(self.counts[start + row, column]),
+                'density': round(float(densities[row]), 1),
+            }
+            for row in rows
+        ]
+
+
+def get_word_index():
+    """The word index for the active rule set, built on first use in each process"""
+    counter = get_active_counter()
+    index = _word_indexes.get(counter.version)
+    if index is None:
+        with open(WORD_LIST_PATH, encoding='utf-8') as word_list:
+            index = _word_indexes[counter.version] = WordIndex(word_list, counter)
+    return index
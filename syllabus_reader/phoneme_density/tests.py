@@ -1,3 +1,479 @@
-from django.test import TestCase
+import math
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from aigames.models import School, AiGame, GameStep, Team, TeamMembership, GameMatchup
+from .constants import ENGLISH_PHONEME_FREQUENCIES
+from .engine import (
+    PhonemeCounter, bootstrap_intervals, get_rules_for_phonemes, highlight_segments, word_count_matrix,
+)
+from .models import TeamStep4Data, TeamText
+from .rules import get_active_counter
+from .scoring import score_guesses
+from . import significance
+from .significance import binomial_upper_tail
+from .suggestions import WordIndex
+from .views import pending_review_texts, review_queue_bulk
+
+
+class PhonemeSpanTest(SimpleTestCase):
+    """Spans must agree with the counts and slice back into the text"""
+
+    TEXT = "Rosemary arranged a rare garden tour; rough photographs of cooks and quick kittens."
+
+    def setUp(self):
+        self.counter = PhonemeCounter(get_rules_for_phonemes(list(ENGLISH_PHONEME_FREQUENCIES)))
+
+    def test_one_span_per_counted_match(self):
+        counts, total_characters, spans = self.counter.analyze(self.TEXT)
+        self.assertEqual((counts, total_characters), self.counter.count(self.TEXT))
+        for phoneme, count in counts.items():
+            self.assertEqual(sum(1 for span in spans if span[2] == phoneme), count)
+
+    def test_segments_rebuild_the_text(self):
+        _, _, spans = self.counter.analyze(self.TEXT)
+        segments = highlight_segments(self.TEXT, spans, 'f')
+        self.assertEqual(''.join(segment for segment, _ in segments), self.TEXT)
+        self.assertEqual([segment for segment, is_highlighted in segments if is_highlighted], ['gh', 'ph', 'ph', 'f'])
+
+    def test_bootstrap_intervals_contain_observed_density(self):
+        phonemes = list(ENGLISH_PHONEME_FREQUENCIES)
+        counts, total_characters, spans = self.counter.analyze(self.TEXT * 5)
+        word_counts, word_lengths = word_count_matrix(self.TEXT * 5, spans, phonemes)
+        self.assertEqual(word_counts.sum(axis=0).tolist(), [counts[phoneme] for phoneme in phonemes])
+        lower, upper = bootstrap_intervals(word_counts, word_lengths, seed=1)
+        for column, phoneme in enumerate(phonemes):
+            density = counts[phoneme] / total_characters * 100
+            self.assertLessEqual(lower[column], density)
+            self.assertGreaterEqual(upper[column], density)
+
+
+class WordIndexTest(SimpleTestCase):
+    """Suggestions are completions of the prefix, densest first"""
+
+    def setUp(self):
+        counter = PhonemeCounter(get_rules_for_phonemes(list(ENGLISH_PHONEME_FREQUENCIES)))
+        self.index = WordIndex(["fluffy", "fish", "phone", "fun", "farm", "table", "Fifty\n"], counter)
+
+    def test_completions_by_density(self):
+        words = [suggestion['word'] for suggestion in self.index.suggest('f', 'f')]
+        self.assertEqual(words, ['fluffy', 'fifty', 'fun', 'farm', 'fish'])
+        self.assertEqual(self.index.suggest('Fl', 'f', limit=1), [{'word': 'fluffy', 'count': 3, 'density': 50.0}])
+
+    def test_no_completions(self):
+        self.assertEqual(self.index.suggest('fl', 'w'), [])
+        self.assertEqual(self.index.suggest('x', 'f'), [])
+        self.assertEqual(self.index.suggest('f', 'unknown'), [])
+
+
+class BinomialTailTest(SimpleTestCase):
+    """Exact tail probabilities, including texts without characters and very long texts"""
+
+    def test_matches_direct_sum(self):
+        def upper_tail(k, n, p):
+            return sum(math.comb(n, i) * p ** i * (1 - p) ** (n - i) for i in range(k, n + 1))
+
+        counts = [[3, 0, 10], [5, 5, 5]]
+        totals = [20, 7]
+        probabilities = [0.062, 0.3, 0.001]
+        tails = binomial_upper_tail(counts, totals, probabilities)
+        for row, (text_counts, total) in enumerate(zip(counts, totals)):
+            for column, (count, p) in enumerate(zip(text_counts, probabilities)):
+                expected = upper_tail(count, total, p) if count <= total else 0.0
+                self.assertAlmostEqual(tails[row, column], expected, places=12)
+
+    def test_empty_text(self):
+        self.assertEqual(binomial_upper_tail([[0, 0]], [0], [0.1, 0.2]).tolist(), [[1.0, 1.0]])
+
+    def test_long_text(self):
+        # A count at the mean of a very long text is about as likely to be exceeded as not
+        self.assertAlmostEqual(binomial_upper_tail([[3000]], [10 ** 6], [0.003])[0, 0], 0.5, places=1)
+        # Factorials beyond the per-process table come from Stirling's series
+        self.assertEqual(len(significance._log_factorial_table()), significance.TABLE_SIZE)
+        self.assertAlmostEqual(significance.log_factorials(10 ** 6), math.lgamma(10 ** 6 + 1), places=6)
+
+
+class ScoreGuessesTest(SimpleTestCase):
+    """Guesses are scored against the texts that follow the rule"""
+
+    def test_precision_and_recall(self):
+        score = score_guesses('F', 'f', [1, 2, 3, 4], [True, True, False, False], [True, False, True, False])
+        self.assertTrue(score['phoneme_correct'])
+        self.assertEqual(score['precision'], 50)
+        self.assertEqual(score['recall'], 50)
+        self.assertEqual(score['accuracy'], 50)
+
+    def test_no_positive_guesses(self):
+        score = score_guesses('', 'f', [1, 2], [False, False], [False, False])
+        self.assertFalse(score['phoneme_correct'])
+        self.assertIsNone(score['precision'])
+        self.assertIsNone(score['recall'])
+        self.assertEqual(score['accuracy'], 100)
+
+
+class Step4QueryCountTest(TestCase):
+    """The step 4 page must render in a fixed number of queries"""
+
+    # Session, user, matchup (with its progress state), membership, profile,
+    # step 4 data, texts, school, instructions (steps come from the step catalog)
+    STEP4_QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        teacher = User.objects.create_user('teacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.school = school
+        teacher.profile.save()
+        cls.student = User.objects.create_user('student', password='password')
+        opponent = User.objects.create_user('opponent', password='password')
+
+        ai_game = AiGame.objects.create(title="Phoneme Density")
+        for step_number in range(1, 7):
+            GameStep.objects.create(
+                ai_game=ai_game,
+                step_number=step_number,
+                title=f"Step {step_number}",
+                url_pattern=f"phoneme_density:step{step_number}",
+            )
+
+        team1 = Team.objects.create(name="Team 1", school=school, created_by=teacher)
+        team2 = Team.objects.create(name="Team 2", school=school, created_by=teacher)
+        TeamMembership.objects.create(team=team1, user=cls.student)
+        TeamMembership.objects.create(team=team2, user=opponent)
+
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=ai_game, team1=team1, team2=team2, school=school, created_by=teacher
+        )
+        for step_number in range(1, 4):
+            cls.matchup.complete_step(step_number)
+
+        cls.step4_data = TeamStep4Data.objects.create(
+            matchup=cls.matchup, team=team1, selected_phoneme='f'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.url = reverse('phoneme_density:step4', kwargs={'matchup_id': self.matchup.id})
+
+    def test_step4_render_with_one_text(self):
+        TeamText.objects.create(step4_data=self.step4_data, text_number=1, content="Fluffy fish")
+        with self.assertNumQueries(self.STEP4_QUERY_BUDGET):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['can_submit'])
+        self.assertFalse(response.context['all_approved'])
+
+    def test_step4_render_with_all_texts(self):
+        for text_number in range(1, 9):
+            TeamText.objects.create(
+                step4_data=self.step4_data,
+                text_number=text_number,
+                content=f"Five fluffy fish {text_number}",
+                approval_status='approved',
+            )
+        with self.assertNumQueries(self.STEP4_QUERY_BUDGET):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['all_approved'])
+        self.assertEqual(len(response.context['text_data']), 8)
+
+
+class Step4AutosaveTest(TestCase):
+    """Autosave writes only the posted texts, based on the latest revision"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        teacher = User.objects.create_user('teacher', password='password')
+        cls.student = User.objects.create_user('student', password='password')
+        team1 = Team.objects.create(name="Team 1", school=school, created_by=teacher)
+        team2 = Team.objects.create(name="Team 2", school=school, created_by=teacher)
+        TeamMembership.objects.create(team=team1, user=cls.student)
+        ai_game = AiGame.objects.create(title="Phoneme Density")
+        for step_number in range(1, 5):
+            GameStep.objects.create(ai_game=ai_game, step_number=step_number, title=f"Step {step_number}")
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=ai_game, team1=team1, team2=team2, school=school, created_by=teacher,
+        )
+        for step_number in range(1, 4):
+            cls.matchup.complete_step(step_number)
+
+        cls.step4_data = TeamStep4Data.objects.create(
+            matchup=cls.matchup, team=team1, selected_phoneme='f', autosave_revision=3,
+        )
+        TeamText.objects.create(step4_data=cls.step4_data, text_number=1, content="Fluffy fish")
+        TeamText.objects.create(
+            step4_data=cls.step4_data, text_number=2, content="Five fine ferns", approval_status='approved',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.url = reverse('phoneme_density:step4', kwargs={'matchup_id': self.matchup.id})
+
+    def autosave(self, revision, **texts):
+        data = {
+            'auto_save': 'true',
+            'selected_phoneme': 'f',
+            'revision': revision,
+            'text_numbers': ','.join(str(number) for number in texts),
+        }
+        data.update({f'text_{number}': content for number, content in texts.items()})
+        return self.client.post(self.url, data)
+
+    def contents(self):
+        return dict(self.step4_data.texts.values_list('text_number', 'content'))
+
+    def test_stale_revision_gets_server_texts(self):
+        response = self.autosave(2, **{'1': "Overwritten"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {
+            'success': False,
+            'error': 'stale_revision',
+            'revision': 3,
+            'texts': {'1': "Fluffy fish", '2': "Five fine ferns"},
+        })
+        self.assertEqual(self.contents(), {1: "Fluffy fish", 2: "Five fine ferns"})
+
+    def test_only_dirty_texts_are_written(self):
+        response = self.client.post(self.url, {
+            'auto_save': 'true',
+            'selected_phoneme': 'f',
+            'revision': 3,
+            'text_numbers': '3',
+            'text_1': "Not marked as changed",
+            'text_3': "Frogs on the farm",
+        })
+        self.assertEqual(response.json(), {'success': True, 'revision': 4})
+        self.assertEqual(self.contents(), {1: "Fluffy fish", 2: "Five fine ferns", 3: "Frogs on the farm"})
+        created = self.step4_data.texts.get(text_number=3)
+        self.assertEqual(created.phoneme_count, get_active_counter().count("Frogs on the farm")[0]['f'])
+
+        # The next save must be based on the new revision
+        self.assertEqual(self.autosave(3, **{'1': "Late"}).status_code, 409)
+        self.assertEqual(self.autosave(4, **{'1': "Fresh fruit"}).json()['revision'], 5)
+        self.assertEqual(self.contents()[1], "Fresh fruit")
+
+    def test_form_submit_refreshes_once(self):
+        data = {'selected_phoneme': 'f'}
+        data.update({f'text_{number}': f"Fish number {number}" for number in range(1, 9)})
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        # One cache invalidation and one rescore for the whole batch
+        self.assertEqual(len(callbacks), 2)
+        contents = self.contents()
+        self.assertEqual(len(contents), 8)
+        self.assertEqual(contents[2], "Five fine ferns")
+        self.assertEqual(contents[8], "Fish number 8")
+        self.assertEqual(self.step4_data.texts.exclude(minhash_signature=[]).count(), 8)
+
+    def test_approved_texts_are_skipped(self):
+        response = self.autosave(3, **{'2': "Rewritten after approval"})
+        self.assertEqual(response.json(), {'success': True, 'revision': 4})
+        approved = self.step4_data.texts.get(text_number=2)
+        self.assertEqual(approved.content, "Five fine ferns")
+        self.assertEqual(approved.approval_status, 'approved')
+
+
+class CombinedAnalysisTest(TestCase):
+    """The combined analysis sums the team's stored texts, never posted text"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        teacher = User.objects.create_user('teacher', password='password')
+        cls.student = User.objects.create_user('student', password='password')
+        team1 = Team.objects.create(name="Team 1", school=school, created_by=teacher)
+        team2 = Team.objects.create(name="Team 2", school=school, created_by=teacher)
+        TeamMembership.objects.create(team=team1, user=cls.student)
+        ai_game = AiGame.objects.create(title="Phoneme Density")
+        for step_number in range(1, 5):
+            GameStep.objects.create(ai_game=ai_game, step_number=step_number, title=f"Step {step_number}")
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=ai_game, team1=team1, team2=team2, school=school, created_by=teacher,
+        )
+        for step_number in range(1, 4):
+            cls.matchup.complete_step(step_number)
+
+        other_school = School.objects.create(name="Other School", short_name="OS")
+        cls.outsider = User.objects.create_user('outsider', password='password')
+        cls.other_teacher = User.objects.create_user('other_teacher', password='password')
+        cls.other_teacher.profile.role = 'teacher'
+        cls.other_teacher.profile.school = other_school
+        cls.other_teacher.profile.save()
+        step4_data = TeamStep4Data.objects.create(matchup=cls.matchup, team=team1, selected_phoneme='f')
+        TeamText.objects.create(step4_data=step4_data, text_number=1, content="Fluffy fish")
+        TeamText.objects.create(step4_data=step4_data, text_number=3, content="Five fine ferns")
+        TeamText.objects.create(step4_data=step4_data, text_number=2, content="Lovely little lambs")
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.url = reverse('phoneme_density:analyze_combined_text', kwargs={'matchup_id': self.matchup.id})
+
+    def test_sums_stored_texts(self):
+        response = self.client.post(self.url, {'text_numbers': '1,3,5,7', 'combined_text': 'zzz'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['team_text'].content, "Fluffy fish\n\nFive fine ferns")
+        self.assertEqual(response.context['combined_text_numbers'], '1,3')
+
+        # Summing the stored vectors matches counting the texts together
+        counts, total_characters = get_active_counter().count("Fluffy fish Five fine ferns")
+        for item in response.context['phoneme_analysis']:
+            self.assertAlmostEqual(item['density'], counts[item['phoneme']] / total_characters * 100)
+
+    def test_no_stored_content(self):
+        response = self.client.post(self.url, {'text_numbers': '5,7'})
+        self.assertRedirects(response, reverse('phoneme_density:step4', kwargs={'matchup_id': self.matchup.id}),
+                             fetch_redirect_response=False)
+
+    def test_outsiders_are_refused(self):
+        for user in (self.outsider, self.other_teacher):
+            self.client.force_login(user)
+            response = self.client.post(self.url, {'text_numbers': '1,3'})
+            self.assertRedirects(response, reverse('aigames:student_dashboard'), fetch_redirect_response=False)
+
+
+class MatchupAnalysisTest(TestCase):
+    """Step 4 loads the analysis of every visible text in one request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        cls.teacher = User.objects.create_user('teacher', password='password')
+        cls.teacher.profile.role = 'teacher'
+        cls.teacher.profile.school = school
+        cls.teacher.profile.save()
+        cls.student = User.objects.create_user('student', password='password')
+        cls.outsider = User.objects.create_user('outsider', password='password')
+        other_teacher = User.objects.create_user('other_teacher', password='password')
+        other_teacher.profile.role = 'teacher'
+        other_teacher.profile.school = School.objects.create(name="Other School", short_name="OS")
+        other_teacher.profile.save()
+        cls.other_teacher = other_teacher
+
+        team1 = Team.objects.create(name="Team 1", school=school, created_by=cls.teacher)
+        cls.team2 = Team.objects.create(name="Team 2", school=school, created_by=cls.teacher)
+        TeamMembership.objects.create(team=team1, user=cls.student)
+        ai_game = AiGame.objects.create(title="Phoneme Density")
+        for step_number in range(1, 6):
+            GameStep.objects.create(ai_game=ai_game, step_number=step_number, title=f"Step {step_number}")
+        cls.matchup = GameMatchup.objects.create(
+            ai_game=ai_game, team1=team1, team2=cls.team2, school=school, created_by=cls.teacher,
+        )
+        for step_number in range(1, 4):
+            cls.matchup.complete_step(step_number)
+
+        own = TeamStep4Data.objects.create(matchup=cls.matchup, team=team1, selected_phoneme='f')
+        TeamText.objects.create(step4_data=own, text_number=1, content="Fluffy fish")
+        TeamText.objects.create(step4_data=own, text_number=2, content="Lovely little lambs")
+        opponent = TeamStep4Data.objects.create(matchup=cls.matchup, team=cls.team2, selected_phoneme='l')
+        TeamText.objects.create(step4_data=opponent, text_number=1, content="Lilies")
+
+    def setUp(self):
+        self.url = reverse('phoneme_density:matchup_analysis', kwargs={'matchup_id': self.matchup.id})
+
+    def test_students_see_their_own_texts(self):
+        self.client.force_login(self.student)
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['success'])
+        self.assertEqual([(text['team_name'], text['text_number']) for text in data['texts']],
+                         [("Team 1", 1), ("Team 1", 2)])
+
+        # One row per text and one column per phoneme, as from the stored counts
+        phonemes = data['phonemes']
+        self.assertEqual(len(data['english_frequencies']), len(phonemes))
+        counts, total_characters = get_active_counter().count("Fluffy fish")
+        first = data['texts'][0]
+        self.assertEqual(first['total_characters'], total_characters)
+        for key in ('frequencies', 'standard_errors', 'z_scores', 'probabilities'):
+            self.assertEqual(len(first[key]), len(phonemes))
+        for phoneme, frequency in zip(phonemes, first['frequencies']):
+            self.assertAlmostEqual(frequency, counts[phoneme] / total_characters * 100)
+
+    def test_teachers_see_both_teams(self):
+        self.client.force_login(self.teacher)
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data['texts']), 3)
+        self.assertEqual(data['texts'][2]['team_id'], self.team2.id)
+
+    def test_outsiders_are_refused(self):
+        for user in (self.outsider, self.other_teacher):
+            self.client.force_login(user)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 403)
+            self.assertFalse(response.json()['success'])
+
+
+class ReviewQueueTest(TestCase):
+    """Teachers review pending texts from their own school in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name="Test School", short_name="TS")
+        other_school = School.objects.create(name="Other School", short_name="OS")
+        cls.teacher = User.objects.create_user('teacher', password='password')
+        cls.teacher.profile.role = 'teacher'
+        cls.teacher.profile.school = school
+        cls.teacher.profile.save()
+
+        ai_game = AiGame.objects.create(title="Phoneme Density")
+        cls.texts = {}
+        for label, matchup_school in [('own', school), ('other', other_school)]:
+            team1 = Team.objects.create(name=f"{label} 1", school=matchup_school, created_by=cls.teacher)
+            team2 = Team.objects.create(name=f"{label} 2", school=matchup_school, created_by=cls.teacher)
+            matchup = GameMatchup.objects.create(
+                ai_game=ai_game, team1=team1, team2=team2, school=matchup_school, created_by=cls.teacher
+            )
+            step4_data = TeamStep4Data.objects.create(matchup=matchup, team=team1, selected_phoneme='f')
+            cls.texts[label] = TeamText.objects.create(step4_data=step4_data, text_number=1, content="Fluffy fish")
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def test_queue_lists_own_school_only(self):
+        response = self.client.get(reverse('phoneme_density:review_queue'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['texts'], [self.texts['own']])
+
+    def test_flags_copies_from_other_teams_in_school(self):
+        own = self.texts['own']
+        matchup = own.step4_data.matchup
+        copier = TeamStep4Data.objects.create(matchup=matchup, team=matchup.team2, selected_phoneme='f')
+        copy = TeamText.objects.create(step4_data=copier, text_number=2, content="fluffy fish!")
+        TeamText.objects.create(step4_data=copier, text_number=3, content="Lovely little lambs")
+
+        response = self.client.get(reverse('phoneme_density:review_queue'))
+        flagged = {text.id: [other.id for other, _ in text.near_duplicates] for text in response.context['texts']}
+        # The identical text in the other school is not a candidate
+        self.assertEqual(flagged[own.id], [copy.id])
+        self.assertEqual(flagged[copy.id], [own.id])
+
+    def test_teachers_without_a_school_see_nothing(self):
+        # Profiles always have a school in the database; the views must not
+        # treat a missing one as "matchups without a school"
+        self.assertEqual(list(pending_review_texts(None)), [])
+
+        self.teacher.profile.school = None
+        request = RequestFactory().post(reverse('phoneme_density:review_queue_bulk'), {
+            'action': 'approve',
+            'text_ids': [self.texts['own'].id, self.texts['other'].id],
+        })
+        request.user = self.teacher
+        request._messages = CookieStorage(request)
+        review_queue_bulk(request)
+        self.assertEqual(TeamText.objects.filter(approval_status='approved').count(), 0)
+
+    def test_bulk_approve_skips_other_schools(self):
+        self.client.post(reverse('phoneme_density:review_queue_bulk'), {
+            'action': 'approve',
+            'text_ids': [self.texts['own'].id, self.texts['other'].id],
+        })
+        own = TeamText.objects.get(pk=self.texts['own'].pk)
+        self.assertEqual(own.approval_status, 'approved')
+        self.assertEqual(own.reviewed_by, self.teacher)
+        self.assertIsNotNone(own.reviewed_at)
+        self.assertEqual(TeamText.objects.get(pk=self.texts['other'].pk).approval_status, 'pending')
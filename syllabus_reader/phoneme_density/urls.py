@@ -4,6 +4,12 @@ from . import views
 app_name = 'phoneme_density'
 
 urlpatterns = [
+    # Spelling rules shared with the browser
+    path('rules.json', views.phoneme_rules_spec, name='phoneme_rules_spec'),
+    
+    # Phoneme-rich word completions for the step 4 editor
+    path('suggestions.json', views.word_suggestions, name='word_suggestions'),
+    
     # Matchup-based gameplay views
     path('matchup/<int:matchup_id>/step1/', views.step1, name='step1'),
     path('matchup/<int:matchup_id>/step2/', views.step2, name='step2'),
@@ -12,6 +18,10 @@ urlpatterns = [
     path('matchup/<int:matchup_id>/step5/', views.step5, name='step5'),
     path('matchup/<int:matchup_id>/step6/', views.step6, name='step6'),
     
+    # Teacher review of step 4 texts
+    path('review/', views.review_queue, name='review_queue'),
+    path('review/bulk/', views.review_queue_bulk, name='review_queue_bulk'),
+    
     # Step completion for teachers
     path('matchup/<int:matchup_id>/complete-step/<int:step_number>/', views.complete_matchup_step, name='complete_matchup_step'),
     
@@ -19,10 +29,12 @@ urlpatterns = [
     path('matchup/<int:matchup_id>/mark-step-complete/<int:step_number>/', views.mark_step_complete, name='mark_step_complete'),
     
     # PDF exports
-    path('matchup/<int:matchup_id>/step1/export-pdf/', views.export_step1_pdf, name='export_step1_pdf'),
+    path('matchup/<int:matchup_id>/step<int:step_number>/export-pdf/', views.export_step_pdf, name='export_step_pdf'),
+    path('matchup/<int:matchup_id>/report/export-pdf/', views.export_matchup_report_pdf, name='export_matchup_report_pdf'),
     
     # Text analysis
     path('matchup/<int:matchup_id>/text/<int:text_number>/analysis/', views.text_analysis, name='text_analysis'),
     path('matchup/<int:matchup_id>/analyze-combined/', views.analyze_combined_text, name='analyze_combined_text'),
+    path('matchup/<int:matchup_id>/analysis/', views.matchup_analysis, name='matchup_analysis'),
     path('matchup/<int:matchup_id>/phoneme-scatter-plot/', views.phoneme_scatter_plot, name='phoneme_scatter_plot'),
 ]
@@ -1,23 +1,40 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import etag, require_POST
+from django.utils.cache import patch_cache_control
 from django.utils import timezone
 from django.urls import reverse
 from django.db import transaction
+from django.db.models import F, prefetch_related_objects
+from django.core.cache import cache
 import json
-import math
+from collections import Counter
 
+import numpy as np
+
+from aigames.membership import TEACHER, get_matchup_membership
 from aigames.models import GameMatchup, MatchupStepProgress, InstructionStep
 from .models import TeamStep4Data, TeamText, PhonemeGuess, TextGuess
 from .constants import PHONEME_CHOICES, ENGLISH_PHONEME_FREQUENCIES, get_phoneme_codes
+from .engine import bootstrap_intervals, content_hash, phoneme_statistics, word_count_matrix
+from .significance import phoneme_p_values
+from .pdf import PdfGenerationError, pdf_response
+from .reference import get_reference_texts
+from .rules import get_active_rule_spec
+from . import classifier
+from .scoring import get_guess_score, rescore_matchup
+from .similarity import find_near_duplicates, index_team_texts
+from .suggestions import MAX_SUGGESTION_LIMIT, SUGGESTION_LIMIT, get_word_index
+from .cache import (
+    MATCHUP_CACHE_TIMEOUT, get_baseline_frequencies, invalidate_matchup_cache, matchup_cache_key,
+)
 
 def redirect_to_step(matchup, step_number):
     """Helper function to dynamically redirect to a step using GameStep model"""
     try:
-        game_step = matchup.ai_game.steps.get(step_number=step_number)
+        game_step = matchup.ai_game.get_step_by_number(step_number, active_only=False)
         step_url = game_step.get_url(matchup.id)
         if step_url:
             return redirect(step_url)
@@ -27,38 +44,21 @@ def redirect_to_step(matchup, step_number):
     return redirect('aigames:student_dashboard')
 
 
-def check_step_access(matchup, user, requested_step_number):
+def check_step_access(request, matchup, requested_step_number):
     """
-    Check if a user can access a specific step in a matchup.
+    Check if the current user can access a specific step in a matchup.
     Returns (can_access, current_step, error_message)
     """
-    # Get the user's team from the matchup
-    user_team = None
-    if user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif user in matchup.team2.members.all():
-        user_team = matchup.team2
-    else:
+    membership = get_matchup_membership(request, matchup)
+    if membership.team is None:
         # User is not part of this matchup, check if they're a teacher
-        if user.profile.can_create_teams:
+        if membership.role == TEACHER:
             return True, None, None  # Teachers can access any step
         else:
             return False, None, "You are not part of this game."
     
-    # Check step progress for this matchup (not team-specific)
-    completed_steps = []
-    matchup_progress = MatchupStepProgress.objects.filter(matchup=matchup)
-    
-    for progress in matchup_progress:
-        step_num = progress.game_step.step_number
-        if progress.completed_at is not None:
-            completed_steps.append(step_num)
-    
-    if completed_steps:
-        last_completed_step = max(completed_steps)
-        current_step_number = last_completed_step + 1
-    else:
-        current_step_number = 1  # Start with step 1 if none completed
+    # Step progress for this matchup (not team-specific), stored on the matchup
+    current_step_number = matchup.current_step_number
     
     # Students can access the current step or any previous completed step
     if requested_step_number <= current_step_number:
@@ -67,6 +67,159 @@ def check_step_access(matchup, user, requested_step_number):
         return False, current_step_number, f"Complete Step {current_step_number} before accessing Step {requested_step_number}."
 
 
+def check_analysis_access(request, matchup):
+    """
+    Check if the current user may read a matchup's stored texts: its teams, and
+    teachers of its school. Returns (can_access, error_message)
+    """
+    can_access, current_step, error_msg = check_step_access(request, matchup, 4)
+    membership = get_matchup_membership(request, matchup)
+    if can_access and membership.team is None and request.user.profile.school_id != matchup.school_id:
+        return False, "You are not part of this game."
+    return can_access, error_msg
+
+
+def get_visible_teams(request, matchup):
+    """
+    Teams whose texts the current user may analyse: students see their own
+    team's texts, and the opponent's once Step 5 is open. Teachers see both teams.
+    """
+    membership = get_matchup_membership(request, matchup)
+    if membership.role == TEACHER or check_step_access(request, matchup, 5)[0]:
+        return [matchup.team1, matchup.team2]
+    return [membership.team or matchup.team2]
+
+
+def load_step4_texts(step4_data):
+    """
+    Load a team's texts in one query and derive the step 4 page state in memory.
+    Returns (text_data, all_approved, can_submit); text_data has an entry per text 1-8.
+    """
+    texts = {text.text_number: text for text in step4_data.texts.all()}
+    
+    text_data = []
+    for i in range(1, 9):
+        team_text = texts.get(i)
+        if team_text:
+            text_data.append({
+                'content': team_text.content,
+                'approval_status': team_text.approval_status,
+                'teacher_feedback': team_text.teacher_feedback,
+                'phoneme_count': team_text.phoneme_count,
+                'phoneme_density': team_text.phoneme_density,
+                'density_category': team_text.get_density_category(),
+            })
+        else:
+            text_data.append({
+                'content': '',
+                'approval_status': None,
+                'teacher_feedback': '',
+                'phoneme_count': 0,
+                'phoneme_density': 0.0,
+                'density_category': 'low',
+            })
+    
+    # Texts with content must all be approved (and there must be at least one)
+    written_texts = [text for text in texts.values() if text.content]
+    can_submit = len(written_texts) > 0
+    all_approved = can_submit and all(text.approval_status == 'approved' for text in written_texts)
+    
+    return text_data, all_approved, can_submit
+
+
+def analyze_counts(counts, total_characters):
+    """
+    Compare phoneme counts ({phoneme: count}, total_characters) against baseline English.
+    Returns (phoneme_list, english_frequencies, text_frequencies, standard_errors,
+    z_scores, phoneme_probabilities, p_values) with per-phoneme dicts. p_values are
+    exact one-sided binomial p-values that each phoneme is overused.
+    """
+    english_frequencies = get_baseline_frequencies()
+    phoneme_list = list(english_frequencies.keys())
+    count_row = [[counts.get(phoneme, 0) for phoneme in phoneme_list]]
+    baseline = list(english_frequencies.values())
+
+    stats = phoneme_statistics(count_row, [total_characters], baseline)
+    p_values = phoneme_p_values(count_row, [total_characters], baseline)
+
+    def by_phoneme(values):
+        return dict(zip(phoneme_list, values[0].tolist()))
+
+    return (
+        phoneme_list,
+        english_frequencies,
+        by_phoneme(stats['frequencies']),
+        by_phoneme(stats['standard_errors']),
+        by_phoneme(stats['z_scores']),
+        by_phoneme(stats['probabilities']),
+        by_phoneme(p_values),
+    )
+
+
+def get_density_intervals(team_texts, phoneme_list):
+    """
+    95% bootstrap intervals for the combined phoneme densities of stored texts,
+    as {phoneme: (lower, upper)}. Words are resampled from every text's stored
+    spans, seeded by the texts' content hashes.
+    """
+    matrices = [
+        word_count_matrix(team_text.content, team_text.phoneme_spans, phoneme_list)
+        for team_text in team_texts
+    ]
+    word_counts = np.vstack([counts for counts, _ in matrices])
+    word_lengths = np.concatenate([lengths for _, lengths in matrices])
+    # Seeded by the content so the same texts always get the same intervals
+    digest = content_hash(':'.join(team_text.content_hash for team_text in team_texts))
+    lower, upper = bootstrap_intervals(word_counts, word_lengths, seed=int(digest[:16], 16))
+    return {
+        phoneme: (float(low), float(high))
+        for phoneme, low, high in zip(phoneme_list, lower, upper)
+    }
+
+
+def get_combined_analysis(step4_data, text_numbers):
+    """
+    Analysis of a team's stored texts taken together, or None if none of them
+    has content. The per-text phoneme vectors are summed, so nothing is
+    recounted. Cached per matchup, team and text set (see cache.py).
+    """
+    cache_key = matchup_cache_key(
+        step4_data.matchup_id, 'combined', step4_data.team_id, ','.join(map(str, text_numbers)),
+    )
+    analysis = cache.get(cache_key)
+    if analysis is None:
+        team_texts = list(
+            step4_data.texts.filter(text_number__in=text_numbers).exclude(content='').order_by('text_number')
+        )
+        if not team_texts:
+            return None
+
+        counts = Counter()
+        total_characters = 0
+        for team_text in team_texts:
+            text_counts, text_characters = team_text.get_phoneme_vector()
+            counts.update(text_counts)
+            total_characters += text_characters
+
+        phoneme_list, english_frequencies, text_frequencies, standard_errors, z_scores, phoneme_probabilities, p_values = (
+            analyze_counts(counts, total_characters)
+        )
+        analysis = {
+            'content': '\n\n'.join(team_text.content for team_text in team_texts),
+            'text_numbers': [team_text.text_number for team_text in team_texts],
+            'phoneme_list': phoneme_list,
+            'english_frequencies': english_frequencies,
+            'text_frequencies': text_frequencies,
+            'standard_errors': standard_errors,
+            'z_scores': z_scores,
+            'phoneme_probabilities': phoneme_probabilities,
+            'p_values': p_values,
+            'density_intervals': get_density_intervals(team_texts, phoneme_list),
+        }
+        cache.set(cache_key, analysis, MATCHUP_CACHE_TIMEOUT)
+    return analysis
+
+
 # Matchup-based views (new architecture)
 @login_required
 def step1(request, matchup_id):
@@ -74,13 +227,13 @@ def step1(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 1)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 1)
     if not can_access:
         messages.error(request, error_msg)
         return redirect('aigames:student_dashboard')
     
     # Create or get progress record for this matchup and step
-    game_step = matchup.ai_game.steps.get(step_number=1)
+    game_step = matchup.ai_game.get_step_by_number(1, active_only=False)
     progress, created = MatchupStepProgress.objects.get_or_create(
         matchup=matchup,
         game_step=game_step,
@@ -93,49 +246,27 @@ def step1(request, matchup_id):
         game_step__step_number=1
     )
     
-    # Sample texts for phoneme density analysis
-    texts = [
-        {
-            'id': 1,
-            'title': 'Text 1',
-            'content': 'The red roses grew rapidly in the garden. Robert ran around the rusty railroad tracks.',
-        },
-        {
-            'id': 2,
-            'title': 'Text 2', 
-            'content': 'The beautiful blue sky stretched endlessly above the peaceful meadow.',
-        },
-        {
-            'id': 3,
-            'title': 'Text 3',
-            'content': 'Students studied silently in the spacious library during the summer session.',
-        },
-        {
-            'id': 4,
-            'title': 'Text 4',
-            'content': 'Bright orange carrots and crisp green broccoli were arranged in colorful rows.',
-        }
-    ]
+    # Reference texts for this game (annotated when saved, cached per game)
+    reference = get_reference_texts(matchup.ai_game_id)
     
     # Get the AI game for context
     ai_game = matchup.ai_game
     
     # Get total steps for this game
-    total_steps = ai_game.steps.filter(is_active=True).count()
+    total_steps = len(ai_game.get_ordered_steps())
     
     # Check if there are more steps and if next step is accessible
     has_next_step = total_steps > 1
     next_step_accessible = False
     if has_next_step:
         # Check if step 1 is complete to allow access to step 2
-        step1_progress = matchup.get_progress_for_step(1)
-        next_step_accessible = step1_progress and step1_progress.is_completed
+        next_step_accessible = matchup.is_step_completed(1)
     
     context = {
         'matchup': matchup,
         'ai_game': ai_game,
         'instructions': instructions,
-        'texts': texts,
+        'texts': reference['texts'],
         'step_number': 1,
         'step_title': 'Text Analysis',
         'total_steps': total_steps,
@@ -156,7 +287,7 @@ def step2(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 2)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 2)
     if not can_access:
         messages.error(request, error_msg)
         if current_step:
@@ -170,52 +301,26 @@ def step2(request, matchup_id):
     )
     
     # Same texts as step 1, but now with labels revealed
-    texts = [
-        {
-            'id': 1,
-            'title': 'Text 1',
-            'content': 'The red roses grew rapidly in the garden. Robert ran around the rusty railroad tracks.',
-            'is_phoneme_heavy': True
-        },
-        {
-            'id': 2,
-            'title': 'Text 2', 
-            'content': 'The beautiful blue sky stretched endlessly above the peaceful meadow.',
-            'is_phoneme_heavy': False
-        },
-        {
-            'id': 3,
-            'title': 'Text 3',
-            'content': 'Students studied silently in the spacious library during the summer session.',
-            'is_phoneme_heavy': False
-        },
-        {
-            'id': 4,
-            'title': 'Text 4',
-            'content': 'Bright orange carrots and crisp green broccoli were arranged in colorful rows.',
-            'is_phoneme_heavy': True
-        }
-    ]
+    reference = get_reference_texts(matchup.ai_game_id)
     
     # Get the AI game for context
     ai_game = matchup.ai_game
     
     # Get total steps for this game
-    total_steps = ai_game.steps.filter(is_active=True).count()
+    total_steps = len(ai_game.get_ordered_steps())
     
     # Check if there are more steps and if next step is accessible
     has_next_step = total_steps > 2
     next_step_accessible = False
     if has_next_step:
         # Check if step 2 is complete to allow access to step 3
-        step2_progress = matchup.get_progress_for_step(2)
-        next_step_accessible = step2_progress and step2_progress.is_completed
+        next_step_accessible = matchup.is_step_completed(2)
     
     context = {
         'matchup': matchup,
         'ai_game': ai_game,
         'instructions': instructions,
-        'texts': texts,
+        'texts': reference['texts'],
         'step_number': 2,
         'step_title': 'Label Reveal',
         'total_steps': total_steps,
@@ -237,7 +342,7 @@ def step3(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 3)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 3)
     if not can_access:
         messages.error(request, error_msg)
         if current_step:
@@ -251,55 +356,29 @@ def step3(request, matchup_id):
     )
     
     # Same texts with rule highlighting
-    texts = [
-        {
-            'id': 1,
-            'title': 'Text 1',
-            'content': 'The red roses grew rapidly in the garden. Robert ran around the rusty railroad tracks.',
-            'is_phoneme_heavy': True
-        },
-        {
-            'id': 2,
-            'title': 'Text 2', 
-            'content': 'The beautiful blue sky stretched endlessly above the peaceful meadow.',
-            'is_phoneme_heavy': False
-        },
-        {
-            'id': 3,
-            'title': 'Text 3',
-            'content': 'Students studied silently in the spacious library during the summer session.',
-            'is_phoneme_heavy': False
-        },
-        {
-            'id': 4,
-            'title': 'Text 4',
-            'content': 'Bright orange carrots and crisp green broccoli were arranged in colorful rows.',
-            'is_phoneme_heavy': True
-        }
-    ]
+    reference = get_reference_texts(matchup.ai_game_id)
     
     # Get the AI game for context
     ai_game = matchup.ai_game
     
     # Get total steps for this game
-    total_steps = ai_game.steps.filter(is_active=True).count()
+    total_steps = len(ai_game.get_ordered_steps())
     
     # Check if there are more steps and if next step is accessible
     has_next_step = total_steps > 3
     next_step_accessible = False
     if has_next_step:
         # Check if step 3 is complete to allow access to step 4
-        step3_progress = matchup.get_progress_for_step(3)
-        next_step_accessible = step3_progress and step3_progress.is_completed
+        next_step_accessible = matchup.is_step_completed(3)
     
     context = {
         'matchup': matchup,
         'ai_game': ai_game,
         'instructions': instructions,
-        'texts': texts,
+        'texts': reference['texts'],
         'step_number': 3,
         'step_title': 'Rule Reveal',
-        'target_phoneme': 'r',  # This would come from the game configuration
+        'target_phoneme': reference['target_phoneme'],
         'total_steps': total_steps,
         'has_next_step': has_next_step,
         'next_step_accessible': next_step_accessible,
@@ -317,10 +396,10 @@ def step3(request, matchup_id):
 @login_required
 def step4(request, matchup_id):
     """Step 4: Text generation - Teams create their own texts (matchup-based)"""
-    matchup = get_object_or_404(GameMatchup, id=matchup_id)
+    matchup = get_object_or_404(GameMatchup.objects.select_related('ai_game', 'team1', 'team2'), id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 4)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 4)
     if not can_access:
         messages.error(request, error_msg)
         if current_step:
@@ -328,17 +407,13 @@ def step4(request, matchup_id):
         return redirect('aigames:student_dashboard')
     
     # Determine user's team
-    user_team = None
-    is_teacher = request.user.profile.can_create_teams
-    
-    if not is_teacher:
-        if request.user in matchup.team1.members.all():
-            user_team = matchup.team1
-        elif request.user in matchup.team2.members.all():
-            user_team = matchup.team2
-        else:
-            messages.error(request, "You are not part of this game.")
-            return redirect('aigames:student_dashboard')
+    membership = get_matchup_membership(request, matchup)
+    is_teacher = membership.role == TEACHER
+    user_team = membership.team
+    
+    if not is_teacher and user_team is None:
+        messages.error(request, "You are not part of this game.")
+        return redirect('aigames:student_dashboard')
     
     # For teachers viewing the page, show both teams or allow team selection
     if is_teacher:
@@ -359,78 +434,33 @@ def step4(request, matchup_id):
         
         # Handle regular form submission
         selected_phoneme = request.POST.get('selected_phoneme', '').strip()
-        if selected_phoneme:
-            step4_data.selected_phoneme = selected_phoneme
-            step4_data.save()
+        phoneme_changed = bool(selected_phoneme) and selected_phoneme != step4_data.selected_phoneme
         
         # Save all text data
         with transaction.atomic():
-            for i in range(1, 9):  # Text 1-8
-                text_content = request.POST.get(f'text_{i}', '').strip()
-                
-                # Get or create the text object
-                team_text, created = TeamText.objects.get_or_create(
-                    step4_data=step4_data,
-                    text_number=i
-                )
-                
-                # Only update if content changed and text isn't approved
-                if team_text.content != text_content and team_text.approval_status != 'approved':
-                    team_text.content = text_content
-                    # Reset approval status if content changed
-                    if team_text.approval_status == 'approved' and text_content != team_text.content:
-                        team_text.approval_status = 'pending'
-                        team_text.reviewed_by = None
-                        team_text.reviewed_at = None
-                        team_text.teacher_feedback = ''
-                    team_text.save()
+            if phoneme_changed:
+                step4_data.selected_phoneme = selected_phoneme
+                step4_data.save(update_fields=['selected_phoneme', 'updated_at'])
+            
+            contents = {i: request.POST.get(f'text_{i}', '').strip() for i in range(1, 9)}  # Text 1-8
+            write_step4_texts(step4_data, contents, phoneme_changed, timezone.now())
+            
+            # Open autosave pages must merge these changes before saving again
+            TeamStep4Data.objects.filter(pk=step4_data.pk).update(
+                autosave_revision=F('autosave_revision') + 1
+            )
         
         # Handle submit for review
         if request.POST.get('submit_for_review'):
             # Update all non-empty texts to pending status
-            for team_text in step4_data.texts.filter(content__isnull=False).exclude(content=''):
-                if team_text.approval_status != 'approved':
-                    team_text.approval_status = 'pending'
-                    team_text.save()
+            step4_data.texts.exclude(content='').exclude(approval_status='approved').update(approval_status='pending')
             
             messages.success(request, "Your texts have been submitted for teacher review.")
         
         return redirect('phoneme_density:step4', matchup_id=matchup.id)
     
-    # Prepare data for template
-    text_data = []
-    for i in range(1, 9):
-        try:
-            team_text = step4_data.texts.get(text_number=i)
-            text_data.append({
-                'content': team_text.content,
-                'approval_status': team_text.approval_status,
-                'teacher_feedback': team_text.teacher_feedback,
-                'phoneme_count': team_text.phoneme_count,
-                'phoneme_density': team_text.phoneme_density,
-                'density_category': team_text.get_density_category(),
-            })
-        except TeamText.DoesNotExist:
-            text_data.append({
-                'content': '',
-                'approval_status': None,
-                'teacher_feedback': '',
-                'phoneme_count': 0,
-                'phoneme_density': 0.0,
-                'density_category': 'low',
-            })
-    
-    # Check if all texts are approved
-    all_approved = step4_data.texts.filter(
-        content__isnull=False
-    ).exclude(content='').count() > 0 and step4_data.texts.filter(
-        content__isnull=False
-    ).exclude(content='').exclude(approval_status='approved').count() == 0
-    
-    # Check if user can submit (has at least one text with content)
-    can_submit = step4_data.texts.filter(
-        content__isnull=False
-    ).exclude(content='').count() > 0
+    # Prepare data for template (one query for all texts)
+    text_data, all_approved, can_submit = load_step4_texts(step4_data)
     
     # Get instructions for step 4
     instructions = InstructionStep.objects.filter(
@@ -440,11 +470,10 @@ def step4(request, matchup_id):
     
     # Navigation context for gamepage template
     ai_game = matchup.ai_game
-    total_steps = ai_game.steps.count()
+    total_steps = len(ai_game.get_catalog_steps(active_only=False))
     has_next_step = 4 < total_steps
     
     # Check if step 4 is complete to allow access to step 5
-    step4_progress = matchup.get_progress_for_step(4)
     next_step_accessible = all_approved  # Step 4 is complete when all texts are approved
 
     context = {
@@ -469,39 +498,112 @@ def step4(request, matchup_id):
         'next_step_accessible': next_step_accessible,
         'previous_step_url': reverse('phoneme_density:step3', kwargs={'matchup_id': matchup.id}),
         'next_step_url': reverse('phoneme_density:step5', kwargs={'matchup_id': matchup.id}) if has_next_step else None,
+        'rules_version': get_active_rule_spec()['version'],
     }
     
     return render(request, 'phoneme_density/step4.html', context)
 
 
+def write_step4_texts(step4_data, contents, phoneme_changed, now):
+    """
+    Write a team's texts from {text_number: content} with one fetch and bulk
+    writes, skipping unchanged and approved texts; every text's stats are
+    recomputed if the selected phoneme changed. The near-duplicate index,
+    cached results and guess scores are refreshed once for the whole batch
+    (bulk writes send no TeamText signals). Call inside a transaction.
+    """
+    existing_texts = {text.text_number: text for text in step4_data.texts.all()}
+    texts_to_create = []
+    texts_to_update = []
+    changed_texts = []
+    
+    for text_number in range(1, 9):
+        team_text = existing_texts.get(text_number)
+        if team_text is None:
+            if text_number in contents:
+                team_text = TeamText(step4_data=step4_data, text_number=text_number, content=contents[text_number])
+                team_text.calculate_phoneme_stats()
+                texts_to_create.append(team_text)
+                changed_texts.append(team_text)
+            continue
+        
+        team_text.step4_data = step4_data
+        
+        # Only update if content changed and not approved
+        if (text_number in contents and team_text.approval_status != 'approved'
+                and contents[text_number] != team_text.content):
+            team_text.content = contents[text_number]
+            changed_texts.append(team_text)
+        elif not phoneme_changed:
+            continue
+        
+        team_text.updated_at = now
+        team_text.calculate_phoneme_stats()
+        texts_to_update.append(team_text)
+    
+    TeamText.objects.bulk_create(texts_to_create)
+    TeamText.objects.bulk_update(texts_to_update, [
+        'content', 'phoneme_counts', 'phoneme_spans', 'total_characters', 'content_hash', 'ruleset_version',
+        'phoneme_count', 'phoneme_density', 'updated_at',
+    ])
+    if changed_texts:
+        index_team_texts(changed_texts, step4_data.matchup.school_id)
+        transaction.on_commit(lambda: invalidate_matchup_cache(step4_data.matchup_id))
+    if changed_texts or phoneme_changed:
+        transaction.on_commit(lambda: rescore_matchup(step4_data.matchup_id))
+
+
 def handle_step4_autosave(request, step4_data):
-    """Handle auto-save functionality for step 4"""
+    """
+    Handle auto-save functionality for step 4.
+
+    The client sends only the changed text numbers (text_numbers) and the
+    revision its texts are based on. Stale revisions are rejected with the
+    current texts so the client can merge and retry.
+    """
     try:
-        # Update selected phoneme
-        selected_phoneme = request.POST.get('selected_phoneme', '').strip()
-        if selected_phoneme:
-            step4_data.selected_phoneme = selected_phoneme
-            step4_data.save()
+        base_revision = int(request.POST.get('revision', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Missing autosave revision.'}, status=400)
+    
+    try:
+        text_numbers = {
+            int(number) for number in request.POST.get('text_numbers', '').split(',') if number.strip()
+        }
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid text numbers.'}, status=400)
+    text_numbers &= set(range(1, 9))
+    
+    selected_phoneme = request.POST.get('selected_phoneme', '').strip() or step4_data.selected_phoneme
+    now = timezone.now()
+    
+    with transaction.atomic():
+        # Claim the next revision; fails if another save got there first
+        claimed = TeamStep4Data.objects.filter(
+            pk=step4_data.pk, autosave_revision=base_revision
+        ).update(
+            autosave_revision=F('autosave_revision') + 1,
+            selected_phoneme=selected_phoneme,
+            updated_at=now,
+        )
+        if not claimed:
+            step4_data.refresh_from_db()
+            return JsonResponse({
+                'success': False,
+                'error': 'stale_revision',
+                'revision': step4_data.autosave_revision,
+                'texts': {text.text_number: text.content for text in step4_data.texts.all()},
+            }, status=409)
         
-        # Save text data
-        with transaction.atomic():
-            for i in range(1, 9):
-                text_content = request.POST.get(f'text_{i}', '').strip()
-                
-                team_text, created = TeamText.objects.get_or_create(
-                    step4_data=step4_data,
-                    text_number=i
-                )
-                
-                # Only update if content changed and not approved
-                if team_text.approval_status != 'approved':
-                    team_text.content = text_content
-                    team_text.save()
+        phoneme_changed = selected_phoneme != step4_data.selected_phoneme
+        step4_data.selected_phoneme = selected_phoneme
+        step4_data.autosave_revision = base_revision + 1
         
-        return JsonResponse({'success': True})
+        contents = {text_number: request.POST.get(f'text_{text_number}', '').strip() for text_number in text_numbers}
+        write_step4_texts(step4_data, contents, phoneme_changed, now)
+    
+    return JsonResponse({'success': True, 'revision': step4_data.autosave_revision})
     
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
 
 
 @login_required
@@ -510,25 +612,17 @@ def step5(request, matchup_id):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 5)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 5)
     if not can_access:
         messages.error(request, error_msg)
         if current_step:
             return redirect_to_step(matchup, current_step)
         return redirect('aigames:student_dashboard')
     
-    # Get the user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-        opposing_team = matchup.team2
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
-        opposing_team = matchup.team1
-    else:
-        # Teachers can view both teams
-        user_team = matchup.team1  # Default for teachers
-        opposing_team = matchup.team2
+    # Get the user's team (teachers view team 1 against team 2)
+    membership = get_matchup_membership(request, matchup)
+    user_team = membership.team or matchup.team1
+    opposing_team = membership.opponent or matchup.team2
     
     # Get opponent's step 4 data and texts
     try:
@@ -555,17 +649,23 @@ def step5(request, matchup_id):
                     phoneme_guess.rule_description = request.POST.get('rule_description', '')
                     phoneme_guess.save()
                     
-                    # Clear existing text guesses
-                    phoneme_guess.text_guesses.all().delete()
+                    # Upsert all 8 text guesses in one statement
+                    TextGuess.objects.bulk_create(
+                        [
+                            TextGuess(
+                                phoneme_guess=phoneme_guess,
+                                text_number=i,
+                                follows_rule=request.POST.get(f'text_{i}_follows_rule') == 'on',
+                            )
+                            for i in range(1, 9)  # 8 texts
+                        ],
+                        update_conflicts=True,
+                        unique_fields=['phoneme_guess', 'text_number'],
+                        update_fields=['follows_rule'],
+                    )
                     
-                    # Create new text guesses
-                    for i in range(1, 9):  # 8 texts
-                        follows_rule = request.POST.get(f'text_{i}_follows_rule') == 'on'
-                        TextGuess.objects.create(
-                            phoneme_guess=phoneme_guess,
-                            text_number=i,
-                            follows_rule=follows_rule
-                        )
+                    # Score the new guesses now so the results never compute on read
+                    transaction.on_commit(lambda: rescore_matchup(matchup.id))
                     
                     messages.success(request, "Your guesses have been submitted successfully!")
                     return redirect('phoneme_density:step5', matchup_id=matchup_id)
@@ -573,21 +673,23 @@ def step5(request, matchup_id):
             except Exception as e:
                 messages.error(request, f"Error saving guesses: {str(e)}")
     
-    # Get existing text guesses for display
-    existing_text_guesses = {}
-    for text_guess in phoneme_guess.text_guesses.all():
-        existing_text_guesses[text_guess.text_number] = text_guess.follows_rule
+    # Get existing text guesses for display (one prefetch)
+    prefetch_related_objects([phoneme_guess], 'text_guesses')
+    existing_text_guesses = {
+        text_guess.text_number: text_guess.follows_rule
+        for text_guess in phoneme_guess.text_guesses.all()
+    }
     
     # Get instructions for this step
     instructions = InstructionStep.objects.filter(
         game_step__ai_game=matchup.ai_game,
         game_step__step_number=5
-    ).order_by('order')
+    )
     
     # Check if guesses have been submitted
     guesses_submitted = (
         phoneme_guess.phoneme_guess and 
-        phoneme_guess.text_guesses.exists()
+        bool(existing_text_guesses)
     )
     
     context = {
@@ -606,20 +708,274 @@ def step5(request, matchup_id):
     return render(request, 'phoneme_density/step5.html', context)
 
 
+def get_classifier_results(matchup):
+    """
+    Train the Step 6 classifier on each team's texts and score the opponent's.
+    Returns {training team id: {'model', 'predictions', 'accuracy'}}, cached per
+    matchup and selected phonemes (see cache.py).
+    """
+    step4_entries = {
+        data.team_id: data
+        for data in TeamStep4Data.objects.filter(matchup=matchup, team__in=[matchup.team1_id, matchup.team2_id])
+    }
+    selected_phonemes = [
+        (step4_entries[team_id].selected_phoneme if team_id in step4_entries else None) or ''
+        for team_id in (matchup.team1_id, matchup.team2_id)
+    ]
+    cache_key = matchup_cache_key(matchup.id, 'classifier', *selected_phonemes)
+    results = cache.get(cache_key)
+    if results is not None:
+        return results
+    
+    baseline_frequencies = get_baseline_frequencies()
+    phoneme_list = list(baseline_frequencies.keys())
+    baseline = list(baseline_frequencies.values())
+    
+    # Stored vectors for every non-empty text, grouped by team
+    team_rows = {matchup.team1_id: [], matchup.team2_id: []}
+    step4_by_id = {data.id: data for data in step4_entries.values()}
+    team_texts = TeamText.objects.filter(
+        step4_data__in=step4_by_id
+    ).exclude(content='').order_by('text_number')
+    for team_text in team_texts:
+        team_text.step4_data = step4_by_id[team_text.step4_data_id]
+        counts, total_characters = team_text.get_phoneme_vector()
+        team_rows[team_text.step4_data.team_id].append(
+            (team_text.text_number, [counts.get(phoneme, 0) for phoneme in phoneme_list], total_characters)
+        )
+    
+    def team_matrix(team_id):
+        rows = team_rows[team_id]
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+    
+    def phoneme_index(team_id):
+        step4_data = step4_entries.get(team_id)
+        phoneme = (step4_data.selected_phoneme or '').lower() if step4_data else ''
+        return phoneme_list.index(phoneme) if phoneme in phoneme_list else None
+    
+    results = {}
+    for train_team_id, target_team_id in (
+        (matchup.team1_id, matchup.team2_id),
+        (matchup.team2_id, matchup.team1_id),
+    ):
+        train_index = phoneme_index(train_team_id)
+        target_index = phoneme_index(target_team_id)
+        _, train_counts, train_totals = team_matrix(train_team_id)
+        target_numbers, target_counts, target_totals = team_matrix(target_team_id)
+        if train_index is None or target_index is None or not train_counts or not target_counts:
+            continue
+        
+        model = classifier.train(
+            classifier.text_features(train_counts, train_totals, baseline),
+            classifier.rule_labels(train_counts, train_totals, baseline, train_index),
+        )
+        probabilities = classifier.predict_proba(
+            model, classifier.text_features(target_counts, target_totals, baseline)
+        )
+        actual = classifier.rule_labels(target_counts, target_totals, baseline, target_index)
+        
+        predictions = [
+            {
+                'text_number': text_number,
+                'probability': float(probability) * 100,
+                'predicted': bool(probability >= 0.5),
+                'actual': bool(follows_rule),
+            }
+            for text_number, probability, follows_rule in zip(target_numbers, probabilities, actual)
+        ]
+        results[train_team_id] = {
+            'model': model,
+            'predictions': predictions,
+            'accuracy': sum(p['predicted'] == p['actual'] for p in predictions) / len(predictions) * 100,
+        }
+    
+    cache.set(cache_key, results, MATCHUP_CACHE_TIMEOUT)
+    return results
+
+
 @login_required
 def step6(request, matchup_id):
     """Step 6: ML analysis results - Show how ML performed (matchup-based)"""
-    matchup = get_object_or_404(GameMatchup, id=matchup_id)
+    matchup = get_object_or_404(GameMatchup.objects.select_related('ai_game', 'team1', 'team2'), id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 6)
+    can_access, current_step, error_msg = check_step_access(request, matchup, 6)
     if not can_access:
         messages.error(request, error_msg)
         return redirect('aigames:student_dashboard')
     
-    # TODO: Implement step 6 functionality
-    messages.info(request, "Step 6 is not yet implemented.")
-    return redirect_to_step(matchup, 3)
+    # Get the user's team (teachers view team 1 against team 2)
+    membership = get_matchup_membership(request, matchup)
+    user_team = membership.team or matchup.team1
+    opposing_team = membership.opponent or matchup.team2
+    
+    # The classifier trained on our texts, scoring the opponent's (the same task as Step 5)
+    ml_results = get_classifier_results(matchup).get(user_team.id)
+    
+    # The team's own Step 5 guesses for comparison, scored when they were submitted
+    phoneme_guess = PhonemeGuess.objects.filter(
+        matchup=matchup, guessing_team=user_team, target_team=opposing_team
+    ).first()
+    guess_score = get_guess_score(phoneme_guess) if phoneme_guess else None
+    team_guesses = {
+        text['text_number']: text['guess'] for text in (guess_score['texts'] if guess_score else [])
+    }
+    opponent_texts = {
+        text.text_number: text.content
+        for text in TeamText.objects.filter(step4_data__matchup=matchup, step4_data__team=opposing_team)
+    }
+    
+    comparison = []
+    if ml_results:
+        for prediction in ml_results['predictions']:
+            comparison.append({
+                **prediction,
+                'content': opponent_texts.get(prediction['text_number'], ''),
+                'team_guess': team_guesses.get(prediction['text_number'], False),
+            })
+    team_accuracy = guess_score['accuracy'] if guess_score else 0
+    
+    # Get instructions for step 6
+    instructions = InstructionStep.objects.filter(
+        game_step__ai_game=matchup.ai_game,
+        game_step__step_number=6
+    )
+    
+    total_steps = len(matchup.ai_game.get_catalog_steps(active_only=False))
+    
+    context = {
+        'matchup': matchup,
+        'ai_game': matchup.ai_game,
+        'team': user_team,
+        'opposing_team': opposing_team,
+        'ml_results': ml_results,
+        'comparison': comparison,
+        'team_accuracy': team_accuracy,
+        'guess_score': guess_score,
+        'rule_z_threshold': classifier.RULE_Z_THRESHOLD,
+        'instructions': instructions,
+        # Navigation context for gamepage template
+        'step_number': 6,
+        'step_title': 'ML Analysis',
+        'total_steps': total_steps,
+        'current_step': 6,
+        'step_name': 'Step 6: ML Analysis',
+        'has_next_step': 6 < total_steps,
+        'next_step_accessible': False,
+        'previous_step_url': reverse('phoneme_density:step5', kwargs={'matchup_id': matchup.id}),
+        'next_step_url': None,
+    }
+    
+    return render(request, 'phoneme_density/step6.html', context)
+
+
+REVIEW_QUEUE_PAGE_SIZE = 25
+
+
+def pending_review_texts(school):
+    """Pending texts with content for a school's matchups, oldest first"""
+    if school is None:
+        # Teachers without a school review nothing (not the matchups without one)
+        return TeamText.objects.none()
+    return (
+        TeamText.objects.filter(step4_data__matchup__school=school, approval_status='pending')
+        .exclude(content='')
+        .select_related(
+            'step4_data__team',
+            'step4_data__matchup__ai_game',
+            'step4_data__matchup__team1',
+            'step4_data__matchup__team2',
+        )
+        .order_by('id')
+    )
+
+
+@login_required
+def review_queue(request):
+    """Pending step 4 texts across the teacher's school, paged by text id"""
+    if not request.user.profile.can_create_teams:
+        messages.error(request, "Only teachers can review texts.")
+        return redirect('aigames:student_dashboard')
+    
+    profile = request.user.profile
+    school = profile.school if profile.school_id else None
+    texts = pending_review_texts(school)
+    
+    # Keyset pagination: the page after the last text id shown
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    if after:
+        texts = texts.filter(id__gt=after)
+    
+    page = list(texts[:REVIEW_QUEUE_PAGE_SIZE + 1])
+    has_next_page = len(page) > REVIEW_QUEUE_PAGE_SIZE
+    page = page[:REVIEW_QUEUE_PAGE_SIZE]
+    
+    # Flag texts that closely match another team's text anywhere in the school
+    near_duplicates = find_near_duplicates(page, school.id) if page else {}
+    for text in page:
+        text.near_duplicates = near_duplicates.get(text.id, [])
+    
+    context = {
+        'user_school': school,
+        'texts': page,
+        'after': after,
+        'next_after': page[-1].id if has_next_page else None,
+    }
+    return render(request, 'phoneme_density/review_queue.html', context)
+
+
+@login_required
+@require_POST
+def review_queue_bulk(request):
+    """Approve or reject the selected pending texts in one update"""
+    if not request.user.profile.can_create_teams:
+        messages.error(request, "Only teachers can review texts.")
+        return redirect('aigames:student_dashboard')
+    
+    action = request.POST.get('action')
+    statuses = {'approve': 'approved', 'reject': 'rejected'}
+    text_ids = [text_id for text_id in request.POST.getlist('text_ids') if text_id.isdigit()]
+    after = request.POST.get('after', '')
+    redirect_url = reverse('phoneme_density:review_queue')
+    if after.isdigit() and int(after):
+        redirect_url += f'?after={after}'
+    
+    if action not in statuses or not text_ids:
+        messages.error(request, "Select at least one text and choose approve or reject.")
+        return redirect(redirect_url)
+    
+    # Only pending texts from the teacher's own school can be reviewed
+    school_id = request.user.profile.school_id
+    if school_id is None:
+        texts = []
+    else:
+        texts = list(
+            TeamText.objects.filter(
+                id__in=text_ids,
+                step4_data__matchup__school_id=school_id,
+                approval_status='pending',
+            )
+        )
+    
+    now = timezone.now()
+    feedback = request.POST.get('teacher_feedback', '').strip()
+    update_fields = ['approval_status', 'reviewed_by', 'reviewed_at']
+    if feedback:
+        update_fields.append('teacher_feedback')
+    for text in texts:
+        text.approval_status = statuses[action]
+        text.reviewed_by = request.user
+        text.reviewed_at = now
+        if feedback:
+            text.teacher_feedback = feedback
+    TeamText.objects.bulk_update(texts, update_fields)
+    
+    verb = 'Approved' if action == 'approve' else 'Rejected'
+    messages.success(request, f"{verb} {len(texts)} text(s).")
+    return redirect(redirect_url)
 
 
 @login_required
@@ -633,15 +989,11 @@ def complete_matchup_step(request, matchup_id, step_number):
         return redirect('aigames:student_dashboard')
     
     # Get the game step
-    try:
-        game_step = matchup.ai_game.steps.get(step_number=step_number)
-    except:
+    game_step = matchup.ai_game.get_step_by_number(step_number, active_only=False)
+    if game_step is None:
         messages.error(request, f"Step {step_number} not found.")
         return redirect('aigames:student_dashboard')
     
-    # Get the game step
-    game_step = matchup.ai_game.steps.get(step_number=step_number)
-    
     # Mark step as complete for the matchup
     progress, created = MatchupStepProgress.objects.get_or_create(
         matchup=matchup,
@@ -663,7 +1015,7 @@ def mark_step_complete(request, matchup_id, step_number):
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
     # Get the game step
-    game_step = matchup.ai_game.steps.get(step_number=step_number)
+    game_step = matchup.ai_game.get_step_by_number(step_number, active_only=False)
     
     # Mark step as complete for the matchup
     progress, created = MatchupStepProgress.objects.get_or_create(
@@ -682,111 +1034,114 @@ def mark_step_complete(request, matchup_id, step_number):
     return redirect_to_step(matchup, step_number)
 
 
-@login_required 
-def export_step1_pdf(request, matchup_id):
-    """Export Step 1 analysis as PDF"""
-    matchup = get_object_or_404(GameMatchup, id=matchup_id)
+PDF_STEP_TITLES = {1: 'Text Analysis', 2: 'Label Reveal', 3: 'Rule Reveal'}
+
+
+@login_required
+def export_step_pdf(request, matchup_id, step_number):
+    """Export the reference texts of steps 1-3 as PDF"""
+    if step_number not in PDF_STEP_TITLES:
+        raise Http404("This step has no PDF export.")
+    
+    matchup = get_object_or_404(GameMatchup.objects.select_related('ai_game', 'team1', 'team2', 'school'), id=matchup_id)
     
     # Check access
-    can_access, current_step, error_msg = check_step_access(matchup, request.user, 1)
+    can_access, current_step, error_msg = check_step_access(request, matchup, step_number)
     if not can_access:
         messages.error(request, error_msg)
         return redirect('aigames:student_dashboard')
     
-    # Sample texts for the PDF
-    texts = [
-        {
-            'id': 1,
-            'title': 'Text 1',
-            'content': 'The red roses grew rapidly in the garden. Robert ran around the rusty railroad tracks.',
-        },
-        {
-            'id': 2,
-            'title': 'Text 2', 
-            'content': 'The beautiful blue sky stretched endlessly above the peaceful meadow.',
-        },
-        {
-            'id': 3,
-            'title': 'Text 3',
-            'content': 'Students studied silently in the spacious library during the summer session.',
-        },
-        {
-            'id': 4,
-            'title': 'Text 4',
-            'content': 'Bright orange carrots and crisp green broccoli were arranged in colorful rows.',
-        }
-    ]
+    user_role = get_matchup_membership(request, matchup).role
+    instructions = InstructionStep.objects.filter(
+        game_step__ai_game=matchup.ai_game,
+        game_step__step_number=step_number,
+        role=user_role,
+        is_active=True,
+    )
+    
+    # Reference texts for the PDF
+    reference = get_reference_texts(matchup.ai_game_id)
     
     context = {
         'matchup': matchup,
-        'texts': texts,
-        'step_number': 1,
-        'step_title': 'Text Analysis'
+        'ai_game': matchup.ai_game,
+        'instructions': instructions,
+        'user_role': user_role,
+        'texts': reference['texts'],
+        'target_phoneme': reference['target_phoneme'],
+        'step_number': step_number,
+        'step_title': PDF_STEP_TITLES[step_number],
+        # Mirror the step pages: labels from step 2, bold spellings on step 2
+        'show_labels': step_number >= 2,
+        'show_highlights': step_number == 2,
     }
     
-    template = get_template('phoneme_density/step1_pdf_template.html')
-    html = template.render(context)
-    
-    response = HttpResponse(html, content_type='text/html')
-    response['Content-Disposition'] = f'inline; filename="step1_analysis_matchup_{matchup_id}.html"'
-    
-    return response
+    try:
+        return pdf_response(
+            'phoneme_density/step_pdf_template.html', context,
+            f'step{step_number}_matchup_{matchup_id}.pdf',
+        )
+    except PdfGenerationError:
+        messages.error(request, "The PDF could not be generated. Please try again.")
+        return redirect_to_step(matchup, step_number)
 
 
-def calculate_phoneme_frequency(text, phoneme):
-    """Calculate phoneme frequency using the same logic as step 4"""
-    text_lower = text.lower()
-    phoneme_count = 0
-    
-    # Handle different phoneme patterns (same logic as step 4 JavaScript)
-    if phoneme == 'f':
-        phoneme_count = (len([m for m in text_lower if m == 'f']) + 
-                        text_lower.count('ph') + 
-                        text_lower.count('gh'))
-    elif phoneme == 'k':
-        import re
-        phoneme_count = (len([m for m in text_lower if m == 'k']) + 
-                        text_lower.count('ck') + 
-                        len(re.findall(r'c(?=[aiou])', text_lower)) + 
-                        text_lower.count('qu'))
-    elif phoneme == 'sh':
-        import re
-        phoneme_count = (text_lower.count('sh') + 
-                        len(re.findall(r'ti(?=on)', text_lower)) + 
-                        len(re.findall(r'ci(?=al|an)', text_lower)) + 
-                        len(re.findall(r'si(?=on)', text_lower)) + 
-                        len(re.findall(r'ch(?=ef|ai)', text_lower)))
-    elif phoneme == 'ch':
-        import re
-        phoneme_count = (text_lower.count('ch') + 
-                        text_lower.count('tch') + 
-                        len(re.findall(r'tu(?=re)', text_lower)))
-    elif phoneme == 'j':
-        import re
-        phoneme_count = (len([m for m in text_lower if m == 'j']) + 
-                        text_lower.count('dge') + 
-                        len(re.findall(r'g(?=[ei])', text_lower)))
-    elif phoneme in ['th', 'dh']:
-        phoneme_count = text_lower.count('th')
-    elif phoneme == 'zh':
-        import re
-        phoneme_count = (len(re.findall(r'ge(?=$|[^aeiou])', text_lower)) + 
-                        len(re.findall(r'si(?=on)', text_lower)) + 
-                        len(re.findall(r's(?=ure|ion)', text_lower)))
-    elif phoneme == 'ng':
-        import re
-        phoneme_count = (text_lower.count('ng') + 
-                        len(re.findall(r'n(?=[kg])', text_lower)))
-    elif phoneme == 'z':
-        import re
-        phoneme_count = (len([m for m in text_lower if m == 'z']) + 
-                        len(re.findall(r's(?=[^aeiou]|$)', text_lower)))
-    else:
-        # Simple single-character phonemes
-        phoneme_count = len([m for m in text_lower if m == phoneme])
+@login_required
+def export_matchup_report_pdf(request, matchup_id):
+    """Export every visible text of a matchup with its phoneme analysis as PDF"""
+    matchup = get_object_or_404(GameMatchup.objects.select_related('ai_game', 'team1', 'team2', 'school'), id=matchup_id)
+    
+    can_access, current_step, error_msg = check_step_access(request, matchup, 4)
+    if not can_access:
+        messages.error(request, error_msg)
+        return redirect('aigames:student_dashboard')
+    
+    # Students see their own texts; opponent texts only once Step 5 is open
+    teams = get_visible_teams(request, matchup)
+    
+    team_texts = list(
+        TeamText.objects.filter(step4_data__matchup=matchup, step4_data__team__in=teams)
+        .exclude(content='')
+        .select_related('step4_data')
+        .order_by('text_number')
+    )
+    
+    baseline_frequencies = get_baseline_frequencies()
+    phoneme_list = list(baseline_frequencies.keys())
+    counts = []
+    totals = []
+    for team_text in team_texts:
+        text_counts, total_characters = team_text.get_phoneme_vector()
+        counts.append([text_counts.get(phoneme, 0) for phoneme in phoneme_list])
+        totals.append(total_characters)
+    
+    report_teams = {team.id: {'name': team.name, 'selected_phoneme': None, 'texts': []} for team in teams}
+    if team_texts:
+        z_scores = phoneme_statistics(counts, totals, list(baseline_frequencies.values()))['z_scores']
+        for row, team_text in enumerate(team_texts):
+            top = int(z_scores[row].argmax())
+            report_team = report_teams[team_text.step4_data.team_id]
+            report_team['selected_phoneme'] = team_text.step4_data.selected_phoneme
+            report_team['texts'].append({
+                'text_number': team_text.text_number,
+                'approval_status': team_text.get_approval_status_display(),
+                'phoneme_density': team_text.phoneme_density,
+                'top_phoneme': phoneme_list[top],
+                'top_z_score': float(z_scores[row, top]),
+                'content': team_text.content,
+            })
+    
+    context = {
+        'matchup': matchup,
+        'ai_game': matchup.ai_game,
+        'teams': list(report_teams.values()),
+    }
     
-    total_chars = len(text_lower.replace(' ', ''))  # Characters without spaces
-    return (phoneme_count / total_chars * 100) if total_chars > 0 else 0
+    try:
+        return pdf_response('phoneme_density/matchup_report_pdf.html', context, f'matchup_{matchup_id}_report.pdf')
+    except PdfGenerationError:
+        messages.error(request, "The PDF could not be generated. Please try again.")
+        return redirect_to_step(matchup, 4)
 
 
 @login_required
@@ -794,15 +1149,8 @@ def text_analysis(request, matchup_id, text_number):
     """Display phoneme frequency spider graph for a specific text"""
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
-    # Get the user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
-    else:
-        # Teachers can view any team's data
-        user_team = matchup.team1  # Default for teachers
+    # Get the user's team (teachers view team 1)
+    user_team = get_matchup_membership(request, matchup).team or matchup.team1
     
     # Get the team's step 4 data
     try:
@@ -812,58 +1160,10 @@ def text_analysis(request, matchup_id, text_number):
         messages.error(request, f"Text {text_number} not found.")
         return redirect('phoneme_density:step4', matchup_id=matchup_id)
     
-    # Calculate frequencies for all phonemes
-    text_frequencies = {}
-    english_frequencies = {}
-    phoneme_list = list(ENGLISH_PHONEME_FREQUENCIES.keys())
-    
-    for phoneme in phoneme_list:
-        text_freq = calculate_phoneme_frequency(team_text.content, phoneme)
-        english_freq = ENGLISH_PHONEME_FREQUENCIES[phoneme]
-        
-        text_frequencies[phoneme] = text_freq
-        english_frequencies[phoneme] = english_freq
-    
-    # Calculate standard error for English frequencies using actual text length
-    # Using formula: SE = sqrt(p * (1-p) / n) where n is the actual text length
-    actual_text_length = len(team_text.content.replace(' ', ''))  # Character count excluding spaces
-    standard_errors = {}
-    
-    for phoneme in phoneme_list:
-        p = english_frequencies[phoneme] / 100  # Convert percentage to proportion
-        se = math.sqrt(p * (1 - p) / actual_text_length) * 100  # Convert back to percentage
-        standard_errors[phoneme] = se * 1.96  # 95% confidence interval
-    
-    # Calculate likelihood that each phoneme is the "overweight" target phoneme
-    # Using z-score to measure how many standard deviations above the baseline each phoneme is
-    phoneme_likelihoods = {}
-    z_scores = {}
-    
-    for phoneme in phoneme_list:
-        observed_freq = text_frequencies[phoneme]
-        expected_freq = english_frequencies[phoneme]
-        se_single = standard_errors[phoneme] / 1.96  # Get single standard error (not 95% CI)
-        
-        # Calculate z-score (how many standard deviations above baseline)
-        z_score = (observed_freq - expected_freq) / se_single if se_single > 0 else 0
-        z_scores[phoneme] = z_score
-        
-        # Convert z-score to likelihood using normal distribution
-        # Higher z-scores = higher likelihood of being the target phoneme
-        # Use max(0, z_score) so negative deviations don't contribute
-        likelihood_score = max(0, z_score)
-        phoneme_likelihoods[phoneme] = likelihood_score
-    
-    # Normalize likelihoods to percentages (sum to 100%)
-    total_likelihood = sum(phoneme_likelihoods.values())
-    if total_likelihood > 0:
-        phoneme_probabilities = {
-            phoneme: (likelihood / total_likelihood) * 100 
-            for phoneme, likelihood in phoneme_likelihoods.items()
-        }
-    else:
-        # If no phonemes are above baseline, assign equal probabilities
-        phoneme_probabilities = {phoneme: 100/len(phoneme_list) for phoneme in phoneme_list}
+    # Frequencies, standard errors, z-scores and probabilities from the stored counts
+    phoneme_list, english_frequencies, text_frequencies, standard_errors, z_scores, phoneme_probabilities, p_values = (
+        analyze_counts(*team_text.get_phoneme_vector())
+    )
 
     context = {
         'matchup': matchup,
@@ -882,7 +1182,8 @@ def text_analysis(request, matchup_id, text_number):
             {
                 'phoneme': phoneme,
                 'probability': phoneme_probabilities[phoneme],
-                'z_score': z_scores[phoneme]
+                'z_score': z_scores[phoneme],
+                'p_value': p_values[phoneme],
             }
             for phoneme in phoneme_list
         ],
@@ -891,149 +1192,231 @@ def text_analysis(request, matchup_id, text_number):
     return render(request, 'phoneme_density/text_analysis.html', context)
 
 
+@login_required
+@require_POST
 def analyze_combined_text(request, matchup_id):
-    """Analyze combined text from texts 1, 3, 5, 7"""
+    """Analyze a team's stored texts together (texts 1, 3, 5, 7 by default)"""
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
     
-    if request.method != 'POST':
-        messages.error(request, "Invalid request method.")
+    try:
+        text_numbers = sorted({
+            int(number) for number in request.POST.get('text_numbers', '1,3,5,7').split(',') if number.strip()
+        } & set(range(1, 9)))
+    except ValueError:
+        text_numbers = []
+    if not text_numbers:
+        messages.error(request, "Please choose which texts to analyze.")
         return redirect('phoneme_density:step4', matchup_id=matchup_id)
     
-    # Get combined text from form
-    combined_text = request.POST.get('combined_text', '')
-    selected_phoneme = request.POST.get('selected_phoneme', '')
-    text_numbers = request.POST.get('text_numbers', '1,3,5,7')
+    can_access, error_msg = check_analysis_access(request, matchup)
+    if not can_access:
+        messages.error(request, error_msg)
+        return redirect('aigames:student_dashboard')
     
-    if not combined_text.strip():
+    # Get the user's team (teachers view team 1)
+    user_team = get_matchup_membership(request, matchup).team or matchup.team1
+    
+    step4_data = TeamStep4Data.objects.filter(matchup=matchup, team=user_team).first()
+    analysis = get_combined_analysis(step4_data, text_numbers) if step4_data else None
+    if analysis is None:
         messages.error(request, "No text content found.")
         return redirect('phoneme_density:step4', matchup_id=matchup_id)
     
-    # Get the user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
-    else:
-        # Teachers can view any team's data
-        user_team = matchup.team1  # Default for teachers
-    
-    # Calculate frequencies for all phonemes
-    text_frequencies = {}
-    english_frequencies = {}
-    phoneme_list = list(ENGLISH_PHONEME_FREQUENCIES.keys())
-    
-    for phoneme in phoneme_list:
-        text_freq = calculate_phoneme_frequency(combined_text, phoneme)
-        english_freq = ENGLISH_PHONEME_FREQUENCIES[phoneme]
-        
-        text_frequencies[phoneme] = text_freq
-        english_frequencies[phoneme] = english_freq
-    
-    # Calculate standard error for English frequencies using actual text length
-    actual_text_length = len(combined_text.replace(' ', ''))  # Character count excluding spaces
-    standard_errors = {}
-    
-    for phoneme in phoneme_list:
-        p = english_frequencies[phoneme] / 100  # Convert percentage to proportion
-        se = math.sqrt(p * (1 - p) / actual_text_length) * 100  # Convert back to percentage
-        standard_errors[phoneme] = se * 1.96  # 95% confidence interval
-    
-    # Calculate likelihood that each phoneme is the "overweight" target phoneme
-    phoneme_likelihoods = {}
-    z_scores = {}
-    
-    for phoneme in phoneme_list:
-        observed_freq = text_frequencies[phoneme]
-        expected_freq = english_frequencies[phoneme]
-        se_single = standard_errors[phoneme] / 1.96  # Get single standard error (not 95% CI)
-        
-        # Calculate z-score (how many standard deviations above baseline)
-        z_score = (observed_freq - expected_freq) / se_single if se_single > 0 else 0
-        z_scores[phoneme] = z_score
-        
-        # Convert z-score to likelihood using normal distribution
-        likelihood_score = max(0, z_score)
-        phoneme_likelihoods[phoneme] = likelihood_score
-    
-    # Normalize likelihoods to percentages (sum to 100%)
-    total_likelihood = sum(phoneme_likelihoods.values())
-    if total_likelihood > 0:
-        phoneme_probabilities = {
-            phoneme: (likelihood / total_likelihood) * 100 
-            for phoneme, likelihood in phoneme_likelihoods.items()
-        }
-    else:
-        # If no phonemes are above baseline, assign equal probabilities
-        phoneme_probabilities = {phoneme: 100/len(phoneme_list) for phoneme in phoneme_list}
+    phoneme_list = analysis['phoneme_list']
+    text_frequencies = analysis['text_frequencies']
+    density_intervals = analysis['density_intervals']
+    analyzed_numbers = ','.join(map(str, analysis['text_numbers']))
 
     # Create a mock text object for template compatibility
     mock_text = type('MockText', (), {
-        'content': combined_text,
-        'text_number': text_numbers,
+        'content': analysis['content'],
+        'text_number': analyzed_numbers,
     })()
 
     context = {
         'matchup': matchup,
         'team': user_team,
-        'text_number': f"Combined ({text_numbers})",
+        'text_number': f"Combined ({analyzed_numbers})",
         'team_text': mock_text,
-        'selected_phoneme': selected_phoneme,
+        'selected_phoneme': step4_data.selected_phoneme,
         'phoneme_list': json.dumps(phoneme_list),
         'text_frequencies': json.dumps(list(text_frequencies.values())),
-        'english_frequencies': json.dumps(list(english_frequencies.values())),
-        'standard_errors': json.dumps(list(standard_errors.values())),
+        'english_frequencies': json.dumps(list(analysis['english_frequencies'].values())),
+        'standard_errors': json.dumps(list(analysis['standard_errors'].values())),
+        'density_intervals': json.dumps([density_intervals[phoneme] for phoneme in phoneme_list]),
         'phoneme_labels': json.dumps([f"/{p}/" for p in phoneme_list]),
-        'z_scores': z_scores,
-        'phoneme_probabilities': phoneme_probabilities,
+        'z_scores': analysis['z_scores'],
+        'phoneme_probabilities': analysis['phoneme_probabilities'],
         'phoneme_analysis': [
             {
                 'phoneme': phoneme,
-                'probability': phoneme_probabilities[phoneme],
-                'z_score': z_scores[phoneme]
+                'probability': analysis['phoneme_probabilities'][phoneme],
+                'z_score': analysis['z_scores'][phoneme],
+                'p_value': analysis['p_values'][phoneme],
+                'density': text_frequencies[phoneme],
+                'interval': density_intervals[phoneme],
             }
             for phoneme in phoneme_list
         ],
         'is_combined_analysis': True,  # Flag to indicate this is combined analysis
-        'combined_text_numbers': text_numbers,
+        'combined_text_numbers': analyzed_numbers,
     }
     
     return render(request, 'phoneme_density/text_analysis.html', context)
 
 
-@require_POST
+@login_required
+def matchup_analysis(request, matchup_id):
+    """Return phoneme analysis for every visible text in a matchup as JSON (step 4 loads it in one round trip)"""
+    matchup = get_object_or_404(GameMatchup, id=matchup_id)
+
+    can_access, error_msg = check_analysis_access(request, matchup)
+    if not can_access:
+        return JsonResponse({'success': False, 'error': error_msg}, status=403)
+
+    # Students see their own texts; opponent texts only once Step 5 is open
+    teams = get_visible_teams(request, matchup)
+
+    team_texts = list(
+        TeamText.objects.filter(step4_data__matchup=matchup, step4_data__team__in=teams)
+        .select_related('step4_data__team')
+        .order_by('step4_data__team_id', 'text_number')
+    )
+
+    # Texts x phonemes matrices for the whole matchup from the stored counts
+    baseline_frequencies = get_baseline_frequencies()
+    phoneme_list = list(baseline_frequencies.keys())
+    english_frequencies = list(baseline_frequencies.values())
+    counts = []
+    totals = []
+    for team_text in team_texts:
+        text_counts, total_characters = team_text.get_phoneme_vector()
+        counts.append([text_counts.get(phoneme, 0) for phoneme in phoneme_list])
+        totals.append(total_characters)
+    stats = phoneme_statistics(counts, totals, english_frequencies) if team_texts else None
+
+    texts = []
+    for row, team_text in enumerate(team_texts):
+        texts.append({
+            'team_id': team_text.step4_data.team_id,
+            'team_name': team_text.step4_data.team.name,
+            'text_number': team_text.text_number,
+            'total_characters': totals[row],
+            'frequencies': stats['frequencies'][row].tolist(),
+            'standard_errors': stats['standard_errors'][row].tolist(),
+            'z_scores': stats['z_scores'][row].tolist(),
+            'probabilities': stats['probabilities'][row].tolist(),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'phonemes': phoneme_list,
+        'english_frequencies': english_frequencies,
+        'texts': texts,
+    })
+
+
+def get_scatter_points(matchup, teams, x_phoneme, y_phoneme):
+    """
+    Scatter points (phoneme percentages) for every non-empty text of the given teams.
+    Read from the stored phoneme vectors and cached per matchup (see cache.py).
+    """
+    team_ids = sorted(team.id for team in teams)
+    cache_key = matchup_cache_key(matchup.id, 'scatter', x_phoneme, y_phoneme, *team_ids)
+    points = cache.get(cache_key)
+    if points is not None:
+        return points
+
+    team_texts = (
+        TeamText.objects.filter(step4_data__matchup=matchup, step4_data__team_id__in=team_ids)
+        .exclude(content='')
+        .select_related('step4_data__team')
+        .order_by('step4_data__team_id', 'text_number')
+    )
+
+    points = []
+    for team_text in team_texts:
+        counts, total_characters = team_text.get_phoneme_vector()
+        if total_characters == 0:
+            continue
+        points.append({
+            'team_id': team_text.step4_data.team_id,
+            'team_name': team_text.step4_data.team.name,
+            'text_number': team_text.text_number,
+            'x': round(counts.get(x_phoneme, 0) / total_characters * 100, 1),
+            'y': round(counts.get(y_phoneme, 0) / total_characters * 100, 1),
+        })
+
+    cache.set(cache_key, points, MATCHUP_CACHE_TIMEOUT)
+    return points
+
+
+@login_required
 def phoneme_scatter_plot(request, matchup_id):
-    """Create scatter plot of /f/ and /l/ phoneme percentages"""
+    """Scatter plot of two phonemes' percentages (default /f/ vs /l/) across the matchup's texts"""
     matchup = get_object_or_404(GameMatchup, id=matchup_id)
-    
-    # Get scatter plot data from form
-    scatter_data_json = request.POST.get('scatter_data', '[]')
-    
-    try:
-        scatter_data = json.loads(scatter_data_json)
-    except json.JSONDecodeError:
-        messages.error(request, "Invalid scatter plot data.")
-        return redirect('phoneme_density:step4', matchup_id=matchup_id)
-    
-    if not scatter_data:
-        messages.error(request, "No scatter plot data found.")
+
+    can_access, current_step, error_msg = check_step_access(request, matchup, 4)
+    if not can_access:
+        messages.error(request, error_msg)
+        return redirect('aigames:student_dashboard')
+
+    x_phoneme = request.GET.get('x', 'f')
+    y_phoneme = request.GET.get('y', 'l')
+    if x_phoneme not in ENGLISH_PHONEME_FREQUENCIES or y_phoneme not in ENGLISH_PHONEME_FREQUENCIES:
+        messages.error(request, "Unknown phoneme for scatter plot.")
         return redirect('phoneme_density:step4', matchup_id=matchup_id)
-    
-    # Get the user's team
-    user_team = None
-    if request.user in matchup.team1.members.all():
-        user_team = matchup.team1
-    elif request.user in matchup.team2.members.all():
-        user_team = matchup.team2
-    else:
-        # Teachers can view any team's data
-        user_team = matchup.team1  # Default for teachers
-    
+
+    # Get the user's team (teachers view team 1)
+    user_team = get_matchup_membership(request, matchup).team or matchup.team1
+
+    scatter_data = get_scatter_points(matchup, get_visible_teams(request, matchup), x_phoneme, y_phoneme)
+
     context = {
         'matchup': matchup,
         'team': user_team,
+        'x_phoneme': x_phoneme,
+        'y_phoneme': y_phoneme,
+        'x_baseline': get_baseline_frequencies()[x_phoneme],
+        'phoneme_choices': PHONEME_CHOICES,
         'scatter_data': scatter_data,
         'scatter_data_json': json.dumps(scatter_data),
     }
-    
+
     return render(request, 'phoneme_density/phoneme_scatter_plot.html', context)
+
+
+@login_required
+def word_suggestions(request):
+    """
+    Completions of a typed prefix with the highest density of a phoneme, as
+    JSON, for the step 4 editor (?prefix=<letters>&phoneme=<code>&limit=<n>)
+    """
+    prefix = request.GET.get('prefix', '').strip().lower()
+    phoneme = request.GET.get('phoneme', '').strip().lower()
+    try:
+        limit = min(int(request.GET.get('limit', SUGGESTION_LIMIT)), MAX_SUGGESTION_LIMIT)
+    except ValueError:
+        limit = SUGGESTION_LIMIT
+    
+    suggestions = get_word_index().suggest(prefix, phoneme, limit) if prefix and phoneme else []
+    response = JsonResponse({'prefix': prefix, 'phoneme': phoneme, 'suggestions': suggestions})
+    # Suggestions only change with the rule set, so the browser can reuse them briefly
+    patch_cache_control(response, private=True, max_age=60 * 5)
+    return response
+
+
+@etag(lambda request: get_active_rule_spec()['version'])
+def phoneme_rules_spec(request):
+    """
+    The active spelling rule set as JSON, for the browser-side counter.
+    Pages link to it with ?v=<version>, which can be cached indefinitely;
+    other requests revalidate with the ETag.
+    """
+    spec = get_active_rule_spec()
+    response = JsonResponse(spec)
+    if request.GET.get('v') == spec['version']:
+        patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response